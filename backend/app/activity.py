@@ -0,0 +1,133 @@
+"""
+Ticket comments and activity, stored in bucket documents.
+
+A ticket's comments and its activity log (field changes, comments,
+attachments) are kept out of the ticket document, in ``ticket_comments``
+and ``ticket_activity``. Each collection holds bucket documents of up to
+``ticket_bucket_size`` entries per ticket. An entry is appended to the
+ticket's newest bucket with a single ``$push`` upsert filtered on
+``count < size``: once that bucket is full the filter matches nothing and
+the upsert starts the next one. The ticket document stays the same size
+however long its history grows, and a page of history is one bucket.
+
+Buckets are ordered by ``_id``; pages go newest bucket first, with entries
+newest first, and the cursor is the ``_id`` of the last bucket returned.
+"""
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument
+from pymongo.errors import BulkWriteError
+
+from .config import get_settings
+from .indexes import register_indexes
+
+# Fields whose changes are written to the activity log
+TRACKED_FIELDS = ("title", "description", "category", "priority", "status", "assignee", "department")
+
+
+class BucketLog:
+    def __init__(self, collection: str, bucket_size: int):
+        self.collection = collection
+        self.bucket_size = bucket_size
+        register_indexes(collection, IndexModel([("ticketId", ASCENDING), ("_id", DESCENDING)]))
+
+    async def append(self, db: AsyncIOMotorDatabase, ticket_id: int, entry: dict) -> dict:
+        """Append ``entry`` to the ticket's newest bucket; returns that bucket as updated."""
+        at = entry.get("createdAt") or datetime.now(timezone.utc)
+        # Two appends racing past a full bucket may each start one; both
+        # then fill up normally, so nothing is lost or reordered
+        return await db[self.collection].find_one_and_update(
+            {"ticketId": ticket_id, "count": {"$lt": self.bucket_size}},
+            {
+                "$push": {"entries": entry},
+                "$inc": {"count": 1},
+                "$min": {"first": at},
+                "$max": {"last": at},
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def adopt(self, db: AsyncIOMotorDatabase, ticket_id: int, entries: list[dict]) -> None:
+        """
+        Store entries kept elsewhere until now (oldest first) as buckets of
+        their own. Each bucket's ``_id`` is its first entry's, so the buckets
+        page in time order and adopting the same entries twice inserts nothing.
+        """
+        buckets = [
+            {
+                "_id": chunk[0]["_id"],
+                "ticketId": ticket_id,
+                "entries": chunk,
+                # Counted as full so appends never land between older entries
+                "count": self.bucket_size,
+                "first": chunk[0]["createdAt"],
+                "last": chunk[-1]["createdAt"],
+            }
+            for chunk in (entries[start:start + self.bucket_size] for start in range(0, len(entries), self.bucket_size))
+        ]
+        if not buckets:
+            return
+        try:
+            await db[self.collection].insert_many(buckets, ordered=False)
+        except BulkWriteError as exc:
+            if any(error["code"] != 11000 for error in exc.details.get("writeErrors", [])):
+                raise
+
+    async def latest(self, db: AsyncIOMotorDatabase, ticket_id: int) -> dict | None:
+        return await db[self.collection].find_one({"ticketId": ticket_id}, sort=[("_id", DESCENDING)])
+
+    async def page(self, db: AsyncIOMotorDatabase, ticket_id: int, cursor: str | None) -> tuple[list[dict], str | None]:
+        """One bucket's entries, newest first, older than ``cursor``; plus the cursor for the next page."""
+        query: dict = {"ticketId": ticket_id}
+        if cursor:
+            query["_id"] = {"$lt": decode_cursor(cursor)}
+        bucket = await db[self.collection].find_one(query, sort=[("_id", DESCENDING)])
+        if bucket is None:
+            return [], None
+        return bucket["entries"][::-1], await self.older_cursor(db, bucket)
+
+    async def older_cursor(self, db: AsyncIOMotorDatabase, bucket: dict) -> str | None:
+        """Cursor for the buckets before ``bucket``, or None when it is the oldest (an index-only check)."""
+        older = await db[self.collection].find_one(
+            {"ticketId": bucket["ticketId"], "_id": {"$lt": bucket["_id"]}}, projection={"_id": 1}
+        )
+        return str(bucket["_id"]) if older else None
+
+
+def decode_cursor(cursor: str) -> ObjectId:
+    try:
+        return ObjectId(cursor)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def actor(user: dict | None) -> dict | None:
+    """Who did it, copied into the entry so pages render without a users lookup."""
+    if user is None:
+        return None
+    return {"_id": user["_id"], "name": user.get("name"), "email": user.get("email")}
+
+
+def field_changes(before: dict, after: dict) -> dict:
+    return {
+        field: {"from": before.get(field), "to": after.get(field)}
+        for field in TRACKED_FIELDS
+        if field in after and after.get(field) != before.get(field)
+    }
+
+
+async def record_activity(
+    db: AsyncIOMotorDatabase, ticket_id: int, kind: str, user: dict | None = None, **details
+) -> None:
+    """Append one activity entry; called from background tasks after the write it describes."""
+    entry = {"_id": ObjectId(), "type": kind, "actor": actor(user), "createdAt": datetime.now(timezone.utc), **details}
+    await activity_log.append(db, ticket_id, entry)
+
+
+comment_log = BucketLog("ticket_comments", bucket_size=get_settings().ticket_bucket_size)
+activity_log = BucketLog("ticket_activity", bucket_size=get_settings().ticket_bucket_size)
@@ -0,0 +1,236 @@
+"""
+Admission control and load shedding.
+
+Every API request is put in a route class, each with its own concurrency
+limit, so a pile of reports cannot take the slots (and Mongo connections)
+interactive reads and writes need:
+
+* ``auth``: ``/api/auth/*``
+* ``reports``: ``/api/reports/*``, exports, imports and attachment
+  uploads and downloads, which hold their slot for the whole transfer
+* ``writes``: any other non-GET request
+* ``reads``: everything else
+
+A request that cannot get a slot within ``admission_queue_timeout_ms`` is
+answered 503 with ``Retry-After`` instead of queueing until it times out.
+``PoolPressure`` watches how long the driver takes to check out a
+connection; while that is above ``admission_pool_wait_ms`` the pool is
+saturated and ``reports`` requests are shed immediately.
+
+On top of that each user has a token bucket (``user_limits``), charged by
+``get_current_user`` once the principal is known; an empty bucket is a 429.
+Health, readiness, metrics, the SSE stream and ``/api/batch`` itself are
+not limited (batch sub-requests are admitted one by one).
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, status
+from pymongo import monitoring
+
+from .config import get_settings
+from .metrics import Counter, Histogram, registry
+from .responses import BSONResponse
+
+# ASGI scope key holding the request's route class, read by get_current_user
+ROUTE_CLASS_SCOPE_KEY = "app.route_class"
+_CHARGED_SCOPE_KEY = "app.rate_charged"
+
+EXEMPT_PATHS = {"/api/health", "/api/ready", "/api/metrics", "/api/tickets/events", "/api/batch"}
+HEAVY_SUFFIXES = ("/export", "/import")
+# Slow clients keep these open as long as a transfer takes
+HEAVY_SEGMENT = "/attachments"
+# Tokens a request takes from its user's bucket
+CLASS_COST = {"auth": 1, "reads": 1, "writes": 1, "reports": 5}
+
+admission_shed = registry.register(
+    Counter("admission_shed_total", "Requests rejected by admission control.", ("route_class", "reason"))
+)
+admission_wait = registry.register(
+    Histogram("admission_queue_wait_seconds", "Time spent waiting for an admission slot.", ("route_class",))
+)
+
+
+def route_class(method: str, path: str) -> str | None:
+    """The route class of a request, or None when it is not limited."""
+    path = path.rstrip("/") or "/"
+    if path in EXEMPT_PATHS or not path.startswith("/api/"):
+        return None
+    if path.startswith("/api/auth/"):
+        return "auth"
+    if path.startswith("/api/reports/") or path.endswith(HEAVY_SUFFIXES) or HEAVY_SEGMENT in path:
+        return "reports"
+    if method not in ("GET", "HEAD", "OPTIONS"):
+        return "writes"
+    return "reads"
+
+
+class PoolPressure(monitoring.ConnectionPoolListener):
+    """
+    Moving average of connection checkout time. Called from driver threads;
+    the two floats it keeps are replaced, never updated in place.
+    """
+
+    # Weight of the newest checkout; about the last 10 dominate
+    ALPHA = 0.2
+    # Without checkouts the average says nothing about the pool any more
+    STALE_AFTER = 5.0
+
+    def __init__(self):
+        self.checkout_seconds = 0.0
+        self.updated = 0.0
+
+    def _record(self, seconds: float) -> None:
+        self.checkout_seconds += self.ALPHA * (seconds - self.checkout_seconds)
+        self.updated = time.monotonic()
+
+    def saturated(self, threshold_ms: float) -> bool:
+        if not threshold_ms or time.monotonic() - self.updated > self.STALE_AFTER:
+            return False
+        return self.checkout_seconds * 1000 >= threshold_ms
+
+    def connection_checked_out(self, event):
+        self._record(event.duration or 0.0)
+
+    def connection_check_out_failed(self, event):
+        # Timed out waiting for a connection: as saturated as it gets
+        self._record(max(event.duration or 0.0, 1.0))
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+
+pool_pressure = PoolPressure()
+
+
+def event_listeners() -> list:
+    """Listeners to pass to the Mongo client, or none when admission control is disabled."""
+    return [pool_pressure] if get_settings().admission_enabled else []
+
+
+class TokenBuckets:
+    """Per-key token buckets refilled at ``rate`` per second up to ``burst``; least recently used keys are dropped."""
+
+    def __init__(self, rate: float, burst: float, max_entries: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_entries = max_entries
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, cost: float = 1) -> float:
+        """Take ``cost`` tokens; returns 0 on success, else seconds until they are available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (min(cost, self.burst) - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+user_limits = TokenBuckets(
+    rate=get_settings().admission_user_rate,
+    burst=get_settings().admission_user_burst,
+    max_entries=get_settings().principal_cache_max_entries,
+)
+
+
+def charge_user(scope: dict, principal: dict) -> None:
+    """Take the request's cost from the user's bucket, once per request; raises 429 when empty."""
+    route = scope.get(ROUTE_CLASS_SCOPE_KEY)
+    if route is None or scope.get(_CHARGED_SCOPE_KEY) or not user_limits.rate:
+        return
+    scope[_CHARGED_SCOPE_KEY] = True
+    wait = user_limits.take(str(principal["_id"]), CLASS_COST[route])
+    if wait:
+        admission_shed.inc(route, "user_rate")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests",
+            headers={"Retry-After": str(max(1, round(wait)))},
+        )
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware applying the per-class limits; the slot is held until the response completes."""
+
+    def __init__(self, app):
+        self.app = app
+        settings = get_settings()
+        self.queue_timeout = settings.admission_queue_timeout_ms / 1000
+        self.pool_wait_ms = settings.admission_pool_wait_ms
+        self.retry_after = str(settings.admission_retry_after_seconds)
+        self.limits = {
+            "auth": asyncio.Semaphore(settings.admission_auth_concurrency),
+            "writes": asyncio.Semaphore(settings.admission_write_concurrency),
+            "reads": asyncio.Semaphore(settings.admission_read_concurrency),
+            "reports": asyncio.Semaphore(settings.admission_report_concurrency),
+        }
+
+    async def _shed(self, scope, receive, send, route: str, reason: str) -> None:
+        admission_shed.inc(route, reason)
+        response = BSONResponse(
+            {"detail": "Server busy, retry later"},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": self.retry_after},
+        )
+        await response(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = route_class(scope["method"], scope["path"])
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        if route == "reports" and pool_pressure.saturated(self.pool_wait_ms):
+            await self._shed(scope, receive, send, route, "pool_saturated")
+            return
+        limit = self.limits[route]
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(limit.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            await self._shed(scope, receive, send, route, "queue_timeout")
+            return
+        admission_wait.observe(time.perf_counter() - start, route)
+        scope[ROUTE_CLASS_SCOPE_KEY] = route
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limit.release()
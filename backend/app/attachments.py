@@ -0,0 +1,144 @@
+"""
+Ticket attachments stored in GridFS.
+
+Uploads are written to the ``attachments`` bucket as the request body
+arrives, so a worker holds at most one GridFS chunk per upload no matter
+how large the file is, and the size limit is enforced on the bytes
+actually received rather than a client-supplied length. Downloads are
+read back chunk by chunk and support single byte ranges, ``If-Range`` and
+ETags (GridFS files never change, so the file id is a strong validator).
+"""
+import asyncio
+import re
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import AsyncIterable, AsyncIterator
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket, AsyncIOMotorGridOut
+
+from .config import get_settings
+
+BUCKET = "attachments"
+
+# Same list as server/middleware/upload.js
+ALLOWED_TYPES = {
+    "image/jpeg",
+    "image/png",
+    "image/gif",
+    "application/pdf",
+    "application/msword",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "application/vnd.ms-excel",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "text/plain",
+    "text/csv",
+}
+
+_upload_slots: asyncio.Semaphore | None = None
+
+
+class AttachmentTooLarge(Exception):
+    pass
+
+
+def bucket(db: AsyncIOMotorDatabase) -> AsyncIOMotorGridFSBucket:
+    return AsyncIOMotorGridFSBucket(db, bucket_name=BUCKET, chunk_size_bytes=get_settings().attachment_chunk_bytes)
+
+
+def upload_slots() -> asyncio.Semaphore:
+    """Uploads written concurrently per worker; others wait their turn."""
+    global _upload_slots
+    if _upload_slots is None:
+        _upload_slots = asyncio.Semaphore(get_settings().attachment_upload_concurrency)
+    return _upload_slots
+
+
+def clean_filename(name: str) -> str:
+    """Base name without path separators or control characters."""
+    name = re.split(r"[\\/]", name)[-1]
+    name = re.sub(r"[\x00-\x1f\x7f]", "", name).strip()
+    return name[:255] or "attachment"
+
+
+async def store(
+    db: AsyncIOMotorDatabase,
+    chunks: AsyncIterable[bytes],
+    filename: str,
+    content_type: str,
+    metadata: dict,
+    max_bytes: int,
+) -> tuple[ObjectId, int]:
+    """Write ``chunks`` to GridFS; returns (file id, size). Nothing is kept if the limit is exceeded."""
+    grid_in = bucket(db).open_upload_stream(filename, metadata={**metadata, "contentType": content_type})
+    size = 0
+    try:
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            size += len(chunk)
+            if size > max_bytes:
+                raise AttachmentTooLarge()
+            await grid_in.write(chunk)
+        await grid_in.close()
+    except BaseException:
+        # Client disconnects and cancellations included: remove written chunks
+        await asyncio.shield(grid_in.abort())
+        raise
+    return grid_in._id, size
+
+
+async def open_file(db: AsyncIOMotorDatabase, file_id: ObjectId) -> AsyncIOMotorGridOut:
+    return await bucket(db).open_download_stream(file_id)
+
+
+def parse_range(header: str | None, length: int) -> tuple[int, int] | None | bool:
+    """
+    Single ``bytes=`` range as inclusive (start, end), ``None`` to send the
+    whole file (no header, or a form we don't serve such as multiple
+    ranges), or ``False`` when the range cannot be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first == "":
+            suffix = int(last)
+            if suffix <= 0:
+                return False
+            return max(0, length - suffix), length - 1
+        start = int(first)
+        end = int(last) if last else length - 1
+    except ValueError:
+        return None
+    if start >= length or end < start:
+        return False
+    return start, min(end, length - 1)
+
+
+def etag(file_id: ObjectId) -> str:
+    return f'"{file_id}"'
+
+
+def last_modified(upload_date: datetime) -> str:
+    # The driver returns naive UTC datetimes unless the client is tz_aware
+    if upload_date.tzinfo is None:
+        upload_date = upload_date.replace(tzinfo=timezone.utc)
+    return format_datetime(upload_date.astimezone(timezone.utc), usegmt=True)
+
+
+def range_applies(if_range: str | None, file_etag: str, modified: str) -> bool:
+    """``If-Range`` either absent or still matching, so a partial response is safe."""
+    return if_range is None or if_range.strip() in (file_etag, modified)
+
+
+async def read_range(grid_out: AsyncIOMotorGridOut, start: int, end: int) -> AsyncIterator[bytes]:
+    """Bytes ``start``..``end`` inclusive, one chunk-sized read at a time."""
+    grid_out.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        data = await grid_out.read(min(remaining, grid_out.chunk_size))
+        if not data:
+            break
+        remaining -= len(data)
+        yield data
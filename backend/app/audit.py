@@ -0,0 +1,344 @@
+"""
+Write-behind audit log.
+
+Routes call ``audit_log.record(...)``, which builds the event and appends it
+to a bounded in-process buffer; nothing touches MongoDB on the request path.
+A background flusher writes the buffer to ``audit_logs`` with unordered
+``insert_many`` calls, as soon as ``audit_batch_size`` events are waiting
+or every ``audit_flush_interval_seconds``, whichever comes first.
+
+When the buffer is full (MongoDB down or too slow), ``audit_overflow``
+decides what happens:
+
+* ``drop``: the event is discarded and counted.
+* ``block``: the request waits up to ``audit_block_timeout_ms`` for room,
+  then drops the event.
+* ``spill``: the event is appended, as Extended JSON, to this worker's
+  ``spill-<pid>.ndjson`` in ``audit_spill_dir``. When a flusher starts it
+  loads the files of this and of exited workers back into ``audit_logs``,
+  retrying in the background if that fails. Every event has its ``_id``
+  from the start, so a replay that is retried after a partial insert
+  does not write duplicates.
+
+A failed batch goes back to the front of the buffer to be retried; events
+MongoDB cannot store at all are dropped one by one rather than failing the
+batch, and the flusher survives any error. On shutdown the flusher writes
+whatever is left; events it cannot write are spilled (with ``spill``) or
+counted as dropped. Counts are exported as ``audit_events_total`` and
+``audit_events_pending``.
+"""
+import asyncio
+import itertools
+import logging
+import os
+import re
+from collections import deque
+from datetime import datetime, timezone
+
+import bson
+from bson import ObjectId, json_util
+from bson.errors import InvalidDocument
+from fastapi import Request
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from .config import get_settings
+from .indexes import register_indexes
+from .metrics import Counter, Gauge, registry
+
+logger = logging.getLogger(__name__)
+
+AUDIT_COLLECTION = "audit_logs"
+OVERFLOW_POLICIES = ("drop", "block", "spill")
+# Spill files being written (spill-<pid>) and being replayed (replay-<pid>-<n>)
+SPILL_FILE = re.compile(r"(?:spill|replay)-(?P<pid>\d+)(?:-\d+)?\.ndjson")
+
+register_indexes(
+    AUDIT_COLLECTION,
+    IndexModel([("at", DESCENDING)]),
+    IndexModel([("actor", ASCENDING), ("at", DESCENDING)]),
+    IndexModel([("target.type", ASCENDING), ("target.id", ASCENDING), ("at", DESCENDING)]),
+)
+
+audit_events = registry.register(
+    Counter("audit_events_total", "Audit events by what became of them.", ("outcome",))
+)
+audit_pending = registry.register(Gauge("audit_events_pending", "Audit events waiting to be written."))
+
+
+def _process_gone(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def _storable(event: dict) -> bool:
+    try:
+        bson.encode(event)
+    except (InvalidDocument, TypeError, OverflowError):
+        return False
+    return True
+
+
+def client_details(request: Request | None) -> dict:
+    if request is None:
+        return {}
+    return {
+        "ip": request.client.host if request.client else None,
+        "userAgent": request.headers.get("user-agent"),
+    }
+
+
+class AuditLog:
+    def __init__(
+        self,
+        max_buffer: int,
+        batch_size: int,
+        flush_interval: float,
+        overflow: str,
+        spill_dir: str,
+        block_timeout: float,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"AUDIT_OVERFLOW must be one of {', '.join(OVERFLOW_POLICIES)}")
+        self.max_buffer = max_buffer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.spill_dir = os.path.abspath(spill_dir)
+        self.block_timeout = block_timeout
+        self.written = 0
+        self.dropped = 0
+        self.spilled = 0
+        self._buffer: deque[dict] = deque()
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._replays = itertools.count()
+        self._replay_pending = False
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def stats(self) -> dict[str, int]:
+        return {"pending": self.pending, "written": self.written, "dropped": self.dropped, "spilled": self.spilled}
+
+    async def record(
+        self,
+        action: str,
+        actor=None,
+        target: dict | None = None,
+        request: Request | None = None,
+        **details,
+    ) -> None:
+        """Queue one event; returns without waiting unless the buffer is full and the policy is ``block``."""
+        if self._task is None:
+            # Not writing in this process (CLI imports, AUDIT_ENABLED=false)
+            return
+        event = {
+            "_id": ObjectId(),
+            "at": datetime.now(timezone.utc),
+            "action": action,
+            "actor": actor,
+            "target": target,
+            **client_details(request),
+            "details": details,
+        }
+        if len(self._buffer) >= self.max_buffer:
+            if self.overflow == "block":
+                await self._wait_for_space()
+            if len(self._buffer) >= self.max_buffer:
+                self._overflow([event])
+                return
+        self._buffer.append(event)
+        audit_pending.inc()
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _wait_for_space(self) -> None:
+        self._space.clear()
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._space.wait(), self.block_timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _overflow(self, events: list[dict]) -> None:
+        if self.overflow == "spill" and self._spill(events):
+            return
+        self.dropped += len(events)
+        audit_events.inc("dropped", amount=len(events))
+
+    def _spill(self, events: list[dict]) -> bool:
+        path = os.path.join(self.spill_dir, f"spill-{os.getpid()}.ndjson")
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as spill:
+                spill.writelines(json_util.dumps(event) + "\n" for event in events)
+        except (OSError, TypeError, ValueError) as exc:
+            logger.error("Audit spill to %s failed: %s", path, exc)
+            return False
+        self.spilled += len(events)
+        audit_events.inc("spilled", amount=len(events))
+        return True
+
+    async def _write(self, db: AsyncIOMotorDatabase, batch: list[dict]) -> bool:
+        """Insert one batch; False (with the batch back in the buffer) when MongoDB is unavailable."""
+        try:
+            await db[AUDIT_COLLECTION].insert_many(batch, ordered=False)
+            written = len(batch)
+        except BulkWriteError as exc:
+            # Rejected documents will not succeed on retry; keep the rest.
+            # A duplicate _id was already stored by an earlier attempt.
+            written = exc.details.get("nInserted", 0)
+            duplicates = sum(1 for error in exc.details.get("writeErrors", []) if error.get("code") == 11000)
+            rejected = len(batch) - written - duplicates
+            if rejected:
+                logger.error("Audit insert rejected %d events", rejected)
+                self.dropped += rejected
+                audit_events.inc("dropped", amount=rejected)
+        except PyMongoError as exc:
+            logger.warning("Audit flush failed, will retry: %s", exc)
+            room = self.max_buffer - len(self._buffer)
+            retry, excess = batch[:room], batch[room:]
+            self._buffer.extendleft(reversed(retry))
+            audit_pending.inc(amount=len(retry))
+            if excess:
+                self._overflow(excess)
+            return False
+        except InvalidDocument as exc:
+            # One unstorable event fails the whole insert; drop only those
+            storable = [event for event in batch if _storable(event)]
+            logger.error("Dropping %d audit events MongoDB cannot store: %s", len(batch) - len(storable), exc)
+            self.dropped += len(batch) - len(storable)
+            audit_events.inc("dropped", amount=len(batch) - len(storable))
+            return await self._write(db, storable) if storable else True
+        except Exception:
+            logger.exception("Audit insert failed; dropping %d events", len(batch))
+            self.dropped += len(batch)
+            audit_events.inc("dropped", amount=len(batch))
+            return True
+        self.written += written
+        audit_events.inc("written", amount=written)
+        return True
+
+    def _take(self) -> list[dict]:
+        batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+        audit_pending.dec(amount=len(batch))
+        self._space.set()
+        return batch
+
+    async def flush(self, db: AsyncIOMotorDatabase) -> bool:
+        """Write everything buffered now; False if a batch failed."""
+        while self._buffer:
+            if not await self._write(db, self._take()):
+                return False
+        return True
+
+    async def run(self, db: AsyncIOMotorDatabase) -> None:
+        while True:
+            if len(self._buffer) < self.batch_size:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            try:
+                flushed = await self.flush(db)
+            except Exception:
+                # The flusher must outlive any bad batch
+                logger.exception("Audit flush failed")
+                flushed = False
+            if not flushed:
+                # Back off instead of hammering an unavailable server
+                await asyncio.sleep(self.flush_interval)
+            elif self._replay_pending:
+                await self._try_replay(db)
+
+    def _claimable(self) -> list[str]:
+        """Spill files of this worker and of workers that have exited (pids may repeat after a restart)."""
+        try:
+            names = sorted(os.listdir(self.spill_dir))
+        except FileNotFoundError:
+            return []
+        return [
+            name
+            for name in names
+            if (match := SPILL_FILE.fullmatch(name))
+            and (int(match["pid"]) == os.getpid() or _process_gone(int(match["pid"])))
+        ]
+
+    async def _insert_replayed(self, db: AsyncIOMotorDatabase, events: list[dict]) -> None:
+        try:
+            await db[AUDIT_COLLECTION].insert_many(events, ordered=False)
+        except BulkWriteError as exc:
+            # Already written by an earlier, interrupted replay
+            if any(error.get("code") != 11000 for error in exc.details.get("writeErrors", [])):
+                raise
+
+    async def replay_spill(self, db: AsyncIOMotorDatabase) -> None:
+        """Load spill files left by this or an exited worker back into the collection."""
+        if self.overflow != "spill":
+            return
+        for name in self._claimable():
+            path = os.path.join(self.spill_dir, name)
+            replaying = path
+            if not name.startswith(f"replay-{os.getpid()}-"):
+                # Renamed first: claims it from other workers, and events
+                # this worker spills meanwhile go to a fresh file
+                replaying = os.path.join(self.spill_dir, f"replay-{os.getpid()}-{next(self._replays)}.ndjson")
+                try:
+                    os.replace(path, replaying)
+                except FileNotFoundError:
+                    continue
+            with open(replaying, encoding="utf-8") as spill:
+                events = [json_util.loads(line) for line in spill if line.strip()]
+            for start in range(0, len(events), self.batch_size):
+                await self._insert_replayed(db, events[start:start + self.batch_size])
+            os.remove(replaying)
+            logger.info("Replayed %d spilled audit events", len(events))
+
+    async def _try_replay(self, db: AsyncIOMotorDatabase) -> None:
+        try:
+            await self.replay_spill(db)
+            self._replay_pending = False
+        except Exception as exc:
+            # The files stay; the flusher retries after its next good flush
+            logger.warning("Audit spill replay failed: %s", exc)
+            self._replay_pending = True
+
+    async def start(self, db: AsyncIOMotorDatabase) -> None:
+        self._task = asyncio.create_task(self.run(db))
+        await self._try_replay(db)
+
+    async def stop(self, db: AsyncIOMotorDatabase) -> None:
+        """Stop the flusher and write out what is left."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if not await self.flush(db):
+            left = [self._buffer.popleft() for _ in range(len(self._buffer))]
+            audit_pending.dec(amount=len(left))
+            self._overflow(left)
+            logger.warning("%d audit events not written at shutdown", len(left))
+
+
+audit_log = AuditLog(
+    max_buffer=get_settings().audit_buffer_size,
+    batch_size=get_settings().audit_batch_size,
+    flush_interval=get_settings().audit_flush_interval_seconds,
+    overflow=get_settings().audit_overflow,
+    spill_dir=get_settings().audit_spill_dir,
+    block_timeout=get_settings().audit_block_timeout_ms / 1000,
+)
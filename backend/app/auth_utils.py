@@ -4,11 +4,16 @@ from typing import Optional
 
 import jwt
 from bson import ObjectId
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
-from .db import get_database
+from .admission import charge_user
+from .cache import TTLCache
+from .config import get_settings
+from .db import get_database, reference_filter
+from .metrics import Sampled, registry
+from .profiling import phase
 
 
 JWT_SECRET = os.getenv("JWT_SECRET", "change-this-secret-in-production")
@@ -16,6 +21,34 @@ JWT_ALGORITHM = "HS256"
 
 security_scheme = HTTPBearer(auto_error=False)
 
+# ASGI scope key under which /api/batch hands its already authenticated
+# user to the sub-requests it dispatches; clients cannot set scope keys
+PRINCIPAL_SCOPE_KEY = "app.principal"
+
+principal_cache = TTLCache(
+    ttl=get_settings().principal_cache_ttl_seconds,
+    max_entries=get_settings().principal_cache_max_entries,
+    # An unknown user id is looked up again on its next request
+    none_ttl=0,
+)
+registry.register(
+    Sampled(
+        "principal_cache_lookups_total",
+        "Authenticated user lookups answered from the principal cache or loaded.",
+        "counter",
+        lambda: {("hit",): principal_cache.hits, ("miss",): principal_cache.misses},
+        ("result",),
+    )
+)
+registry.register(
+    Sampled(
+        "principal_cache_entries",
+        "Users held in the principal cache.",
+        "gauge",
+        lambda: {(): len(principal_cache)},
+    )
+)
+
 
 def _object_id(value: str) -> ObjectId:
     try:
@@ -32,10 +65,41 @@ def create_access_token(user_id: str, expires_days: int = 30) -> str:
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 
+async def _load_principal(db: AsyncIOMotorDatabase, user_id: ObjectId) -> Optional[dict]:
+    user = await db["users"].find_one({"_id": user_id}, projection={"password": 0})
+    if not user:
+        return None
+    # Resolve the organization once here, like populate() in the Node backend
+    org_id = user.get("organization")
+    if org_id is not None and not isinstance(org_id, dict):
+        org = await db["organizations"].find_one(
+            {"_id": reference_filter(str(org_id))},
+            projection={"name": 1, "domain": 1},
+        )
+        user["organization"] = org or {"_id": org_id}
+    return user
+
+
+def invalidate_principal(user_id) -> None:
+    """Drop a cached principal after the user document changed."""
+    principal_cache.invalidate(str(user_id))
+
+
 async def get_current_user(
+    request: Request,
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security_scheme),
     db: AsyncIOMotorDatabase = Depends(get_database),
 ):
+    """
+    Resolve the bearer token to a user document with its organization
+    populated. The result is cached and shared between requests, so callers
+    must treat it as read-only.
+    """
+    principal = request.scope.get(PRINCIPAL_SCOPE_KEY)
+    if principal is not None:
+        charge_user(request.scope, principal)
+        return principal
+
     if credentials is None or credentials.scheme.lower() != "bearer":
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -44,20 +108,50 @@ async def get_current_user(
 
     token = credentials.credentials
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        with phase("auth.jwt"):
+            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         user_id: str = str(payload.get("id"))
     except jwt.PyJWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token"
         )
 
-    users = db["users"]
-    user = await users.find_one({"_id": _object_id(user_id)})
+    oid = _object_id(user_id)
+    with phase("auth.principal"):
+        user = await principal_cache.get_or_load(str(oid), lambda: _load_principal(db, oid))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found"
         )
+    if user.get("status", "active") != "active":
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Account is inactive"
+        )
 
+    charge_user(request.scope, user)
+    # Later dependencies and the profiling middleware reuse it
+    request.scope[PRINCIPAL_SCOPE_KEY] = user
     return user
 
 
+async def get_current_user_or_token(
+    request: Request,
+    token: Optional[str] = Query(default=None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security_scheme),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    """
+    ``get_current_user`` that also accepts the bearer token as ``?token=``,
+    for EventSource streams and download links, which cannot send headers.
+    """
+    if credentials is None and token:
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    return await get_current_user(request, credentials, db)
+
+
+async def get_current_admin(current_user=Depends(get_current_user)):
+    if current_user.get("role") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized as admin"
+        )
+    return current_user
@@ -0,0 +1,87 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class TTLCache:
+    """
+    Small in-process LRU cache whose entries expire after ``ttl`` seconds.
+
+    ``get_or_load`` coalesces concurrent misses: while one caller runs the
+    loader for a key, every other caller for that key awaits the same result
+    instead of starting its own load. A loader returning ``None`` (nothing
+    found) is kept for ``none_ttl`` seconds instead, and not at all when
+    that is 0, so a lookup that starts succeeding is not hidden for long.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 1024, none_ttl: float | None = None):
+        self.ttl = ttl
+        self.none_ttl = ttl if none_ttl is None else none_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            # shield() so a cancelled waiter does not cancel the shared load
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        else:
+            if value is not None:
+                self.set(key, value)
+            elif self.none_ttl > 0:
+                self.set(key, value, ttl=self.none_ttl)
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
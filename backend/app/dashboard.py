@@ -0,0 +1,332 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from .cache import TTLCache
+from .config import get_settings
+from .db import reference_filter
+
+OPEN_STATUSES = ["open", "in-progress"]
+
+STATUS_LABELS = [
+    ("approval-pending", "Approval Pending", "#ffaa00"),
+    ("approved", "Approved", "#00aaff"),
+    ("rejected", "Rejected", "#ff4444"),
+    ("open", "Open", "#00ffff"),
+    ("in-progress", "In Progress", "#ff8800"),
+    ("resolved", "Resolved", "#00ff80"),
+    ("closed", "Closed", "#888888"),
+]
+
+PRIORITY_LABELS = [
+    ("low", "Low", "#00ff80"),
+    ("medium", "Medium", "#ffff00"),
+    ("high", "High", "#ff4444"),
+    ("urgent", "Urgent", "#ff0080"),
+]
+
+PERIOD_DAYS = {"day": 1, "week": 7, "month": 30, "year": 365}
+
+# One cache for every dashboard-style payload; keys start with the endpoint name
+dashboard_cache = TTLCache(
+    ttl=get_settings().dashboard_cache_ttl_seconds,
+    max_entries=get_settings().dashboard_cache_max_entries,
+)
+
+
+def ticket_scope(user: dict, organization: str | None = None) -> dict | None:
+    """
+    Base ticket query for ``user``, following the Node dashboard rules:
+    admins see everything (optionally one organization), everyone else their
+    own organization; users only their own tickets, technicians only tickets
+    assigned to them, department heads only their department. Returns None
+    when the user can see no tickets at all.
+    """
+    role = user.get("role", "user")
+    scope: dict = {}
+    user_org = user.get("organization")
+    if isinstance(user_org, dict):
+        user_org = user_org.get("_id")
+
+    if role == "admin":
+        if organization:
+            scope["organization"] = reference_filter(organization)
+    elif user_org is not None:
+        scope["organization"] = user_org
+
+    if role == "department-head":
+        if not user.get("department"):
+            return None
+        scope["department"] = user["department"]
+    elif role == "user":
+        scope["creator"] = user["_id"]
+    elif role == "technician":
+        scope["assignee"] = user["_id"]
+    return scope
+
+
+def scope_key(scope: dict | None) -> tuple:
+    """Hashable cache key for a scope returned by ``ticket_scope``."""
+    if scope is None:
+        return ()
+    return tuple(sorted((field, str(value)) for field, value in scope.items()))
+
+
+def period_start(period: str, now: datetime) -> datetime:
+    return now - timedelta(days=PERIOD_DAYS.get(period, PERIOD_DAYS["month"]))
+
+
+def _counts(rows: list[dict]) -> dict[Any, int]:
+    return {row["_id"]: row["count"] for row in rows}
+
+
+def _distribution(counts: dict, labels: list[tuple[str, str, str]]) -> list[dict]:
+    return [
+        {"name": name, "value": counts[value], "color": color}
+        for value, name, color in labels
+        if counts.get(value, 0) > 0
+    ]
+
+
+async def ticket_dashboard(
+    collection: AsyncIOMotorCollection, scope: dict | None, projection: dict
+) -> dict:
+    """Compute /api/tickets/stats/dashboard for ``scope`` in one aggregation."""
+    if scope is None:
+        status_counts, priority_counts, overdue = {}, {}, 0
+        created, resolved, recent, my_open = {}, {}, [], []
+    else:
+        now = datetime.now(timezone.utc)
+        week_start = now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=6)
+        latest = [{"$sort": {"createdAt": -1, "_id": -1}}, {"$project": projection}]
+        pipeline = [
+            {"$match": scope},
+            {
+                "$facet": {
+                    "status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+                    "priority": [{"$group": {"_id": "$priority", "count": {"$sum": 1}}}],
+                    "overdue": [
+                        {"$match": {"status": {"$in": OPEN_STATUSES}, "dueDate": {"$ne": None, "$lt": now}}},
+                        {"$count": "count"},
+                    ],
+                    "created": [
+                        {"$match": {"createdAt": {"$gte": week_start}}},
+                        {
+                            "$group": {
+                                "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$createdAt"}},
+                                "count": {"$sum": 1},
+                            }
+                        },
+                    ],
+                    "resolved": [
+                        {"$match": {"status": "resolved", "updatedAt": {"$gte": week_start}}},
+                        {
+                            "$group": {
+                                "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$updatedAt"}},
+                                "count": {"$sum": 1},
+                            }
+                        },
+                    ],
+                    "recent": [latest[0], {"$limit": 5}, latest[1]],
+                    "myOpen": [{"$match": {"status": {"$in": OPEN_STATUSES}}}, latest[0], {"$limit": 10}, latest[1]],
+                }
+            },
+        ]
+        result = (await collection.aggregate(pipeline).to_list(length=1))[0]
+        status_counts = _counts(result["status"])
+        priority_counts = _counts(result["priority"])
+        overdue = result["overdue"][0]["count"] if result["overdue"] else 0
+        created = _counts(result["created"])
+        resolved = _counts(result["resolved"])
+        recent, my_open = result["recent"], result["myOpen"]
+
+    today = datetime.now(timezone.utc).date()
+    weekly_trends = []
+    for offset in range(6, -1, -1):
+        day = today - timedelta(days=offset)
+        key = day.isoformat()
+        weekly_trends.append(
+            {"name": day.strftime("%a"), "tickets": created.get(key, 0), "resolved": resolved.get(key, 0)}
+        )
+
+    return {
+        "totalTickets": sum(status_counts.values()),
+        "openTickets": status_counts.get("open", 0),
+        "pendingTickets": sum(status_counts.get(s, 0) for s in OPEN_STATUSES),
+        "approvedTickets": status_counts.get("approved", 0),
+        "approvalPendingTickets": status_counts.get("approval-pending", 0),
+        "rejectedTickets": status_counts.get("rejected", 0),
+        "inProgressTickets": status_counts.get("in-progress", 0),
+        "resolvedTickets": status_counts.get("resolved", 0),
+        "closedTickets": status_counts.get("closed", 0),
+        "overdueTickets": overdue,
+        "recentTickets": recent,
+        "weeklyTrends": weekly_trends,
+        "statusDistribution": _distribution(status_counts, STATUS_LABELS),
+        "priorityDistribution": _distribution(priority_counts, PRIORITY_LABELS),
+        "myOpenTickets": my_open,
+    }
+
+
+async def reports_summary(collection: AsyncIOMotorCollection, period: str, organization: str | None) -> dict:
+    """Compute /api/reports/dashboard in one aggregation."""
+    now = datetime.now(timezone.utc)
+    start_date = period_start(period, now)
+    match: dict = {"createdAt": {"$gte": start_date}}
+    if organization:
+        match["organization"] = reference_filter(organization)
+
+    is_open = {"$in": ["$status", OPEN_STATUSES]}
+    elapsed = {"$subtract": [now, "$createdAt"]}
+    allowed = {"$subtract": ["$dueDate", "$createdAt"]}
+    pipeline = [
+        {"$match": match},
+        {
+            "$facet": {
+                "status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+                "priority": [{"$group": {"_id": "$priority", "count": {"$sum": 1}}}],
+                "department": [
+                    {"$group": {"_id": "$department", "count": {"$sum": 1}}},
+                    {"$lookup": {"from": "departments", "localField": "_id", "foreignField": "_id", "as": "dept"}},
+                    {"$project": {"departmentName": {"$first": "$dept.name"}, "count": 1}},
+                ],
+                # Same rules as checkSLAStatus in the Node backend: overdue open
+                # tickets are breached, 80% of the window used is a warning
+                "sla": [
+                    {"$match": {"dueDate": {"$ne": None}}},
+                    {
+                        "$group": {
+                            "_id": None,
+                            "breached": {"$sum": {"$cond": [{"$and": [is_open, {"$lt": ["$dueDate", now]}]}, 1, 0]}},
+                            "warnings": {
+                                "$sum": {
+                                    "$cond": [
+                                        {
+                                            "$and": [
+                                                {"$gt": ["$dueDate", now]},
+                                                {"$gte": [elapsed, {"$multiply": [allowed, 0.8]}]},
+                                            ]
+                                        },
+                                        1,
+                                        0,
+                                    ]
+                                }
+                            },
+                            "compliant": {
+                                "$sum": {
+                                    "$cond": [
+                                        {
+                                            "$and": [
+                                                {"$gt": ["$dueDate", now]},
+                                                {"$lt": [elapsed, {"$multiply": [allowed, 0.8]}]},
+                                            ]
+                                        },
+                                        1,
+                                        0,
+                                    ]
+                                }
+                            },
+                        }
+                    },
+                ],
+                "technicians": [
+                    {"$match": {"assignee": {"$ne": None}}},
+                    {
+                        "$group": {
+                            "_id": "$assignee",
+                            "totalAssigned": {"$sum": 1},
+                            "resolved": {"$sum": {"$cond": [{"$eq": ["$status", "resolved"]}, 1, 0]}},
+                            "closed": {"$sum": {"$cond": [{"$eq": ["$status", "closed"]}, 1, 0]}},
+                        }
+                    },
+                    {"$sort": {"totalAssigned": -1}},
+                    {"$limit": 10},
+                    {"$lookup": {"from": "users", "localField": "_id", "foreignField": "_id", "as": "user"}},
+                    {
+                        "$project": {
+                            "technicianName": {"$first": "$user.name"},
+                            "technicianEmail": {"$first": "$user.email"},
+                            "totalAssigned": 1,
+                            "resolved": 1,
+                            "closed": 1,
+                            "resolutionRate": {"$multiply": [{"$divide": ["$resolved", "$totalAssigned"]}, 100]},
+                        }
+                    },
+                ],
+            }
+        },
+    ]
+    result = (await collection.aggregate(pipeline).to_list(length=1))[0]
+
+    status_counts = _counts(result["status"])
+    total = sum(status_counts.values())
+    sla = result["sla"][0] if result["sla"] else {"compliant": 0, "breached": 0, "warnings": 0}
+    return {
+        "period": period,
+        "startDate": start_date,
+        "endDate": now,
+        "totalTickets": total,
+        "statusBreakdown": status_counts,
+        "priorityBreakdown": _counts(result["priority"]),
+        "departmentBreakdown": result["department"],
+        "slaMetrics": {
+            "compliant": sla["compliant"],
+            "breached": sla["breached"],
+            "warnings": sla["warnings"],
+            "complianceRate": round(sla["compliant"] / total * 100, 2) if total else 0,
+        },
+        "technicianPerformance": result["technicians"],
+    }
+
+
+def _sla_outcome(due_field: str, now: datetime) -> dict:
+    # Per ticket with a due date: [with SLA, breached], following the Node
+    # /sla-compliance rules (closed late, or still open past the deadline)
+    due = f"${due_field}"
+    breached = {
+        "$or": [
+            {"$and": [{"$in": ["$status", ["resolved", "closed"]]}, {"$gt": ["$updatedAt", due]}]},
+            {"$and": [{"$in": ["$status", OPEN_STATUSES]}, {"$lt": [due, now]}]},
+        ]
+    }
+    has_due = {"$gt": [due, None]}
+    return {
+        "total": {"$sum": {"$cond": [has_due, 1, 0]}},
+        "breached": {"$sum": {"$cond": [{"$and": [has_due, breached]}, 1, 0]}},
+    }
+
+
+async def sla_compliance(collection: AsyncIOMotorCollection, period: str, organization: str | None) -> dict:
+    """Compute /api/reports/sla-compliance from the stamped due dates in one aggregation."""
+    now = datetime.now(timezone.utc)
+    match: dict = {"createdAt": {"$gte": period_start(period, now)}}
+    if organization:
+        match["organization"] = reference_filter(organization)
+
+    response, resolution = _sla_outcome("responseDueDate", now), _sla_outcome("dueDate", now)
+    pipeline = [
+        {"$match": match},
+        {
+            "$group": {
+                "_id": None,
+                "responseTotal": response["total"],
+                "responseBreached": response["breached"],
+                "resolutionTotal": resolution["total"],
+                "resolutionBreached": resolution["breached"],
+            }
+        },
+    ]
+    rows = await collection.aggregate(pipeline).to_list(length=1)
+    counts = rows[0] if rows else {}
+
+    def summary(kind: str) -> dict:
+        total, breached = counts.get(f"{kind}Total", 0), counts.get(f"{kind}Breached", 0)
+        return {
+            "total": total,
+            "compliant": total - breached,
+            "breached": breached,
+            "complianceRate": round((total - breached) / total * 100, 2) if total else 0,
+        }
+
+    return {"period": period, "responseSLA": summary("response"), "resolutionSLA": summary("resolution")}
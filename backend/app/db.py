@@ -1,23 +1,92 @@
+import asyncio
 from typing import Any
 
+from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
 
-from .config import get_settings
+from .config import Settings, get_settings
+from . import admission, metrics, profiling
 
 _client: AsyncIOMotorClient | None = None
 
+_READ_MODES = {
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+
+def client_options(settings: Settings) -> dict[str, Any]:
+    """Pool, timeout and compression options; these override the same options in the URI."""
+    options: dict[str, Any] = {
+        "maxPoolSize": settings.mongo_max_pool_size,
+        "minPoolSize": settings.mongo_min_pool_size,
+        "serverSelectionTimeoutMS": settings.mongo_server_selection_timeout_ms,
+    }
+    if settings.mongo_max_idle_time_ms:
+        options["maxIdleTimeMS"] = settings.mongo_max_idle_time_ms
+    if settings.mongo_compressors:
+        # zstd needs the zstandard package and snappy python-snappy; the
+        # driver warns about and skips compressors it cannot load
+        options["compressors"] = settings.mongo_compressors
+    listeners = metrics.event_listeners() + admission.event_listeners() + profiling.event_listeners()
+    if listeners:
+        options["event_listeners"] = listeners
+    return options
+
 
 def get_client() -> AsyncIOMotorClient:
     global _client
     if _client is None:
         settings = get_settings()
-        _client = AsyncIOMotorClient(settings.mongodb_uri)
+        _client = AsyncIOMotorClient(settings.mongodb_uri, **client_options(settings))
     return _client
 
 
+def close_client() -> None:
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+async def warm_pool() -> None:
+    """Open ``minPoolSize`` connections (at least one) before traffic arrives."""
+    client = get_client()
+    await asyncio.gather(*(client.admin.command("ping") for _ in range(max(1, get_settings().mongo_min_pool_size))))
+
+
+def read_profiles(settings: Settings) -> dict[str, Any]:
+    """
+    Named read routing. ``primary`` is used for everything by default;
+    ``analytics`` is for reports and exports, which tolerate slightly stale
+    data and should not compete with writes on the primary.
+    """
+    mode = settings.mongo_analytics_read_preference
+    staleness = settings.mongo_analytics_max_staleness_seconds
+    analytics = _READ_MODES[mode](max_staleness=staleness or -1) if mode in _READ_MODES else Primary()
+    return {"primary": Primary(), "analytics": analytics}
+
+
 def get_database() -> AsyncIOMotorDatabase:
     settings = get_settings()
     client = get_client()
     return client[settings.database_name]
 
 
+def get_routed_database(profile: str) -> AsyncIOMotorDatabase:
+    """The database with reads routed by the named profile from ``read_profiles``."""
+    settings = get_settings()
+    return get_client().get_database(settings.database_name, read_preference=read_profiles(settings)[profile])
+
+
+def get_analytics_database() -> AsyncIOMotorDatabase:
+    """Dependency for report and export routes."""
+    return get_routed_database("analytics")
+
+
+def reference_filter(value: str) -> Any:
+    """Reference fields are stored as ObjectIds by the Node backend."""
+    return ObjectId(value) if ObjectId.is_valid(value) else value
@@ -0,0 +1,169 @@
+"""
+In-process fan-out of ticket changes to connected clients.
+
+``ticket_events`` holds one bounded queue per subscriber (an open
+``GET /api/tickets/events`` stream). Publishing never waits: a subscriber
+whose queue is full is marked overflowed and disconnected with a
+``resync`` event, and the browser reconnects and reloads. Each subscriber
+carries the ``ticket_scope`` of its user, so a ticket change is delivered
+only to users whose dashboard or list it appears in.
+
+Changes come from the app's own write path (``publish_ticket_change``
+after create, update and import), which only covers writes handled by this
+worker. With ``TICKET_EVENTS_SOURCE=changestream`` a MongoDB change stream
+on ``tickets`` feeds every worker instead (requires a replica set) and the
+write-path calls are ignored.
+"""
+import asyncio
+import logging
+from typing import Any
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import PyMongoError
+
+from .config import get_settings
+from .responses import dumps
+
+logger = logging.getLogger(__name__)
+
+# Ticket fields sent in events; enough to patch a list row or refresh counters
+EVENT_FIELDS = (
+    "_id", "ticketId", "title", "category", "priority", "status", "creator", "assignee",
+    "department", "organization", "dueDate", "createdAt", "updatedAt",
+)
+
+
+def _visible(scope: dict, ticket: dict | None) -> bool:
+    if ticket is None:
+        return False
+    return all(str(ticket.get(field)) == str(value) for field, value in scope.items())
+
+
+class Subscription:
+    def __init__(self, scope: dict, max_queue: int):
+        self.scope = scope
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.overflowed = False
+        self.closed = False
+
+    def offer(self, event: dict) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Drop the slow consumer rather than buffer without limit
+            self.overflowed = True
+
+    def close(self) -> None:
+        self.closed = True
+        try:
+            # Wake the stream if it is waiting; a full queue is drained first
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+
+class EventHub:
+    def __init__(self, max_queue: int):
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._subscribers: set[Subscription] = set()
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, scope: dict) -> Subscription:
+        subscription = Subscription(scope, self.max_queue)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+        if subscription.overflowed:
+            self.dropped += 1
+
+    def close_all(self) -> None:
+        """End every stream, e.g. when the worker drains; clients reconnect after ``retry``."""
+        for subscription in self._subscribers:
+            subscription.close()
+
+    def publish(self, event_type: str, before: dict | None, after: dict | None) -> None:
+        ticket = after if after is not None else before
+        event = {"type": event_type, "ticket": {field: ticket.get(field) for field in EVENT_FIELDS}}
+        for subscription in self._subscribers:
+            # Before or after, so a ticket leaving someone's scope still reaches them
+            if _visible(subscription.scope, after) or _visible(subscription.scope, before):
+                subscription.offer(event)
+
+    def publish_bulk(self, event_type: str, tickets: list[dict]) -> None:
+        """One summary event per subscriber for a batch (e.g. an import), not one per ticket."""
+        for subscription in self._subscribers:
+            visible = [ticket["ticketId"] for ticket in tickets if _visible(subscription.scope, ticket)]
+            if visible:
+                subscription.offer({"type": event_type, "count": len(visible), "ticketIds": visible})
+
+    async def watch(self, db: AsyncIOMotorDatabase) -> None:
+        """Publish changes from a change stream; runs until cancelled."""
+        resume_after: Any = None
+        project = {f"fullDocument.{field}": 1 for field in EVENT_FIELDS}
+        pipeline = [
+            {"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}},
+            {"$project": {"operationType": 1, **project}},
+        ]
+        while True:
+            try:
+                async with db["tickets"].watch(
+                    pipeline, full_document="updateLookup", resume_after=resume_after
+                ) as stream:
+                    async for change in stream:
+                        resume_after = stream.resume_token
+                        document = change.get("fullDocument")
+                        if document is None:
+                            continue
+                        kind = "ticket.created" if change["operationType"] == "insert" else "ticket.updated"
+                        self.publish(kind, None, document)
+            except PyMongoError as exc:
+                logger.warning("Ticket change stream interrupted, resuming: %s", exc)
+                await asyncio.sleep(1)
+
+
+def _write_path_enabled() -> bool:
+    return get_settings().ticket_events_source == "local"
+
+
+def publish_ticket_change(before: dict | None, after: dict | None) -> None:
+    """Called by the write path after a ticket is created or updated."""
+    if _write_path_enabled():
+        ticket_events.publish("ticket.created" if before is None else "ticket.updated", before, after)
+
+
+def publish_ticket_import(tickets: list[dict]) -> None:
+    if _write_path_enabled() and tickets:
+        ticket_events.publish_bulk("tickets.imported", tickets)
+
+
+ticket_events = EventHub(max_queue=get_settings().ticket_events_queue_size)
+
+
+async def sse_stream(scope: dict, heartbeat: float):
+    """Server-Sent Events body for one client; subscribed while it is being read."""
+    subscription = ticket_events.subscribe(scope)
+    try:
+        # Reconnect quickly after a drop or a deploy
+        yield b"retry: 3000\n\n"
+        while not subscription.closed:
+            if subscription.overflowed:
+                yield b'event: resync\ndata: {"reason": "slow consumer"}\n\n'
+                return
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                # Comment line: keeps proxies from closing an idle connection
+                yield b": keep-alive\n\n"
+                continue
+            if event is None:
+                return
+            yield b"event: " + event["type"].encode() + b"\ndata: " + dumps(event) + b"\n\n"
+    finally:
+        ticket_events.unsubscribe(subscription)
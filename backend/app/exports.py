@@ -0,0 +1,73 @@
+import csv
+import io
+from datetime import datetime
+from typing import AsyncIterator, Sequence
+
+from fastapi.responses import StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorCursor
+
+from .config import get_settings
+from .responses import dumps
+
+EXPORT_FORMATS = ("ndjson", "csv")
+
+
+def _csv_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat() + ("Z" if value.tzinfo is None else "")
+    if isinstance(value, (dict, list)):
+        return dumps(value).decode("utf-8")
+    return str(value)
+
+
+async def _ndjson_chunks(cursor: AsyncIOMotorCursor, batch_size: int) -> AsyncIterator[bytes]:
+    lines: list[bytes] = []
+    async for doc in cursor:
+        lines.append(dumps(doc))
+        if len(lines) >= batch_size:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+
+async def _csv_chunks(cursor: AsyncIOMotorCursor, columns: Sequence[str], batch_size: int) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    rows = 0
+    async for doc in cursor:
+        writer.writerow([_csv_value(doc.get(column)) for column in columns])
+        rows += 1
+        if rows >= batch_size:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    yield buffer.getvalue().encode("utf-8")
+
+
+def export_response(
+    cursor: AsyncIOMotorCursor, export_format: str, columns: Sequence[str], filename: str
+) -> StreamingResponse:
+    """
+    Stream ``cursor`` as NDJSON or CSV.
+
+    Documents are fetched one batch at a time and each batch is written as
+    one chunk. The next batch is only requested once the previous chunk has
+    been handed to the server, so a slow client holds back the cursor
+    instead of making the worker buffer the export.
+    """
+    batch_size = get_settings().export_batch_size
+    cursor.batch_size(batch_size)
+    if export_format == "csv":
+        body, media_type = _csv_chunks(cursor, columns, batch_size), "text/csv; charset=utf-8"
+    else:
+        body, media_type = _ndjson_chunks(cursor, batch_size), "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'},
+    )
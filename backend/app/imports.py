@@ -0,0 +1,218 @@
+"""
+Bulk ticket import.
+
+Rows are validated with ``TicketCreate``, given ticketIds from one
+contiguous block reserved per chunk, and written with unordered
+``insert_many``. Invalid or rejected rows are reported by index without
+aborting the rest of the batch. Used by ``POST /api/tickets/import`` and by
+``python -m app.imports FILE``.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncIterable, AsyncIterator, Iterable
+
+import orjson
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pydantic import BaseModel, ValidationError
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from .config import get_settings
+from .events import publish_ticket_import
+from .rollups import apply_ticket_changes, resolution_fields
+from .sequences import ticket_ids
+from .sla_engine import sla_monitor, sla_policies
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidRow:
+    """Placeholder for an input line that could not be parsed."""
+
+    def __init__(self, message: str):
+        self.message = message
+
+
+def _parse_line(line: bytes) -> Any:
+    try:
+        return orjson.loads(line)
+    except orjson.JSONDecodeError as exc:
+        return InvalidRow(f"Invalid JSON: {exc}")
+
+
+async def ndjson_rows(chunks: AsyncIterable[bytes]) -> AsyncIterator[Any]:
+    """Parse NDJSON incrementally from a stream of byte chunks."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _parse_line(line)
+    if buffer.strip():
+        yield _parse_line(buffer)
+
+
+async def iterate(rows: Iterable[Any]) -> AsyncIterator[Any]:
+    for row in rows:
+        yield row
+
+
+def _error_message(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}" for error in exc.errors()
+    )
+
+
+class TicketImporter:
+    def __init__(
+        self,
+        db: AsyncIOMotorDatabase,
+        model: type[BaseModel],
+        defaults: dict | None = None,
+        chunk_size: int | None = None,
+        concurrency: int | None = None,
+        max_errors: int = 1000,
+    ):
+        settings = get_settings()
+        self.db = db
+        self.model = model
+        self.defaults = defaults or {}
+        self.chunk_size = max(1, chunk_size or settings.import_chunk_size)
+        self.concurrency = max(1, concurrency or settings.import_concurrency)
+        self.max_errors = max_errors
+        self.success = 0
+        self.failed = 0
+        self.errors: list[dict] = []
+
+    def _error(self, index: int, message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"index": index, "message": message})
+
+    async def _prepare(self, chunk: list[tuple[int, Any]]) -> tuple[list[int], list[dict]]:
+        indexes, docs = [], []
+        now = datetime.now(timezone.utc)
+        await sla_policies.refresh_if_stale(self.db)
+        for index, row in chunk:
+            if isinstance(row, InvalidRow):
+                self._error(index, row.message)
+                continue
+            try:
+                ticket = self.model.model_validate(row)
+            except ValidationError as exc:
+                self._error(index, _error_message(exc))
+                continue
+            doc = {**ticket.model_dump(), **self.defaults, "createdAt": now, "updatedAt": now}
+            doc.update(sla_policies.stamp(doc))
+            doc.update(resolution_fields(None, doc, now))
+            docs.append(doc)
+            indexes.append(index)
+        if docs:
+            first = await ticket_ids.reserve(self.db, len(docs))
+            for offset, doc in enumerate(docs):
+                doc["ticketId"] = first + offset
+        return indexes, docs
+
+    async def _insert(self, indexes: list[int], docs: list[dict]) -> None:
+        failed: set[int] = set()
+        try:
+            await self.db["tickets"].insert_many(docs, ordered=False)
+        except BulkWriteError as exc:
+            for error in exc.details.get("writeErrors", []):
+                failed.add(error["index"])
+                self._error(indexes[error["index"]], error.get("errmsg", "Write failed"))
+        except PyMongoError as exc:
+            for index in indexes:
+                self._error(index, str(exc))
+            return
+        inserted = [doc for position, doc in enumerate(docs) if position not in failed]
+        self.success += len(inserted)
+        for doc in inserted:
+            sla_monitor.track(doc)
+        publish_ticket_import(inserted)
+        try:
+            await apply_ticket_changes(self.db, [(None, doc) for doc in inserted])
+        except PyMongoError as exc:
+            logger.warning("Rollup update after import failed: %s", exc)
+
+    async def run(self, rows: AsyncIterable[Any]) -> dict:
+        """Import ``rows``; up to ``concurrency`` chunks are written at once."""
+        pending: set[asyncio.Task] = set()
+
+        async def submit(chunk: list[tuple[int, Any]]) -> None:
+            indexes, docs = await self._prepare(chunk)
+            if not docs:
+                return
+            if len(pending) >= self.concurrency:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                pending.difference_update(done)
+            pending.add(asyncio.create_task(self._insert(indexes, docs)))
+
+        chunk: list[tuple[int, Any]] = []
+        index = 0
+        async for row in rows:
+            chunk.append((index, row))
+            index += 1
+            if len(chunk) >= self.chunk_size:
+                await submit(chunk)
+                chunk = []
+        if chunk:
+            await submit(chunk)
+        if pending:
+            await asyncio.gather(*pending)
+
+        self.errors.sort(key=lambda error: error["index"])
+        return {"success": self.success, "failed": self.failed, "errors": self.errors}
+
+
+async def _file_chunks(path: str, size: int = 1 << 20) -> AsyncIterator[bytes]:
+    with (sys.stdin.buffer if path == "-" else open(path, "rb")) as handle:
+        while chunk := handle.read(size):
+            yield chunk
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk import tickets from NDJSON or a JSON array.")
+    parser.add_argument("path", help="input file, or - for stdin")
+    parser.add_argument("--format", choices=("ndjson", "json"), default="ndjson")
+    parser.add_argument("--chunk-size", type=int, help="tickets per insert_many call")
+    parser.add_argument("--concurrency", type=int, help="insert_many calls in flight")
+    parser.add_argument("--organization", help="organization id stamped on every ticket")
+    parser.add_argument("--creator", help="user id stamped as creator of every ticket")
+    args = parser.parse_args(argv)
+
+    from .db import get_database, reference_filter
+    from .routes.tickets import TicketCreate
+
+    defaults = {}
+    if args.organization:
+        defaults["organization"] = reference_filter(args.organization)
+    if args.creator:
+        defaults["creator"] = reference_filter(args.creator)
+
+    async def run() -> dict:
+        if args.format == "json":
+            with (sys.stdin.buffer if args.path == "-" else open(args.path, "rb")) as handle:
+                data = orjson.loads(handle.read())
+            rows = iterate(data["tickets"] if isinstance(data, dict) else data)
+        else:
+            rows = ndjson_rows(_file_chunks(args.path))
+        importer = TicketImporter(
+            get_database(), TicketCreate, defaults, chunk_size=args.chunk_size, concurrency=args.concurrency
+        )
+        return await importer.run(rows)
+
+    started = time.perf_counter()
+    result = asyncio.run(run())
+    elapsed = time.perf_counter() - started
+    print(orjson.dumps(result, option=orjson.OPT_INDENT_2).decode())
+    print(f"Imported {result['success']} tickets in {elapsed:.2f}s ({result['success'] / elapsed:.0f}/s)", file=sys.stderr)
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
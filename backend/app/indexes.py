@@ -0,0 +1,128 @@
+"""
+Declarative index registry.
+
+Route modules call ``register_indexes`` at import time with the indexes their
+queries rely on; ``ensure_indexes`` creates whatever is missing when the app
+starts. Run ``python -m app.indexes --dry-run`` to compare the registry
+against a live database without changing it.
+"""
+import argparse
+import asyncio
+import json
+import logging
+from collections import defaultdict
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Options that make two indexes with the same keys behave differently
+_COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+_registry: dict[str, list[IndexModel]] = defaultdict(list)
+
+
+def _key(spec) -> tuple:
+    items = spec.items() if hasattr(spec, "items") else spec
+    return tuple((field, int(direction) if isinstance(direction, (int, float)) else direction) for field, direction in items)
+
+
+def _options(spec: dict) -> dict:
+    return {name: spec[name] for name in _COMPARED_OPTIONS if spec.get(name)}
+
+
+def register_indexes(collection: str, *indexes: IndexModel) -> None:
+    """Declare indexes a module needs on ``collection``. Duplicates are ignored."""
+    known = {_key(model.document["key"]) for model in _registry[collection]}
+    for model in indexes:
+        key = _key(model.document["key"])
+        if key not in known:
+            _registry[collection].append(model)
+            known.add(key)
+
+
+def registered_indexes() -> dict[str, list[IndexModel]]:
+    return {name: list(models) for name, models in _registry.items()}
+
+
+async def diff_indexes(db: AsyncIOMotorDatabase) -> dict[str, dict[str, list]]:
+    """
+    Compare registered indexes with the ones present in ``db``.
+
+    Returns, per collection, the ``missing`` registered indexes, the ``extra``
+    indexes nobody registered and the ``conflicting`` ones whose keys match
+    but whose options (unique, sparse, ...) differ.
+    """
+    report: dict[str, dict[str, list]] = {}
+    for collection, models in _registry.items():
+        existing = await db[collection].index_information()
+        existing_by_key = {
+            _key(info["key"]): {"name": name, **info} for name, info in existing.items() if name != "_id_"
+        }
+        missing, conflicting = [], []
+        for model in models:
+            spec = model.document
+            key = _key(spec["key"])
+            current = existing_by_key.pop(key, None)
+            if current is None:
+                missing.append(spec["name"])
+            elif _options(current) != _options(spec):
+                conflicting.append(
+                    {"name": current["name"], "existing": _options(current), "registered": _options(spec)}
+                )
+        report[collection] = {
+            "missing": missing,
+            "extra": sorted(info["name"] for info in existing_by_key.values()),
+            "conflicting": conflicting,
+        }
+    return report
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase) -> dict[str, list[str]]:
+    """
+    Create every registered index that does not exist yet.
+
+    ``create_indexes`` is a no-op for indexes that already exist, so this is
+    safe to run on every startup. A conflict on one collection is logged and
+    does not stop the others from being processed.
+    """
+    created: dict[str, list[str]] = {}
+    for collection, models in _registry.items():
+        try:
+            created[collection] = await db[collection].create_indexes(models)
+        except OperationFailure as exc:
+            logger.warning("Could not create indexes on %s: %s", collection, exc)
+    return created
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Apply or check registered MongoDB indexes.")
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="only report missing, extra and conflicting indexes",
+    )
+    args = parser.parse_args(argv)
+
+    # Importing the routes registers their indexes. Under ``python -m`` this
+    # file runs as __main__, so use the registry in the package module.
+    from . import routes  # noqa: F401
+    from .db import get_database
+    from .indexes import diff_indexes, ensure_indexes
+
+    async def run() -> dict:
+        db = get_database()
+        if not args.dry_run:
+            await ensure_indexes(db)
+        return await diff_indexes(db)
+
+    report = asyncio.run(run())
+    print(json.dumps(report, indent=2, default=str))
+    outstanding = any(item["missing"] or item["conflicting"] for item in report.values())
+    return 1 if outstanding else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
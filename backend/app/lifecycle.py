@@ -0,0 +1,134 @@
+"""
+Worker readiness, warm-up and drain.
+
+A worker is ready once its lifespan startup, including ``warm_up``, has
+finished, and stops being ready as soon as it starts draining.
+``GET /api/ready`` reports this to load balancers and orchestrators, while
+``GET /api/health`` only says the process is up.
+
+``warm_up`` moves first-request costs into startup: principals of recently
+active users are loaded in two queries, the mention directory is built,
+the OpenAPI schema is generated and one request is sent through the full
+middleware stack. A freshly deployed worker then serves its first real
+requests at normal latency.
+
+Draining starts when the server is asked to stop (SIGTERM, see
+``app.serve``). The worker reports not ready and ends its Server-Sent
+Event streams so those clients reconnect to another worker. uvicorn then
+finishes in-flight requests, for up to ``graceful_shutdown_seconds``,
+before the lifespan shutdown closes the pool.
+"""
+import logging
+import time
+
+from fastapi import FastAPI
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import DESCENDING
+from pymongo.errors import PyMongoError
+
+from .auth_utils import principal_cache
+from .events import ticket_events
+from .mentions import mention_index
+
+logger = logging.getLogger(__name__)
+
+
+class Lifecycle:
+    def __init__(self):
+        self.ready = False
+        self.draining = False
+        self.ready_at: float | None = None
+
+    def mark_ready(self) -> None:
+        self.ready = True
+        self.ready_at = time.monotonic()
+
+    def begin_drain(self) -> None:
+        if self.draining:
+            return
+        self.draining = True
+        self.ready = False
+        ticket_events.close_all()
+
+    def status(self) -> str:
+        if self.draining:
+            return "draining"
+        return "ready" if self.ready else "starting"
+
+
+lifecycle = Lifecycle()
+
+
+async def prime_principals(db: AsyncIOMotorDatabase, limit: int) -> int:
+    """
+    Put up to ``limit`` active users, most recently updated first, into the
+    principal cache, with their organizations resolved as ``_load_principal``
+    does; two queries instead of two per user on their first request.
+    """
+    if limit <= 0:
+        return 0
+    users = (
+        await db["users"]
+        .find({"status": {"$in": ["active", None]}}, projection={"password": 0})
+        .sort("updatedAt", DESCENDING)
+        .limit(limit)
+        .to_list(length=limit)
+    )
+    org_ids = {
+        user["organization"]
+        for user in users
+        if user.get("organization") is not None and not isinstance(user["organization"], dict)
+    }
+    organizations = {}
+    if org_ids:
+        async for org in db["organizations"].find({"_id": {"$in": list(org_ids)}}, projection={"name": 1, "domain": 1}):
+            organizations[org["_id"]] = org
+    for user in users:
+        org_id = user.get("organization")
+        if org_id is not None and not isinstance(org_id, dict):
+            user["organization"] = organizations.get(org_id) or {"_id": org_id}
+        principal_cache.set(str(user["_id"]), user)
+    return len(users)
+
+
+async def _self_request(app: FastAPI, path: str) -> int:
+    """One GET through the whole ASGI stack, so middleware and routing are built before traffic."""
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode("latin-1"),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"warmup")],
+        "client": ("127.0.0.1", 0),
+        "server": ("127.0.0.1", 0),
+    }
+    await app(scope, receive, send)
+    return status
+
+
+async def warm_up(app: FastAPI, db: AsyncIOMotorDatabase, principals: int) -> None:
+    started = time.perf_counter()
+    try:
+        primed = await prime_principals(db, principals)
+        await mention_index.ensure_fresh(db)
+    except PyMongoError as exc:
+        primed = 0
+        logger.warning("Cache warm-up skipped: %s", exc)
+    app.openapi()
+    await _self_request(app, "/api/health")
+    logger.info("Worker warmed up in %.0f ms (%d principals cached)", (time.perf_counter() - started) * 1000, primed)
@@ -1,6 +1,23 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from pymongo.errors import PyMongoError
 
+from .admission import AdmissionMiddleware
+from .audit import audit_log
 from .config import get_settings
+from .db import close_client, get_database, warm_pool
+from .events import ticket_events
+from .indexes import ensure_indexes
+from .lifecycle import lifecycle, warm_up
+from .metrics import MetricsMiddleware
+from .passwords import password_hasher
+from .profiling import ProfilingMiddleware, install as install_profiling
+from .refdata import refdata
+from .responses import BSONResponse
+from .sla_engine import sla_monitor, sla_policies
 from .routes import (
     health,
     tickets,
@@ -11,22 +28,93 @@ from .routes import (
     departments,
     sla,
     reports,
+    metrics,
+    batch,
+    attachments,
+    comments,
+    profiling,
 )
 
 
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings()
+    db = get_database()
+    try:
+        await warm_pool()
+    except PyMongoError as exc:
+        logger.warning("MongoDB not reachable at startup: %s", exc)
+    if settings.ensure_indexes_on_startup:
+        try:
+            await ensure_indexes(db)
+        except PyMongoError as exc:
+            # Serving without indexes is slow, not broken; don't block startup
+            logger.warning("Index creation skipped: %s", exc)
+    try:
+        await refdata.refresh_versions(db)
+    except PyMongoError as exc:
+        logger.warning("Reference data versions not loaded: %s", exc)
+    if settings.audit_enabled:
+        await audit_log.start(db)
+    refdata_poller = asyncio.create_task(refdata.poll(db, settings.refdata_poll_interval_seconds))
+    background = [refdata_poller]
+    if settings.ticket_events_source == "changestream":
+        background.append(asyncio.create_task(ticket_events.watch(db)))
+    try:
+        await sla_policies.load(db)
+        if settings.sla_monitor_enabled:
+            await sla_monitor.start(db)
+    except PyMongoError as exc:
+        logger.warning("SLA monitor not started: %s", exc)
+    await warm_up(app, db, settings.warmup_principals)
+    lifecycle.mark_ready()
+
+    yield
+
+    lifecycle.begin_drain()
+    await sla_monitor.stop()
+    for task in background:
+        task.cancel()
+    # After in-flight requests have finished, so their events are included
+    await audit_log.stop(db)
+    password_hasher.shutdown()
+    close_client()
+
+
 def create_app() -> FastAPI:
-    app = FastAPI(title="Ticketing Tool API (FastAPI)")
+    app = FastAPI(
+        title="Ticketing Tool API (FastAPI)",
+        lifespan=lifespan,
+        default_response_class=BSONResponse,
+    )
+    # Innermost: times the request after admission, as the handler sees it
+    if get_settings().profiling_enabled:
+        install_profiling()
+        app.add_middleware(ProfilingMiddleware)
+    # Added first so it runs inside MetricsMiddleware and shed requests are counted
+    if get_settings().admission_enabled:
+        app.add_middleware(AdmissionMiddleware)
+    if get_settings().metrics_enabled:
+        app.add_middleware(MetricsMiddleware)
 
     # Routers
     app.include_router(health.router, prefix="/api")
     app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
     app.include_router(tickets.router, prefix="/api/tickets", tags=["tickets"])
+    app.include_router(attachments.router, prefix="/api/tickets", tags=["attachments"])
+    app.include_router(comments.router, prefix="/api/tickets", tags=["comments"])
     app.include_router(organizations.router, prefix="/api/organizations", tags=["organizations"])
     app.include_router(users.router, prefix="/api/users", tags=["users"])
     app.include_router(categories.router, prefix="/api/categories", tags=["categories"])
     app.include_router(departments.router, prefix="/api/departments", tags=["departments"])
     app.include_router(sla.router, prefix="/api/admin/sla", tags=["sla"])
     app.include_router(reports.router, prefix="/api/reports", tags=["reports"])
+    app.include_router(metrics.router, prefix="/api", tags=["metrics"])
+    app.include_router(batch.router, prefix="/api", tags=["batch"])
+    app.include_router(profiling.router, prefix="/api/admin/profiling", tags=["profiling"])
 
     return app
 
@@ -35,9 +123,8 @@ app = create_app()
 
 
 if __name__ == "__main__":
-    import uvicorn
+    from .serve import main
 
-    settings = get_settings()
-    uvicorn.run("app.main:app", host="0.0.0.0", port=settings.port, reload=False)
+    main()
 
 
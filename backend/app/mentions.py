@@ -0,0 +1,229 @@
+"""
+In-memory directory for @mention autocomplete.
+
+Active users are indexed per organization as a sorted list of
+``(token, user id)`` pairs, where tokens are the lowercased full name, each
+name word, the email address and the parts of its local part. A prefix
+query is one bisect plus a short forward scan, so answering it never
+touches MongoDB. The directory is kept current three ways: routes that
+change users call ``upsert``; every ``refresh_seconds`` users changed since
+the last sync (by ``updatedAt``) are re-read; and every
+``rebuild_seconds`` it is rebuilt from scratch to drop users deleted
+outside this app. A rebuild sorts each directory once, in a worker thread,
+so the event loop keeps serving meanwhile.
+"""
+import asyncio
+import hashlib
+import re
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel
+
+from .config import get_settings
+from .indexes import register_indexes
+from .responses import dumps
+
+register_indexes("users", IndexModel([("updatedAt", ASCENDING)]))
+
+PROJECTION = {"name": 1, "email": 1, "organization": 1, "status": 1, "updatedAt": 1}
+
+# Tolerates clock differences between app servers when syncing by updatedAt
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+class MentionResult(NamedTuple):
+    body: bytes
+    etag: str
+
+
+def _org_key(organization) -> str | None:
+    if isinstance(organization, dict):
+        organization = organization.get("_id")
+    return str(organization) if organization is not None else None
+
+
+def _tokens(name: str, email: str) -> set[str]:
+    name, email = name.lower().strip(), email.lower().strip()
+    tokens = {name, email, *name.split()}
+    tokens.update(re.split(r"[._+-]", email.split("@", 1)[0]))
+    tokens.discard("")
+    return tokens
+
+
+def _result(users: list[dict]) -> MentionResult:
+    body = dumps(users)
+    return MentionResult(body, f'"{hashlib.sha1(body).hexdigest()}"')
+
+
+class _Directory:
+    """Users of one organization (or of all organizations, keyed ``None``)."""
+
+    def __init__(self):
+        self.tokens: list[tuple[str, str]] = []
+        self.users: dict[str, dict] = {}
+        self._by_name: list[dict] | None = None
+        self._everyone: MentionResult | None = None
+
+    def add(self, key: str, user: dict) -> None:
+        self.users[key] = user
+        for token in _tokens(user["name"], user["email"]):
+            insort(self.tokens, (token, key))
+        self._by_name = self._everyone = None
+
+    def load(self, key: str, user: dict) -> None:
+        """Add without keeping ``tokens`` sorted; the caller sorts once when done."""
+        self.users[key] = user
+        self.tokens.extend((token, key) for token in _tokens(user["name"], user["email"]))
+
+    def remove(self, key: str) -> None:
+        user = self.users.pop(key, None)
+        if user is None:
+            return
+        for token in _tokens(user["name"], user["email"]):
+            position = bisect_left(self.tokens, (token, key))
+            if position < len(self.tokens) and self.tokens[position] == (token, key):
+                del self.tokens[position]
+        self._by_name = self._everyone = None
+
+    def match(self, prefix: str, limit: int) -> list[dict]:
+        """First ``limit`` distinct users with a token starting with ``prefix``, in token order."""
+        found: dict[str, dict] = {}
+        position = bisect_left(self.tokens, (prefix, ""))
+        while position < len(self.tokens) and len(found) < limit:
+            token, key = self.tokens[position]
+            if not token.startswith(prefix):
+                break
+            found.setdefault(key, self.users[key])
+            position += 1
+        return list(found.values())
+
+    def exact(self, token: str) -> list[dict]:
+        """Users with ``token`` itself among their tokens."""
+        found = []
+        position = bisect_left(self.tokens, (token, ""))
+        while position < len(self.tokens) and self.tokens[position][0] == token:
+            found.append(self.users[self.tokens[position][1]])
+            position += 1
+        return found
+
+    def by_name(self) -> list[dict]:
+        if self._by_name is None:
+            self._by_name = sorted(self.users.values(), key=lambda user: user["name"])
+        return self._by_name
+
+    def everyone(self) -> MentionResult:
+        if self._everyone is None:
+            self._everyone = _result(self.by_name())
+        return self._everyone
+
+
+def _user(doc: dict) -> dict:
+    return {"_id": doc["_id"], "name": doc.get("name") or "", "email": doc.get("email") or ""}
+
+
+def _build(docs: list[dict]) -> tuple[dict[str | None, _Directory], dict[str, str | None]]:
+    """Directories for a full user list, each sorted once at the end."""
+    directories: dict[str | None, _Directory] = {}
+    organizations: dict[str, str | None] = {}
+    for doc in docs:
+        if doc.get("status", "active") != "active":
+            continue
+        key, user = str(doc["_id"]), _user(doc)
+        organization = _org_key(doc.get("organization"))
+        organizations[key] = organization
+        for directory_key in {organization, None}:
+            directories.setdefault(directory_key, _Directory()).load(key, user)
+    for directory in directories.values():
+        directory.tokens.sort()
+    return directories, organizations
+
+
+class MentionIndex:
+    def __init__(self, refresh_seconds: float, rebuild_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self._directories: dict[str | None, _Directory] = {}
+        self._organizations: dict[str, str | None] = {}
+        self._synced_to: datetime | None = None
+        self._refreshed_at = 0.0
+        self._rebuilt_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def upsert(self, doc: dict) -> None:
+        """Apply a user document (as stored) to the directory."""
+        key = str(doc["_id"])
+        for directory_key in {self._organizations.pop(key, None), None}:
+            if directory_key in self._directories:
+                self._directories[directory_key].remove(key)
+        if doc.get("status", "active") != "active":
+            return
+        user = _user(doc)
+        organization = _org_key(doc.get("organization"))
+        self._organizations[key] = organization
+        for directory_key in {organization, None}:
+            self._directories.setdefault(directory_key, _Directory()).add(key, user)
+
+    async def _rebuild(self, db: AsyncIOMotorDatabase) -> None:
+        started = datetime.now(timezone.utc)
+        docs = await db["users"].find({"status": "active"}, projection=PROJECTION).to_list(length=None)
+        # Built apart and swapped in without awaiting, so searches never see a half-built directory
+        self._directories, self._organizations = await asyncio.to_thread(_build, docs)
+        self._synced_to = started
+        self._rebuilt_at = self._refreshed_at = time.monotonic()
+
+    async def _sync(self, db: AsyncIOMotorDatabase) -> None:
+        started = datetime.now(timezone.utc)
+        query = {"updatedAt": {"$gte": self._synced_to - SYNC_OVERLAP}}
+        async for doc in db["users"].find(query, projection=PROJECTION):
+            self.upsert(doc)
+        self._synced_to = started
+        self._refreshed_at = time.monotonic()
+
+    async def ensure_fresh(self, db: AsyncIOMotorDatabase) -> None:
+        now = time.monotonic()
+        if now - self._refreshed_at < self.refresh_seconds and self._synced_to is not None:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            if self._synced_to is None or now - self._rebuilt_at >= self.rebuild_seconds:
+                await self._rebuild(db)
+            elif now - self._refreshed_at >= self.refresh_seconds:
+                await self._sync(db)
+
+    def search(self, organization, prefix: str | None, limit: int) -> MentionResult:
+        """
+        Users of ``organization`` (all users when ``None``) matching ``prefix``.
+        An empty prefix gives the first ``limit`` users by name; ``None``
+        gives the whole directory, as the endpoint returned before ``q``.
+        """
+        directory = self._directories.get(_org_key(organization)) or _Directory()
+        if prefix is None:
+            return directory.everyone()
+        prefix = prefix.lower().strip()
+        if not prefix:
+            return _result(directory.by_name()[:limit])
+        return _result(directory.match(prefix, limit))
+
+    def resolve(self, organization, names: list[str]) -> list[dict]:
+        """
+        Users for the ``@name`` mentions of a comment, without duplicates. A
+        name must equal one of a user's tokens (a name word or email part)
+        and belong to that user alone; ambiguous or partial names tag nobody.
+        """
+        directory = self._directories.get(_org_key(organization)) or _Directory()
+        found: dict[str, dict] = {}
+        for name in names:
+            users = directory.exact(name.lower())
+            if len(users) == 1:
+                found.setdefault(str(users[0]["_id"]), users[0])
+        return list(found.values())
+
+
+mention_index = MentionIndex(
+    refresh_seconds=get_settings().mentions_refresh_seconds,
+    rebuild_seconds=get_settings().mentions_rebuild_seconds,
+)
@@ -0,0 +1,281 @@
+"""
+Request and MongoDB instrumentation in Prometheus text format.
+
+``MetricsMiddleware`` records per-route latency histograms, status
+counters and an in-flight gauge. ``CommandMetrics`` is a pymongo
+``CommandListener`` timing every command per collection (and logging the
+ones slower than ``slow_query_ms``); ``PoolMetrics`` counts connection pool
+events. Both listeners are attached by ``db.get_client``. Everything lives
+in ``registry`` and is rendered by ``GET /api/metrics``.
+
+Metrics are plain dicts guarded by a lock, since listeners are called from
+the driver's threads; an observation is a bisect and two additions.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable
+
+from pymongo import monitoring
+
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers a cached response through a slow report
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, key)} {value}" for key, value in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (last is +Inf), sum]
+        self._values: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][position] += 1
+            entry[1] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        lines = self.header()
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == "+Inf" else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Sampled(_Metric):
+    """
+    A metric whose values are kept elsewhere (a cache's hit counters, a
+    queue's length) and read by ``sample`` at every render, as a mapping
+    of label values to the current value.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        kind: str,
+        sample: Callable[[], dict[tuple[str, ...], float]],
+        labelnames: Iterable[str] = (),
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.kind = kind
+        self.sample = sample
+
+    def render(self) -> list[str]:
+        values = self.sample().items()
+        return self.header() + [f"{self.name}{_labels(self.labelnames, key)} {value}" for key, value in values]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(
+    Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+)
+http_latency = registry.register(
+    Histogram("http_request_duration_seconds", "HTTP request latency until the response completed.", ("method", "route"))
+)
+http_in_flight = registry.register(Gauge("http_requests_in_flight", "HTTP requests being served.", ("method",)))
+mongo_latency = registry.register(
+    Histogram("mongodb_command_duration_seconds", "MongoDB command latency.", ("command", "collection"))
+)
+mongo_failures = registry.register(
+    Counter("mongodb_command_failures_total", "Failed MongoDB commands.", ("command", "collection"))
+)
+mongo_pool_events = registry.register(
+    Counter("mongodb_pool_events_total", "MongoDB connection pool events.", ("event",))
+)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware, so streaming responses are timed to their last
+    chunk. Requests are labelled with the route template (``/api/tickets/{ticket_id}``),
+    not the raw path, to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        http_in_flight.inc(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_in_flight.dec(method)
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            http_latency.observe(elapsed, method, template)
+            http_requests.inc(method, template, status)
+
+
+class CommandMetrics(monitoring.CommandListener):
+    def __init__(self, slow_query_ms: float):
+        self.slow_query_ms = slow_query_ms
+        # (connection, request id) -> collection, between started and finished
+        self._collections: dict[tuple, str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        target = event.command.get(event.command_name)
+        # getMore carries the cursor id there and names the collection separately
+        collection = target if isinstance(target, str) else event.command.get("collection", "")
+        self._collections[(event.connection_id, event.request_id)] = collection
+
+    def _finish(self, event, failed: bool) -> None:
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        seconds = event.duration_micros / 1_000_000
+        mongo_latency.observe(seconds, event.command_name, collection)
+        if failed:
+            mongo_failures.inc(event.command_name, collection)
+        if self.slow_query_ms and seconds * 1000 >= self.slow_query_ms:
+            logger.warning(
+                "Slow MongoDB command: %s on %s.%s took %.1f ms",
+                event.command_name,
+                event.database_name,
+                collection or "-",
+                seconds * 1000,
+            )
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event, failed=False)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event, failed=True)
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    def pool_created(self, event):
+        mongo_pool_events.inc("pool_created")
+
+    def pool_ready(self, event):
+        mongo_pool_events.inc("pool_ready")
+
+    def pool_cleared(self, event):
+        mongo_pool_events.inc("pool_cleared")
+
+    def pool_closed(self, event):
+        mongo_pool_events.inc("pool_closed")
+
+    def connection_created(self, event):
+        mongo_pool_events.inc("connection_created")
+
+    def connection_ready(self, event):
+        mongo_pool_events.inc("connection_ready")
+
+    def connection_closed(self, event):
+        mongo_pool_events.inc("connection_closed")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        mongo_pool_events.inc("check_out_failed")
+
+    def connection_checked_out(self, event):
+        mongo_pool_events.inc("checked_out")
+
+    def connection_checked_in(self, event):
+        mongo_pool_events.inc("checked_in")
+
+
+def event_listeners() -> list:
+    """Listeners to pass to the Mongo client, or none when metrics are disabled."""
+    settings = get_settings()
+    if not settings.metrics_enabled:
+        return []
+    return [CommandMetrics(settings.slow_query_ms), PoolMetrics()]
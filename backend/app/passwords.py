@@ -0,0 +1,89 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from .config import get_settings
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hash operations are already running or queued."""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt off the event loop in a dedicated thread pool.
+
+    bcrypt releases the GIL while hashing, so threads give real parallelism
+    while the loop keeps serving other requests. At most ``workers``
+    operations run at once and ``max_queue`` more may wait; anything beyond
+    that is rejected immediately with ``PasswordHasherBusy`` instead of
+    piling up behind a login storm.
+    """
+
+    def __init__(self, workers: int, max_queue: int, rounds: int):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.rounds = rounds
+        self.rejected = 0
+        self._pending = 0
+        self._executor: ThreadPoolExecutor | None = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, func, *args):
+        if self._pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordHasherBusy()
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), func, *args)
+        finally:
+            self._pending -= 1
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        try:
+            return await self._run(bcrypt.checkpw, password.encode("utf-8"), hashed.encode("utf-8"))
+        except ValueError:
+            # Malformed hash in the database
+            return False
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._run(_hashpw, password.encode("utf-8"), self.rounds)
+        return hashed.decode("utf-8")
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """True when ``hashed`` was made with a different cost than configured."""
+        try:
+            return int(hashed.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return False
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def _hashpw(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+
+
+def _create_hasher() -> PasswordHasher:
+    settings = get_settings()
+    return PasswordHasher(
+        workers=settings.password_hash_workers or os.cpu_count() or 1,
+        max_queue=settings.password_hash_max_queue,
+        rounds=settings.bcrypt_rounds,
+    )
+
+
+password_hasher = _create_hasher()
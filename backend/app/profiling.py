@@ -0,0 +1,411 @@
+"""
+On-demand request profiling and slow-request capture.
+
+``ProfilingMiddleware`` profiles a request when it is sampled (a fraction
+``sample_rate`` of all requests) or when it carries ``X-Profile: 1`` and
+the caller turns out to be an admin. A profiled request records a timing
+breakdown:
+
+* ``dependencies``, ``endpoint``, ``serialize``: FastAPI's phases. These
+  come from wrappers that ``install`` puts around the functions in
+  ``fastapi.routing``.
+* ``auth.jwt`` and ``auth.principal``: timed inside ``get_current_user``.
+* ``mongo.<command>``: one entry per MongoDB command, from a
+  ``CommandListener``. Motor runs commands with the caller's context, so
+  each command is attributed to its request.
+* ``encode``: JSON encoding in ``BSONResponse``.
+
+With ``stacks`` on, a sampler thread also records every
+``stack_interval_ms`` where each profiled request is. When the request is
+running, the sample is the event loop thread's stack. When it is waiting,
+the sample is its coroutine chain. Samples are kept as collapsed stacks
+(flame graph input).
+
+Every request, profiled or not, is timed. Those slower than ``slow_ms``,
+plus admin ``X-Profile`` requests, go into a bounded ring buffer.
+Streaming responses (the event stream, exports, attachment downloads) are
+long by design and are left out, so they do not push real slow requests
+out of the buffer. ``/api/admin/profiling`` can list, dump and clear it and
+can change these options at runtime. Options and buffer are per worker
+process; profile ids carry the worker's pid, and every admin response
+says which worker answered it. Admin
+``X-Profile`` responses also get a ``Server-Timing`` header with the phase
+totals, so browser dev tools show the breakdown.
+"""
+import asyncio
+import contextvars
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter as Tally, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from pymongo import monitoring
+
+from .config import get_settings
+
+PROFILE_HEADER = b"x-profile"
+# Responses that stay open as long as the client reads
+STREAMING_PATHS = {"/api/tickets/events"}
+STREAMING_SUFFIXES = ("/export",)
+# Frames kept per stack sample, innermost last
+MAX_STACK_DEPTH = 40
+
+current_profile: contextvars.ContextVar["RequestProfile | None"] = contextvars.ContextVar(
+    "current_profile", default=None
+)
+
+
+class RequestProfile:
+    _ids = itertools.count(1)
+
+    def __init__(self, method: str, path: str, requested: bool):
+        self.id = f"{os.getpid()}-{next(self._ids)}"
+        self.method = method
+        self.path = path
+        self.requested = requested
+        self.at = datetime.now(timezone.utc)
+        self.route: str | None = None
+        self.status = 0
+        self.total_ms = 0.0
+        self.profiled = True
+        self.phases: list[tuple[str, float, float, dict]] = []
+        self.stacks: Tally = Tally()
+        self._start = time.perf_counter()
+
+    def offset_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+
+    def add(self, name: str, start_ms: float, duration_ms: float, **detail) -> None:
+        # list.append is atomic, so driver threads may call this too
+        self.phases.append((name, start_ms, duration_ms, detail))
+
+    @contextmanager
+    def phase(self, name: str, **detail):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.add(name, (start - self._start) * 1000, (end - start) * 1000, **detail)
+
+    def finish(self, status: int, route: str | None) -> None:
+        self.total_ms = self.offset_ms()
+        self.status = status
+        self.route = route
+
+    def totals(self) -> dict[str, float]:
+        """Milliseconds per phase name, ``mongo.*`` also summed as ``mongo``."""
+        totals: dict[str, float] = {}
+        for name, _, duration, _ in self.phases:
+            totals[name] = totals.get(name, 0.0) + duration
+            if name.startswith("mongo."):
+                totals["mongo"] = totals.get("mongo", 0.0) + duration
+        return {name: round(value, 3) for name, value in totals.items()}
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "at": self.at,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "totalMs": round(self.total_ms, 3),
+            "profiled": self.profiled,
+            "requested": self.requested,
+            "phases": self.totals(),
+        }
+
+    def dump(self) -> dict:
+        return {
+            **self.summary(),
+            "timeline": [
+                {"name": name, "startMs": round(start, 3), "durationMs": round(duration, 3), **detail}
+                for name, start, duration, detail in sorted(self.phases, key=lambda phase: phase[1])
+            ],
+            "stacks": [{"stack": stack, "samples": count} for stack, count in self.stacks.most_common()],
+        }
+
+    def server_timing(self) -> str:
+        return ", ".join(
+            f"{name.replace('.', '-')};dur={duration}" for name, duration in self.totals().items()
+        )
+
+
+@contextmanager
+def phase(name: str, **detail):
+    """Time a block as ``name`` in the current request's profile; free when not profiling."""
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+    with profile.phase(name, **detail):
+        yield
+
+
+class ProfilingConfig:
+    def __init__(self, sample_rate: float, slow_ms: float, stacks: bool, stack_interval_ms: float):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.stacks = stacks
+        self.stack_interval_ms = stack_interval_ms
+
+    def as_dict(self) -> dict:
+        return {
+            "sampleRate": self.sample_rate,
+            "slowMs": self.slow_ms,
+            "stacks": self.stacks,
+            "stackIntervalMs": self.stack_interval_ms,
+        }
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}:{frame.f_lineno}"
+
+
+def _coroutine_stack(coro) -> list[str]:
+    """Frames of a suspended coroutine chain, outermost first."""
+    labels = []
+    while coro is not None and len(labels) < MAX_STACK_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        labels.append(_frame_label(frame))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "ag_await", None)
+    return labels
+
+
+def _thread_stack(frame) -> list[str]:
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return labels[::-1]
+
+
+class StackSampler:
+    """
+    One daemon thread sampling the requests registered with ``add``. This is
+    a best-effort profiler: it reads another thread's frames without
+    stopping it.
+    """
+
+    def __init__(self):
+        self.interval = 0.005
+        self._active: dict[asyncio.Task, tuple[RequestProfile, int]] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def add(self, task: asyncio.Task, profile: RequestProfile, interval_ms: float) -> None:
+        self.interval = max(0.001, interval_ms / 1000)
+        with self._lock:
+            self._active[task] = (profile, threading.get_ident())
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+            self._thread.start()
+        self._wakeup.set()
+
+    def remove(self, task: asyncio.Task) -> None:
+        with self._lock:
+            self._active.pop(task, None)
+
+    def _sample(self) -> None:
+        with self._lock:
+            active = list(self._active.items())
+        frames = sys._current_frames()
+        for task, (profile, thread_id) in active:
+            coro = task.get_coro()
+            if getattr(coro, "cr_running", False):
+                # On the CPU right now: the loop thread's stack is this request's
+                stack = _thread_stack(frames.get(thread_id))
+                state = "running"
+            else:
+                stack = _coroutine_stack(coro)
+                state = "waiting"
+            if stack:
+                profile.stacks[f"{state};" + ";".join(stack)] += 1
+
+    def _run(self) -> None:
+        while True:
+            if not self._active:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            self._sample()
+            time.sleep(self.interval)
+
+
+class ProfileCommands(monitoring.CommandListener):
+    """Adds each MongoDB command to the profile of the request that issued it."""
+
+    def __init__(self):
+        self._started: dict[tuple, tuple[str, float]] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        profile = current_profile.get()
+        if profile is None:
+            return
+        target = event.command.get(event.command_name)
+        collection = target if isinstance(target, str) else event.command.get("collection", "")
+        self._started[(event.connection_id, event.request_id)] = (collection, profile.offset_ms())
+
+    def _finish(self, event, failed: bool) -> None:
+        entry = self._started.pop((event.connection_id, event.request_id), None)
+        profile = current_profile.get()
+        if entry is None or profile is None:
+            return
+        collection, start = entry
+        detail = {"collection": collection}
+        if failed:
+            detail["failed"] = True
+        profile.add(f"mongo.{event.command_name}", start, event.duration_micros / 1000, **detail)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event, failed=False)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event, failed=True)
+
+
+class Profiler:
+    def __init__(self, config: ProfilingConfig, buffer_size: int):
+        self.config = config
+        self.captured: deque[RequestProfile] = deque(maxlen=buffer_size)
+        self.sampler = StackSampler()
+
+    def find(self, profile_id: str) -> RequestProfile | None:
+        return next((profile for profile in self.captured if profile.id == profile_id), None)
+
+    def clear(self) -> None:
+        self.captured.clear()
+
+
+profiler = Profiler(
+    ProfilingConfig(
+        sample_rate=get_settings().profiling_sample_rate,
+        slow_ms=get_settings().profiling_slow_ms,
+        stacks=get_settings().profiling_stacks,
+        stack_interval_ms=get_settings().profiling_stack_interval_ms,
+    ),
+    buffer_size=get_settings().profiling_buffer_size,
+)
+
+
+def _streaming(path: str) -> bool:
+    return path in STREAMING_PATHS or path.endswith(STREAMING_SUFFIXES) or "/attachments/" in path
+
+
+def _is_admin(scope: dict) -> bool:
+    # auth_utils imports this module (through db), so not at the top
+    from .auth_utils import PRINCIPAL_SCOPE_KEY
+
+    principal = scope.get(PRINCIPAL_SCOPE_KEY)
+    return principal is not None and principal.get("role") == "admin"
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware: times every request and profiles sampled or requested ones."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        config = profiler.config
+        requested = any(name == PROFILE_HEADER and value == b"1" for name, value in scope["headers"])
+        streaming = _streaming(scope["path"])
+        sampled = not streaming and config.sample_rate > 0 and random.random() < config.sample_rate
+        if not (requested or sampled):
+            if streaming:
+                await self.app(scope, receive, send)
+            else:
+                await self._timed(scope, receive, send, config.slow_ms)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"], requested)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if requested and _is_admin(scope):
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", profile.server_timing().encode("latin-1")))
+                    headers.append((b"x-profile-id", profile.id.encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        token = current_profile.set(profile)
+        task = asyncio.current_task()
+        if config.stacks:
+            profiler.sampler.add(task, profile, config.stack_interval_ms)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.sampler.remove(task)
+            current_profile.reset(token)
+            profile.finish(status, getattr(scope.get("route"), "path", None))
+            # Only admins may ask for a capture; anyone's request may be slow
+            if (not streaming and profile.total_ms >= config.slow_ms) or (requested and _is_admin(scope)):
+                profiler.captured.append(profile)
+
+    async def _timed(self, scope, receive, send, slow_ms: float) -> None:
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if slow_ms and elapsed_ms >= slow_ms:
+                # Slow but not profiled: no breakdown, still worth listing
+                profile = RequestProfile(scope["method"], scope["path"], False)
+                profile.profiled = False
+                profile.total_ms = elapsed_ms
+                profile.status = status
+                profile.route = getattr(scope.get("route"), "path", None)
+                profiler.captured.append(profile)
+
+
+def install() -> None:
+    """Wrap FastAPI's dependency, endpoint and serialization steps in profile phases (once per process)."""
+    import fastapi.routing as routing
+
+    if getattr(routing, "_profiling_installed", False):
+        return
+
+    def timed(name: str, func):
+        async def wrapper(*args, **kwargs):
+            profile = current_profile.get()
+            if profile is None:
+                return await func(*args, **kwargs)
+            with profile.phase(name):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    routing.solve_dependencies = timed("dependencies", routing.solve_dependencies)
+    routing.run_endpoint_function = timed("endpoint", routing.run_endpoint_function)
+    routing.serialize_response = timed("serialize", routing.serialize_response)
+    routing._profiling_installed = True
+
+
+def event_listeners() -> list:
+    """Listeners to pass to the Mongo client, or none when profiling is disabled."""
+    return [ProfileCommands()] if get_settings().profiling_enabled else []
@@ -0,0 +1,123 @@
+"""
+Versioned cache for rarely changing catalogs (categories, departments,
+organizations, SLA policies).
+
+Each catalog has a version number in the ``refdata_versions`` collection.
+Responses are cached pre-serialized under (catalog, version, variant) with a
+strong ETag, so a matching ``If-None-Match`` is answered with 304 straight
+from memory. Writers call ``bump_version``; other workers notice the new
+version by polling the versions collection; ``python -m app.refdata`` bumps
+versions by hand after writes made outside this app.
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+from typing import Awaitable, Callable, Hashable, NamedTuple
+
+from fastapi import Request, Response
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+from .cache import TTLCache
+from .config import get_settings
+from .responses import dumps
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_COLLECTION = "refdata_versions"
+CATALOGS = ("categories", "departments", "organizations", "slapolicies")
+
+
+class CachedCatalog(NamedTuple):
+    body: bytes
+    etag: str
+
+
+def etag_matches(header: str | None, etag: str) -> bool:
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+class RefDataCache:
+    def __init__(self, max_age: float, max_entries: int = 256):
+        # Entries also expire after max_age to pick up writes made outside
+        # this app (e.g. by the Node backend), which never bump versions
+        self._entries = TTLCache(ttl=max_age, max_entries=max_entries)
+        self._versions: dict[str, int] = {}
+
+    def version(self, catalog: str) -> int:
+        return self._versions.get(catalog, 0)
+
+    async def refresh_versions(self, db: AsyncIOMotorDatabase) -> None:
+        async for doc in db[VERSIONS_COLLECTION].find():
+            self._versions[doc["_id"]] = int(doc.get("version", 0))
+
+    async def bump_version(self, db: AsyncIOMotorDatabase, catalog: str) -> int:
+        """Call after writing to ``catalog`` so every worker drops its copy."""
+        doc = await db[VERSIONS_COLLECTION].find_one_and_update(
+            {"_id": catalog},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        self._versions[catalog] = int(doc["version"])
+        return self._versions[catalog]
+
+    async def poll(self, db: AsyncIOMotorDatabase, interval: float) -> None:
+        """Background task picking up version bumps made by other workers."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh_versions(db)
+            except PyMongoError as exc:
+                logger.warning("Reference data version poll failed: %s", exc)
+
+    async def get(
+        self, catalog: str, variant: Hashable, loader: Callable[[], Awaitable[list]]
+    ) -> CachedCatalog:
+        async def load() -> CachedCatalog:
+            body = dumps(await loader())
+            return CachedCatalog(body, f'"{hashlib.sha1(body).hexdigest()}"')
+
+        return await self._entries.get_or_load((catalog, self.version(catalog), variant), load)
+
+    async def respond(
+        self,
+        request: Request,
+        catalog: str,
+        variant: Hashable,
+        loader: Callable[[], Awaitable[list]],
+    ) -> Response:
+        """Cached JSON response for ``catalog``, or 304 when the client's copy is current."""
+        entry = await self.get(catalog, variant, loader)
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+refdata = RefDataCache(max_age=get_settings().refdata_max_age_seconds)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Bump reference data versions after out-of-band writes.")
+    parser.add_argument("catalogs", nargs="*", choices=CATALOGS, help="catalogs to bump (default: all)")
+    args = parser.parse_args(argv)
+
+    from .db import get_database
+
+    async def run() -> dict[str, int]:
+        db = get_database()
+        return {catalog: await refdata.bump_version(db, catalog) for catalog in args.catalogs or CATALOGS}
+
+    for catalog, version in asyncio.run(run()).items():
+        print(f"{catalog}: version {version}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
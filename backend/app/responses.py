@@ -0,0 +1,41 @@
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from bson import Decimal128, ObjectId
+from fastapi.responses import JSONResponse
+
+from .profiling import phase
+
+# Motor returns naive datetimes in UTC; emit them with a "Z" like the Node backend
+_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize Mongo documents (ObjectId, datetime, Decimal128) to JSON in one pass."""
+    return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+
+class BSONResponse(JSONResponse):
+    """
+    JSON response that encodes raw Motor documents directly.
+
+    Return an instance from the endpoint (rather than a plain dict or list)
+    so FastAPI skips its own ``jsonable_encoder`` pass over the content.
+    """
+
+    def render(self, content: Any) -> bytes:
+        with phase("encode"):
+            return dumps(content)
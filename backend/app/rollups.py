@@ -0,0 +1,231 @@
+"""
+Pre-aggregated daily ticket counts per organization.
+
+Every ticket contributes to the bucket of the day it was created in: one
+``created`` count plus counts by its current status, priority, department
+and technician. Creates and updates apply the difference between the old
+and new contribution with ``$inc``, so the report endpoints only read
+bucket documents. Resolution times run from ``createdAt`` to ``resolvedAt``,
+which ``resolution_fields`` sets when a ticket enters a resolved status.
+Run ``python -m app.rollups`` to rebuild the buckets from the tickets
+collection.
+"""
+import argparse
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel, ReplaceOne, UpdateOne
+from pymongo.errors import PyMongoError
+
+from .db import reference_filter
+from .indexes import register_indexes
+
+logger = logging.getLogger(__name__)
+
+ROLLUPS_COLLECTION = "ticket_rollups"
+RESOLVED_STATUSES = ("resolved", "closed")
+
+# Fields a ticket needs for its contribution; used as the rebuild projection
+CONTRIBUTION_FIELDS = {
+    "organization": 1,
+    "createdAt": 1,
+    "updatedAt": 1,
+    "resolvedAt": 1,
+    "status": 1,
+    "priority": 1,
+    "department": 1,
+    "assignee": 1,
+}
+
+register_indexes(ROLLUPS_COLLECTION, IndexModel([("organization", ASCENDING), ("day", ASCENDING)]))
+
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _key(value) -> str:
+    # Field names may not contain dots or start with "$"
+    if value is None:
+        return "none"
+    return str(value).replace(".", "_").lstrip("$") or "none"
+
+
+def bucket_id(organization, day: date) -> str:
+    return f"{organization if organization is not None else 'none'}:{day.isoformat()}"
+
+
+def _contribution(ticket: dict) -> tuple[str, dict, dict[str, float]] | None:
+    """Return (bucket id, bucket identity fields, counters) for ``ticket``."""
+    created_at = ticket.get("createdAt")
+    if not isinstance(created_at, datetime):
+        return None
+    day = _naive_utc(created_at).date()
+    organization = ticket.get("organization")
+    status = _key(ticket.get("status") or "open")
+    counters: dict[str, float] = {
+        "created": 1,
+        f"status.{status}": 1,
+        f"priority.{_key(ticket.get('priority') or 'medium')}": 1,
+        f"department.{_key(ticket.get('department'))}": 1,
+    }
+    assignee = ticket.get("assignee")
+    if assignee is not None:
+        prefix = f"technician.{_key(assignee)}"
+        counters[f"{prefix}.assigned"] = 1
+        counters[f"{prefix}.status.{status}"] = 1
+        # Tickets resolved before resolvedAt was kept: their last update
+        resolved_at = ticket.get("resolvedAt") or ticket.get("updatedAt")
+        if status in RESOLVED_STATUSES and isinstance(resolved_at, datetime):
+            elapsed = _naive_utc(resolved_at) - _naive_utc(created_at)
+            counters[f"{prefix}.resolutionMs"] = elapsed // timedelta(milliseconds=1)
+    identity = {"organization": organization, "day": datetime.combine(day, time.min)}
+    return bucket_id(organization, day), identity, counters
+
+
+def resolution_fields(before: dict | None, after: dict, now: datetime) -> dict:
+    """
+    ``resolvedAt`` to store after a create (``before`` None) or update: set
+    when the ticket enters a resolved status, cleared when it is reopened,
+    and backfilled from the previous ``updatedAt`` on the first edit of a
+    ticket resolved before the field existed. Empty when nothing changes.
+    """
+    resolved = after.get("status") in RESOLVED_STATUSES
+    was_resolved = before is not None and before.get("status") in RESOLVED_STATUSES
+    if resolved and not was_resolved:
+        return {"resolvedAt": now}
+    if was_resolved and not resolved:
+        return {"resolvedAt": None}
+    if resolved and "resolvedAt" not in before:
+        return {"resolvedAt": before.get("updatedAt")}
+    return {}
+
+
+def _deltas(changes: Iterable[tuple[dict | None, dict | None]]) -> dict[str, tuple[dict, dict[str, float]]]:
+    merged: dict[str, tuple[dict, dict[str, float]]] = {}
+    for before, after in changes:
+        for ticket, sign in ((before, -1), (after, 1)):
+            contribution = _contribution(ticket) if ticket else None
+            if contribution is None:
+                continue
+            bucket, identity, counters = contribution
+            _, totals = merged.setdefault(bucket, (identity, defaultdict(float)))
+            for path, amount in counters.items():
+                totals[path] += sign * amount
+    return merged
+
+
+async def apply_ticket_changes(
+    db: AsyncIOMotorDatabase, changes: Iterable[tuple[dict | None, dict | None]]
+) -> None:
+    """
+    Fold ticket changes into the daily buckets. Each change is a
+    ``(before, after)`` pair; ``before`` is None for a created ticket.
+    All changes touching one bucket become a single ``$inc``.
+    """
+    requests = []
+    for bucket, (identity, totals) in _deltas(changes).items():
+        inc = {path: int(amount) for path, amount in totals.items() if amount}
+        if inc:
+            requests.append(
+                UpdateOne({"_id": bucket}, {"$inc": inc, "$setOnInsert": identity}, upsert=True)
+            )
+    if requests:
+        await db[ROLLUPS_COLLECTION].bulk_write(requests, ordered=False)
+
+
+async def record_ticket_change(db: AsyncIOMotorDatabase, before: dict | None, after: dict | None) -> None:
+    """Background-task entry point; rollup errors never fail the request."""
+    try:
+        await apply_ticket_changes(db, [(before, after)])
+    except PyMongoError as exc:
+        logger.warning("Ticket rollup update failed: %s", exc)
+
+
+def _nest(counters: dict[str, float]) -> dict:
+    doc: dict = {}
+    for path, amount in counters.items():
+        if not amount:
+            continue
+        *parents, leaf = path.split(".")
+        node = doc
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[leaf] = int(amount)
+    return doc
+
+
+async def rebuild(db: AsyncIOMotorDatabase, organization: str | None = None, batch_size: int = 5000) -> int:
+    """
+    Recompute buckets from the tickets collection, for one organization or
+    for all of them. Returns the number of bucket documents written.
+
+    Buckets are replaced one by one and only then are buckets that no
+    longer have tickets deleted, so ``$inc`` upserts from live traffic never
+    hit a missing or duplicate ``_id``. Only buckets that existed before the
+    scan are candidates for deletion; one created by live traffic meanwhile
+    is kept. An increment for a ticket already counted here and landing
+    before its bucket is replaced is overwritten, as with any recount of a
+    moving collection.
+    """
+    query: dict = {}
+    if organization:
+        query["organization"] = reference_filter(organization)
+    rollups = db[ROLLUPS_COLLECTION]
+    existing = {doc["_id"] async for doc in rollups.find(query, projection={"_id": 1}, batch_size=batch_size)}
+    cursor = db["tickets"].find(query, projection=CONTRIBUTION_FIELDS, batch_size=batch_size)
+
+    buckets: dict[str, tuple[dict, dict[str, float]]] = {}
+    async for ticket in cursor:
+        contribution = _contribution(ticket)
+        if contribution is None:
+            continue
+        bucket, identity, counters = contribution
+        _, totals = buckets.setdefault(bucket, (identity, defaultdict(float)))
+        for path, amount in counters.items():
+            totals[path] += amount
+
+    docs = [{"_id": bucket, **identity, **_nest(totals)} for bucket, (identity, totals) in buckets.items()]
+    for start in range(0, len(docs), batch_size):
+        await rollups.bulk_write(
+            [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs[start : start + batch_size]],
+            ordered=False,
+        )
+    stale = [bucket for bucket in existing if bucket not in buckets]
+    for start in range(0, len(stale), batch_size):
+        await rollups.delete_many({"_id": {"$in": stale[start : start + batch_size]}})
+    return len(docs)
+
+
+async def read_buckets(
+    db: AsyncIOMotorDatabase, start: datetime, organization: str | None, fields: Iterable[str]
+) -> list[dict]:
+    """Bucket documents from ``start`` onwards, limited to ``fields``."""
+    query: dict = {"day": {"$gte": datetime.combine(_naive_utc(start).date(), time.min)}}
+    if organization:
+        query["organization"] = reference_filter(organization)
+    projection = {"day": 1, **{field: 1 for field in fields}}
+    cursor = db[ROLLUPS_COLLECTION].find(query, projection=projection).sort("day", ASCENDING)
+    return await cursor.to_list(length=None)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Rebuild the daily ticket report rollups.")
+    parser.add_argument("--organization", help="only rebuild buckets of this organization id")
+    args = parser.parse_args(argv)
+
+    from .db import get_database
+
+    written = asyncio.run(rebuild(get_database(), args.organization))
+    print(f"Rebuilt {written} rollup buckets")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,4 +1,4 @@
-from . import health, tickets, auth, organizations, users, categories, departments, sla, reports
+from . import health, tickets, auth, organizations, users, categories, departments, sla, reports, metrics, batch, attachments, comments, profiling
 
 __all__ = [
     "health",
@@ -10,6 +10,11 @@ __all__ = [
     "departments",
     "sla",
     "reports",
+    "metrics",
+    "batch",
+    "attachments",
+    "comments",
+    "profiling",
 ]
 
 
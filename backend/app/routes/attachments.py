@@ -0,0 +1,158 @@
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from gridfs.errors import NoFile
+from pymongo.errors import PyMongoError
+
+from ..activity import record_activity
+from ..attachments import (
+    ALLOWED_TYPES,
+    AttachmentTooLarge,
+    bucket,
+    clean_filename,
+    etag,
+    last_modified,
+    open_file,
+    parse_range,
+    range_applies,
+    read_range,
+    store,
+    upload_slots,
+)
+from ..auth_utils import get_current_user, get_current_user_or_token
+from ..config import get_settings
+from ..db import get_database
+from ..responses import BSONResponse
+
+router = APIRouter()
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Attachments are limited to {max_bytes} bytes")
+
+
+@router.post("/{ticket_id}/attachments", status_code=201)
+async def upload_attachment(
+    ticket_id: int,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    filename: str = Query(..., min_length=1),
+    current_user=Depends(get_current_user),
+):
+    """
+    Attach a file to a ticket. The request body is the raw file and its
+    ``Content-Type`` the file's type, e.g.
+    ``curl --data-binary @log.txt -H 'Content-Type: text/plain' '.../attachments?filename=log.txt'``.
+    The body is streamed into GridFS as it arrives and rejected with 413 as
+    soon as it passes the size limit.
+    """
+    settings = get_settings()
+    max_bytes = settings.attachment_max_bytes
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in ALLOWED_TYPES:
+        raise HTTPException(status_code=415, detail="Invalid file type")
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        # Refuse before reading a byte when the client tells us up front
+        raise _too_large(max_bytes)
+
+    db = get_database()
+    tickets = db["tickets"]
+    if not await tickets.find_one({"ticketId": ticket_id}, projection={"_id": 1}):
+        raise HTTPException(status_code=404, detail="Ticket not found")
+
+    filename = clean_filename(filename)
+    async with upload_slots():
+        try:
+            file_id, size = await store(
+                db,
+                request.stream(),
+                filename,
+                content_type,
+                {"ticketId": ticket_id, "uploadedBy": current_user["_id"]},
+                max_bytes,
+            )
+        except AttachmentTooLarge:
+            raise _too_large(max_bytes)
+
+    attachment = {
+        "_id": file_id,
+        "filename": filename,
+        "path": f"/api/tickets/{ticket_id}/attachments/{file_id}",
+        "size": size,
+        "mimetype": content_type,
+        "uploadedBy": current_user["_id"],
+        "uploadedAt": datetime.now(timezone.utc),
+    }
+    try:
+        result = await tickets.update_one({"ticketId": ticket_id}, {"$push": {"attachments": attachment}})
+    except PyMongoError:
+        await bucket(db).delete(file_id)
+        raise
+    if result.matched_count == 0:
+        # Ticket removed while the upload was in flight
+        await bucket(db).delete(file_id)
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    background_tasks.add_task(
+        record_activity, db, ticket_id, "attachment_added", current_user, attachmentId=file_id, filename=filename
+    )
+    return BSONResponse(attachment, status_code=201)
+
+
+@router.get("/{ticket_id}/attachments/{file_id}")
+async def download_attachment(
+    ticket_id: int,
+    file_id: str,
+    request: Request,
+    current_user=Depends(get_current_user_or_token),
+):
+    """
+    Stream an attachment. Supports a single ``Range`` (206, or 416 when it
+    lies past the end), ``If-Range`` and ``If-None-Match``; the token may be
+    passed as ``?token=`` so links work in ``<a>`` and ``<img>`` tags.
+    """
+    try:
+        oid = ObjectId(file_id)
+    except InvalidId:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    try:
+        grid_out = await open_file(get_database(), oid)
+    except NoFile:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    metadata = grid_out.metadata or {}
+    if metadata.get("ticketId") != ticket_id:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+
+    length = grid_out.length
+    file_etag = etag(oid)
+    modified = last_modified(grid_out.upload_date)
+    headers = {
+        "ETag": file_etag,
+        "Last-Modified": modified,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=86400",
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(grid_out.filename)}",
+    }
+    if file_etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if range_applies(request.headers.get("if-range"), file_etag, modified):
+        byte_range = parse_range(request.headers.get("range"), length)
+    if byte_range is False:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{length}"})
+
+    media_type = metadata.get("contentType", "application/octet-stream")
+    if byte_range is None:
+        start, end, status_code = 0, length - 1, 200
+    else:
+        (start, end), status_code = byte_range, 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        read_range(grid_out, start, end), status_code=status_code, media_type=media_type, headers=headers
+    )
@@ -1,16 +1,22 @@
 from typing import Optional
 
-import bcrypt
 from bson import ObjectId
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
 from pydantic import BaseModel, EmailStr
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel
 
+from ..audit import audit_log
 from ..auth_utils import create_access_token, get_current_user
 from ..db import get_database
+from ..indexes import register_indexes
+from ..passwords import PasswordHasherBusy, password_hasher
 
 router = APIRouter()
 
+# Login looks users up by email; matches the unique index of the Node model
+register_indexes("users", IndexModel([("email", ASCENDING)], unique=True))
+
 
 class LoginRequest(BaseModel):
     email: EmailStr
@@ -33,33 +39,58 @@ class LoginResponse(BaseModel):
     user: UserInfo
 
 
+async def _rehash_password(users, user_id, old_hash: str, password: str) -> None:
+    """Upgrade a hash made with a different bcrypt cost than configured."""
+    try:
+        new_hash = await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        # Try again on the next login
+        return
+    # Only replace the hash we verified, in case the password changed meanwhile
+    await users.update_one({"_id": user_id, "password": old_hash}, {"$set": {"password": new_hash}})
+
+
 @router.post("/login", response_model=LoginResponse)
 async def login(
     payload: LoginRequest,
+    request: Request,
+    background_tasks: BackgroundTasks,
     db: AsyncIOMotorDatabase = Depends(get_database),
 ):
     users = db["users"]
     orgs = db["organizations"]
+    email = payload.email.lower()
 
-    user = await users.find_one({"email": payload.email.lower()})
+    user = await users.find_one({"email": email})
     if not user:
+        await audit_log.record("auth.login_failed", request=request, email=email, reason="unknown_user")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials"
         )
 
     if user.get("status", "active") != "active":
+        await audit_log.record("auth.login_failed", user["_id"], request=request, email=email, reason="inactive")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Account is inactive"
         )
 
     stored_password = user.get("password")
     if stored_password:
-        if not bcrypt.checkpw(
-            payload.password.encode("utf-8"), stored_password.encode("utf-8")
-        ):
+        try:
+            valid = await password_hasher.verify(payload.password, stored_password)
+        except PasswordHasherBusy:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many login attempts in progress, please retry",
+                headers={"Retry-After": "1"},
+            )
+        if not valid:
+            await audit_log.record("auth.login_failed", user["_id"], request=request, email=email, reason="password")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials"
             )
+        if password_hasher.needs_rehash(stored_password):
+            background_tasks.add_task(_rehash_password, users, user["_id"], stored_password, payload.password)
 
     # For now, we do not implement MFA flow in FastAPI backend; always return full token
     org = None
@@ -69,6 +100,7 @@ async def login(
             org = {"_id": str(org_doc["_id"]), "name": org_doc.get("name"), "domain": org_doc.get("domain")}
 
     token = create_access_token(str(user["_id"]))
+    await audit_log.record("auth.login", user["_id"], request=request, email=email)
 
     return {
         "token": token,
@@ -90,7 +122,7 @@ async def get_me(current_user=Depends(get_current_user)):
     org = current_user.get("organization")
     org_data = None
     if isinstance(org, dict):
-        org_data = org
+        org_data = {"_id": str(org["_id"]), "name": org.get("name"), "domain": org.get("domain")}
     elif org is not None:
         org_data = {"_id": str(org)}
 
@@ -0,0 +1,148 @@
+import asyncio
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+import orjson
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.security import HTTPAuthorizationCredentials
+from pydantic import BaseModel, Field
+
+from ..auth_utils import PRINCIPAL_SCOPE_KEY, get_current_user
+from ..config import get_settings
+from ..db import get_database
+from ..responses import BSONResponse
+
+router = APIRouter()
+
+# Headers a sub-request may carry; authentication comes from the batch itself
+FORWARDED_HEADERS = {"if-none-match", "accept"}
+# Response headers worth returning to the client per item
+RETURNED_HEADERS = {"etag", "x-next-cursor", "cache-control", "retry-after"}
+# Streams (exports, the event stream) and binary downloads: a batch buffers
+# each body in memory and returns it as JSON or text
+STREAMING_SUFFIXES = ("/export", "/events")
+STREAMING_SEGMENT = "/attachments/"
+
+
+class BatchItem(BaseModel):
+    id: Optional[str] = None
+    path: str
+    headers: dict[str, str] = Field(default_factory=dict)
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem]
+
+
+def _batchable(path: str) -> bool:
+    path = urlsplit(path).path.rstrip("/")
+    return (
+        path.startswith("/api/")
+        and path != "/api/batch"
+        and not path.endswith(STREAMING_SUFFIXES)
+        and STREAMING_SEGMENT not in path
+    )
+
+
+async def _dispatch(request: Request, item: BatchItem, principal: Optional[dict]) -> dict:
+    """Run one GET through the app in process and capture its response."""
+    target = urlsplit(item.path)
+    headers = [(b"host", request.headers.get("host", "batch").encode("latin-1"))]
+    headers += [
+        (name.lower().encode("latin-1"), value.encode("latin-1"))
+        for name, value in item.headers.items()
+        if name.lower() in FORWARDED_HEADERS
+    ]
+    if "authorization" in request.headers:
+        headers.append((b"authorization", request.headers["authorization"].encode("latin-1")))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": request.url.scheme,
+        "path": target.path,
+        "raw_path": target.path.encode("latin-1"),
+        "query_string": target.query.encode("latin-1"),
+        "root_path": "",
+        "headers": headers,
+        "client": request.scope.get("client"),
+        "server": request.scope.get("server"),
+        "state": dict(request.scope.get("state", {})),
+    }
+    if principal is not None:
+        scope[PRINCIPAL_SCOPE_KEY] = principal
+
+    status_code = 500
+    response_headers: dict[str, str] = {}
+    body = bytearray()
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status_code
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+            for name, value in message.get("headers", []):
+                name = name.decode("latin-1").lower()
+                if name in RETURNED_HEADERS or name == "content-type":
+                    response_headers[name] = value.decode("latin-1")
+        elif message["type"] == "http.response.body":
+            body.extend(message.get("body", b""))
+
+    await request.app(scope, receive, send)
+    content_type = response_headers.pop("content-type", "")
+    if not body:
+        payload = None
+    elif content_type.startswith("application/json"):
+        # Already serialized by the sub-request; embed the bytes as they are
+        payload = orjson.Fragment(bytes(body))
+    else:
+        payload = body.decode("utf-8", errors="replace")
+    return {"id": item.id, "path": item.path, "status": status_code, "headers": response_headers, "body": payload}
+
+
+async def _dispatch_with_timeout(request: Request, item: BatchItem, principal: Optional[dict], timeout: float) -> dict:
+    try:
+        return await asyncio.wait_for(_dispatch(request, item, principal), timeout)
+    except asyncio.TimeoutError:
+        return {"id": item.id, "path": item.path, "status": 504, "headers": {}, "body": {"detail": "Timed out"}}
+
+
+@router.post("/batch")
+async def batch(payload: BatchRequest, request: Request):
+    """
+    Run several GET requests against this API in one round trip.
+
+    Body: ``{"requests": [{"id": "me", "path": "/api/auth/me"}, ...]}``.
+    The caller is authenticated once and sub-requests run concurrently; each
+    item reports its own status, selected headers (ETag, X-Next-Cursor) and
+    JSON body, in request order. Items that exceed the per-item timeout come
+    back as 504 without holding up the rest. Exports, the event stream and
+    attachment downloads cannot be batched.
+    """
+    settings = get_settings()
+    if not payload.requests:
+        raise HTTPException(status_code=400, detail="No requests in batch")
+    if len(payload.requests) > settings.batch_max_items:
+        raise HTTPException(status_code=400, detail=f"At most {settings.batch_max_items} requests per batch")
+    for item in payload.requests:
+        if not _batchable(item.path):
+            raise HTTPException(status_code=400, detail=f"Unsupported path in batch: {item.path}")
+
+    principal = None
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if token:
+        # Invalid credentials fail the whole batch, as they would each item
+        credentials = HTTPAuthorizationCredentials(scheme=scheme, credentials=token)
+        principal = await get_current_user(request, credentials, get_database())
+
+    results = await asyncio.gather(
+        *(
+            _dispatch_with_timeout(request, item, principal, settings.batch_item_timeout_seconds)
+            for item in payload.requests
+        )
+    )
+    return BSONResponse({"responses": results})
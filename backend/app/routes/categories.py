@@ -1,33 +1,32 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel
 
 from ..db import get_database
+from ..indexes import register_indexes
+from ..refdata import refdata
 
 router = APIRouter()
 
+register_indexes(
+    "categories",
+    IndexModel([("name", ASCENDING)], unique=True),
+    IndexModel([("status", ASCENDING), ("name", ASCENDING)]),
+)
+
 
 @router.get("/")
-async def list_categories(db: AsyncIOMotorDatabase = Depends(get_database)):
+async def list_categories(request: Request, db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     List active categories (global + org-specific).
     For now we ignore auth/org filtering and just return all.
     """
     cursor = db["categories"].find({"status": "active"}).sort("name", 1)
-    categories = []
-    async for doc in cursor:
-        doc["_id"] = str(doc["_id"])
-        categories.append(doc)
-    return categories
+    return await refdata.respond(request, "categories", "active", lambda: cursor.to_list(length=None))
 
 
 @router.get("/all")
-async def list_all_categories(db: AsyncIOMotorDatabase = Depends(get_database)):
+async def list_all_categories(request: Request, db: AsyncIOMotorDatabase = Depends(get_database)):
     """Admin categories page uses this endpoint."""
     cursor = db["categories"].find().sort("name", 1)
-    categories = []
-    async for doc in cursor:
-        doc["_id"] = str(doc["_id"])
-        categories.append(doc)
-    return categories
-
-
+    return await refdata.respond(request, "categories", "all", lambda: cursor.to_list(length=None))
@@ -0,0 +1,136 @@
+import re
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from bson import ObjectId
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+from pymongo import ReturnDocument
+
+from ..activity import activity_log, actor, comment_log, record_activity
+from ..auth_utils import get_current_user
+from ..db import get_database
+from ..mentions import mention_index
+from ..responses import BSONResponse
+from .tickets import with_latest_comments
+
+router = APIRouter()
+
+# Same syntax as the Node backend: @name or @email-prefix
+MENTION_PATTERN = re.compile(r"@(\w+)")
+
+
+class CommentAttachment(BaseModel):
+    filename: str
+    path: str
+    size: Optional[int] = None
+
+
+class CommentCreate(BaseModel):
+    content: str = Field(min_length=1, max_length=20000)
+    attachments: List[CommentAttachment] = Field(default_factory=list)
+
+
+async def _ticket_exists(db, ticket_id: int) -> None:
+    if not await db["tickets"].find_one({"ticketId": ticket_id}, projection={"_id": 1}):
+        raise HTTPException(status_code=404, detail="Ticket not found")
+
+
+async def _adopt_embedded(db, ticket: dict) -> int:
+    """
+    Move comments embedded by the Node backend into buckets; returns how many
+    this call moved. Buckets are written before the comments are pulled, so
+    a failure in between leaves them embedded to be adopted next time.
+    """
+    embedded = sorted(ticket.get("comments") or [], key=lambda comment: comment["_id"])
+    if not embedded:
+        return 0
+    await comment_log.adopt(db, ticket["ticketId"], embedded)
+    ids = [comment["_id"] for comment in embedded]
+    # Only the request whose $pull removed them counts them
+    result = await db["tickets"].update_one(
+        {"_id": ticket["_id"], "comments._id": {"$all": ids}},
+        {"$pull": {"comments": {"_id": {"$in": ids}}}},
+    )
+    return len(ids) if result.modified_count else 0
+
+
+@router.post("/{ticket_id}/comments")
+async def add_comment(
+    ticket_id: int,
+    payload: CommentCreate,
+    background_tasks: BackgroundTasks,
+    current_user=Depends(get_current_user),
+):
+    """
+    Append a comment to the ticket's newest comment bucket. Mentioned users
+    are resolved from the mention directory of the ticket's organization.
+    Returns the ticket as ``get_ticket`` does, so the UI can re-render.
+    """
+    db = get_database()
+    ticket = await db["tickets"].find_one(
+        {"ticketId": ticket_id}, projection={"ticketId": 1, "organization": 1, "comments": 1}
+    )
+    if not ticket:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    adopted = await _adopt_embedded(db, ticket)
+
+    mentions = []
+    names = MENTION_PATTERN.findall(payload.content)
+    if names:
+        await mention_index.ensure_fresh(db)
+        mentions = mention_index.resolve(ticket.get("organization"), names)
+
+    now = datetime.now(timezone.utc)
+    comment = {
+        "_id": ObjectId(),
+        "author": actor(current_user),
+        "content": payload.content,
+        "mentions": mentions,
+        "attachments": [attachment.model_dump() for attachment in payload.attachments],
+        "createdAt": now,
+    }
+    bucket = await comment_log.append(db, ticket_id, comment)
+    ticket = await db["tickets"].find_one_and_update(
+        {"ticketId": ticket_id},
+        {"$inc": {"commentCount": 1 + adopted}, "$max": {"lastCommentAt": now}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not ticket:
+        # Deleted since it was read above
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    background_tasks.add_task(record_activity, db, ticket_id, "commented", current_user, commentId=comment["_id"])
+    return BSONResponse(with_latest_comments(ticket, bucket))
+
+
+@router.get("/{ticket_id}/comments")
+async def list_comments(
+    ticket_id: int,
+    cursor: Optional[str] = Query(default=None),
+    current_user=Depends(get_current_user),
+):
+    """
+    Comments one bucket at a time, newest first. Pass ``commentsCursor`` from
+    ``get_ticket`` (or the previous page's ``X-Next-Cursor``) as ``?cursor=``.
+    """
+    db = get_database()
+    entries, next_cursor = await comment_log.page(db, ticket_id, cursor)
+    if not entries and cursor is None:
+        await _ticket_exists(db, ticket_id)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return BSONResponse(entries, headers=headers)
+
+
+@router.get("/{ticket_id}/activity")
+async def list_activity(
+    ticket_id: int,
+    cursor: Optional[str] = Query(default=None),
+    current_user=Depends(get_current_user),
+):
+    """Activity log (created, updated with field changes, commented, attachment added), paged like comments."""
+    db = get_database()
+    entries, next_cursor = await activity_log.page(db, ticket_id, cursor)
+    if not entries and cursor is None:
+        await _ticket_exists(db, ticket_id)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return BSONResponse(entries, headers=headers)
@@ -1,19 +1,18 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel
 
 from ..db import get_database
+from ..indexes import register_indexes
+from ..refdata import refdata
 
 router = APIRouter()
 
+register_indexes("departments", IndexModel([("name", ASCENDING)], unique=True))
+
 
 @router.get("/")
-async def list_departments(db: AsyncIOMotorDatabase = Depends(get_database)):
+async def list_departments(request: Request, db: AsyncIOMotorDatabase = Depends(get_database)):
     """Basic list endpoint so Departments page can load."""
     cursor = db["departments"].find().sort("name", 1)
-    departments = []
-    async for doc in cursor:
-        doc["_id"] = str(doc["_id"])
-        departments.append(doc)
-    return departments
-
-
+    return await refdata.respond(request, "departments", "all", lambda: cursor.to_list(length=None))
@@ -1,5 +1,8 @@
 from fastapi import APIRouter, Response
 
+from ..lifecycle import lifecycle
+from ..responses import BSONResponse
+
 router = APIRouter()
 
 
@@ -14,3 +17,11 @@ async def health_check_head():
     return Response(status_code=200)
 
 
+@router.get("/ready")
+async def readiness_check():
+    """
+    200 once this worker has finished its warm-up, 503 while starting or
+    draining. Route traffic on this; /health only says the process is up.
+    """
+    status = lifecycle.status()
+    return BSONResponse({"status": status}, status_code=200 if status == "ready" else 503)
@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Response
+
+from ..metrics import registry
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,19 +1,22 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel
 
 from ..db import get_database
+from ..indexes import register_indexes
+from ..refdata import refdata
 
 router = APIRouter()
 
+register_indexes(
+    "organizations",
+    IndexModel([("name", ASCENDING)], unique=True),
+    IndexModel([("createdAt", DESCENDING)]),
+)
+
 
 @router.get("/")
-async def list_organizations(db: AsyncIOMotorDatabase = Depends(get_database)):
+async def list_organizations(request: Request, db: AsyncIOMotorDatabase = Depends(get_database)):
     """Basic list endpoint so Organizations page can load."""
     orgs_cursor = db["organizations"].find().sort("createdAt", -1)
-    organizations = []
-    async for doc in orgs_cursor:
-        doc["_id"] = str(doc["_id"])
-        organizations.append(doc)
-    return organizations
-
-
+    return await refdata.respond(request, "organizations", "all", lambda: orgs_cursor.to_list(length=None))
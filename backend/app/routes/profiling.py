@@ -0,0 +1,68 @@
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+from pydantic import BaseModel, Field
+
+from ..auth_utils import get_current_admin
+from ..profiling import profiler
+from ..responses import BSONResponse
+
+router = APIRouter()
+
+
+class ProfilingUpdate(BaseModel):
+    sampleRate: Optional[float] = Field(default=None, ge=0, le=1)
+    slowMs: Optional[float] = Field(default=None, ge=0)
+    stacks: Optional[bool] = None
+    stackIntervalMs: Optional[float] = Field(default=None, ge=1, le=1000)
+
+
+@router.get("/")
+async def get_profiling(current_user=Depends(get_current_admin)):
+    """
+    Profiling options and captured requests, newest first, of the worker
+    that serves this request; with several workers each keeps its own.
+    """
+    return BSONResponse(
+        {
+            "worker": os.getpid(),
+            "config": profiler.config.as_dict(),
+            "requests": [profile.summary() for profile in reversed(profiler.captured)],
+        }
+    )
+
+
+@router.put("/")
+async def update_profiling(payload: ProfilingUpdate, current_user=Depends(get_current_admin)):
+    """Change profiling options of the worker that serves this request, until it restarts."""
+    config = profiler.config
+    changes = payload.model_dump(exclude_none=True)
+    if "sampleRate" in changes:
+        config.sample_rate = changes["sampleRate"]
+    if "slowMs" in changes:
+        config.slow_ms = changes["slowMs"]
+    if "stacks" in changes:
+        config.stacks = changes["stacks"]
+    if "stackIntervalMs" in changes:
+        config.stack_interval_ms = changes["stackIntervalMs"]
+    return BSONResponse({"worker": os.getpid(), "config": config.as_dict()})
+
+
+@router.get("/requests/{profile_id}")
+async def get_profile(profile_id: str, current_user=Depends(get_current_admin)):
+    """Timeline and stack samples of one captured request (ids are ``<worker pid>-<n>``)."""
+    profile = profiler.find(profile_id)
+    if profile is None:
+        worker = profile_id.split("-", 1)[0]
+        if worker != str(os.getpid()):
+            raise HTTPException(status_code=404, detail=f"Profile was captured by worker {worker}, not this one")
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return BSONResponse(profile.dump())
+
+
+@router.delete("/requests")
+async def clear_profiles(current_user=Depends(get_current_admin)):
+    """Clear the captured requests of the worker that serves this request."""
+    profiler.clear()
+    return Response(status_code=204)
@@ -1,79 +1,165 @@
-from fastapi import APIRouter, Query
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from fastapi import APIRouter, Depends, Query
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from ..dashboard import dashboard_cache, period_start, reports_summary, sla_compliance
+from ..db import get_analytics_database
+from ..responses import BSONResponse
+from ..rollups import read_buckets
 
 router = APIRouter()
 
 
 @router.get("/dashboard")
-async def reports_dashboard(period: str = Query(default="month"), organization: str | None = None):
+async def reports_dashboard(
+    period: str = Query(default="month"),
+    organization: str | None = None,
+    db: AsyncIOMotorDatabase = Depends(get_analytics_database),
+):
     """
-    Simplified reports dashboard endpoint.
-    Returns the same fields as the original Node implementation but with
-    zeroed / empty values so the React UI can render without errors.
+    Reports dashboard with the same fields as the Node implementation,
+    computed in one $facet aggregation and cached briefly per organization.
     """
-    from datetime import datetime
+    summary = await dashboard_cache.get_or_load(
+        ("reports", organization, period),
+        lambda: reports_summary(db["tickets"], period, organization),
+    )
+    return BSONResponse(summary)
 
-    now = datetime.utcnow()
-    start_date = now  # For now, just echo "now" as both start and end
 
-    return {
-        "period": period,
-        "startDate": start_date,
-        "endDate": now,
-        "totalTickets": 0,
-        "statusBreakdown": {},
-        "priorityBreakdown": {},
-        "departmentBreakdown": [],
-        "slaMetrics": {
-            "compliant": 0,
-            "breached": 0,
-            "warnings": 0,
-            "complianceRate": 0,
-        },
-        "technicianPerformance": [],
-    }
+async def _period_buckets(db: AsyncIOMotorDatabase, period: str, organization: str | None, *fields: str):
+    start = period_start(period, datetime.now(timezone.utc))
+    return await read_buckets(db, start, organization, fields)
+
+
+def _sum_field(buckets: list[dict], field: str) -> Counter:
+    totals: Counter = Counter()
+    for bucket in buckets:
+        totals.update(bucket.get(field, {}))
+    return totals
+
+
+async def _names(db: AsyncIOMotorDatabase, collection: str, ids, fields: dict) -> dict[str, dict]:
+    object_ids = [ObjectId(value) for value in ids if ObjectId.is_valid(value)]
+    if not object_ids:
+        return {}
+    cursor = db[collection].find({"_id": {"$in": object_ids}}, projection=fields)
+    return {str(doc["_id"]): doc async for doc in cursor}
 
 
 @router.get("/status-wise")
-async def reports_status_wise(period: str = Query(default="month"), organization: str | None = None):
+async def reports_status_wise(
+    period: str = Query(default="month"),
+    organization: str | None = None,
+    db: AsyncIOMotorDatabase = Depends(get_analytics_database),
+):
+    buckets = await _period_buckets(db, period, organization, "status")
+    totals = _sum_field(buckets, "status")
     return {
         "period": period,
-        "data": [],
+        "data": [{"status": status, "count": count} for status, count in totals.most_common() if count > 0],
     }
 
 
 @router.get("/department-wise")
-async def reports_department_wise(period: str = Query(default="month"), organization: str | None = None):
+async def reports_department_wise(
+    period: str = Query(default="month"),
+    organization: str | None = None,
+    db: AsyncIOMotorDatabase = Depends(get_analytics_database),
+):
+    buckets = await _period_buckets(db, period, organization, "department")
+    totals = _sum_field(buckets, "department")
+    departments = await _names(db, "departments", totals, {"name": 1})
+    data = []
+    for department_id, count in totals.most_common():
+        if count <= 0:
+            continue
+        department = departments.get(department_id)
+        data.append(
+            {
+                "_id": None if department_id == "none" else department_id,
+                "departmentId": None if department_id == "none" else department_id,
+                "departmentName": department.get("name") if department else "Unassigned",
+                "count": count,
+            }
+        )
     return {
         "period": period,
-        "data": [],
+        "data": data,
     }
 
 
 @router.get("/technician-performance")
-async def reports_technician_performance(period: str = Query(default="month"), organization: str | None = None):
+async def reports_technician_performance(
+    period: str = Query(default="month"),
+    organization: str | None = None,
+    db: AsyncIOMotorDatabase = Depends(get_analytics_database),
+):
+    buckets = await _period_buckets(db, period, organization, "technician")
+    stats: dict[str, Counter] = defaultdict(Counter)
+    for bucket in buckets:
+        for technician_id, values in bucket.get("technician", {}).items():
+            stats[technician_id]["totalAssigned"] += values.get("assigned", 0)
+            stats[technician_id]["resolutionMs"] += values.get("resolutionMs", 0)
+            stats[technician_id].update(values.get("status", {}))
+
+    users = await _names(db, "users", stats, {"name": 1, "email": 1})
+    data = []
+    for technician_id, values in stats.items():
+        total = values["totalAssigned"]
+        if total <= 0:
+            continue
+        done = values["resolved"] + values["closed"]
+        user = users.get(technician_id, {})
+        data.append(
+            {
+                "_id": technician_id,
+                "technicianId": technician_id,
+                "technicianName": user.get("name"),
+                "technicianEmail": user.get("email"),
+                "totalAssigned": total,
+                "open": values["open"],
+                "inProgress": values["in-progress"],
+                "resolved": values["resolved"],
+                "closed": values["closed"],
+                "resolutionRate": done / total * 100,
+                "avgResolutionTimeHours": values["resolutionMs"] / done / 3_600_000 if done else None,
+            }
+        )
+    data.sort(key=lambda row: row["totalAssigned"], reverse=True)
     return {
         "period": period,
-        "data": [],
+        "data": data,
     }
 
 
 @router.get("/sla-compliance")
-async def reports_sla_compliance(period: str = Query(default="month"), organization: str | None = None):
-    return {
-        "period": period,
-        "responseSLA": {
-            "total": 0,
-            "compliant": 0,
-            "breached": 0,
-            "complianceRate": 0,
-        },
-        "resolutionSLA": {
-            "total": 0,
-            "compliant": 0,
-            "breached": 0,
-            "complianceRate": 0,
-        },
-    }
+async def reports_sla_compliance(
+    period: str = Query(default="month"),
+    organization: str | None = None,
+    db: AsyncIOMotorDatabase = Depends(get_analytics_database),
+):
+    """
+    Response and resolution SLA compliance over the due dates stamped on
+    tickets at creation, cached briefly like the reports dashboard.
+    """
+    summary = await dashboard_cache.get_or_load(
+        ("sla-compliance", organization, period),
+        lambda: sla_compliance(db["tickets"], period, organization),
+    )
+    return BSONResponse(summary)
+
+
+def _trend_key(day: datetime, group_by: str) -> dict:
+    if group_by == "week":
+        # %U matches Mongo's $week: Sunday-based, days before the first Sunday are week 0
+        return {"year": day.year, "week": int(day.strftime("%U"))}
+    if group_by == "month":
+        return {"year": day.year, "month": day.month}
+    return {"year": day.year, "month": day.month, "day": day.day}
 
 
 @router.get("/trends")
@@ -81,11 +167,22 @@ async def reports_trends(
     period: str = Query(default="month"),
     organization: str | None = None,
     groupBy: str = Query(default="day"),
+    db: AsyncIOMotorDatabase = Depends(get_analytics_database),
 ):
+    buckets = await _period_buckets(db, period, organization, "created", "status")
+    # Buckets come back sorted by day, so groups are built in order
+    groups: dict[tuple, dict] = {}
+    for bucket in buckets:
+        key = _trend_key(bucket["day"], groupBy)
+        row = groups.setdefault(
+            tuple(key.values()), {"_id": key, "count": 0, "open": 0, "resolved": 0, "closed": 0}
+        )
+        statuses = bucket.get("status", {})
+        row["count"] += bucket.get("created", 0)
+        for status in ("open", "resolved", "closed"):
+            row[status] += statuses.get(status, 0)
     return {
         "period": period,
         "groupBy": groupBy,
-        "data": [],
+        "data": list(groups.values()),
     }
-
-
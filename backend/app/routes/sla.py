@@ -1,13 +1,23 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel
 
 from ..db import get_database
+from ..indexes import register_indexes
+from ..refdata import refdata
 
 router = APIRouter()
 
+# One policy per priority per organization (or global), as in the Node model
+register_indexes(
+    "slapolicies",
+    IndexModel([("organization", ASCENDING), ("priority", ASCENDING)], unique=True, sparse=True),
+)
+
 
 @router.get("/")
 async def list_sla_policies(
+    request: Request,
     organization: str | None = Query(default=None),
     db: AsyncIOMotorDatabase = Depends(get_database),
 ):
@@ -23,10 +33,4 @@ async def list_sla_policies(
         query["organization"] = None
 
     cursor = collection.find(query).sort([("priority", 1), ("organization", 1)])
-    policies = []
-    async for doc in cursor:
-        doc["_id"] = str(doc["_id"])
-        policies.append(doc)
-    return policies
-
-
+    return await refdata.respond(request, "slapolicies", organization, lambda: cursor.to_list(length=None))
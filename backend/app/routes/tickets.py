@@ -1,10 +1,31 @@
+import asyncio
+import base64
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from pydantic import BaseModel, Field, ConfigDict
+import orjson
+from bson import ObjectId
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ConfigDict, field_validator
+from pymongo import ASCENDING, DESCENDING, IndexModel
 
-from ..db import get_database
+from ..activity import comment_log, field_changes, record_activity
+from ..audit import audit_log
+from ..auth_utils import get_current_admin, get_current_user, get_current_user_or_token
+from ..config import get_settings
+from ..dashboard import dashboard_cache, scope_key, ticket_dashboard, ticket_scope
+from ..db import get_analytics_database, get_database, reference_filter
+from ..events import publish_ticket_change, sse_stream
+from ..exports import export_response
+from ..imports import TicketImporter, iterate, ndjson_rows
+from ..indexes import register_indexes
+from ..lifecycle import lifecycle
+from ..responses import BSONResponse
+from ..rollups import record_ticket_change, resolution_fields
+from ..search import search_tickets
+from ..sequences import ticket_ids
+from ..sla_engine import sla_monitor, sla_policies
 
 router = APIRouter()
 
@@ -21,6 +42,31 @@ class TicketCreate(TicketBase):
     pass
 
 
+class TicketUpdate(BaseModel):
+    title: Optional[str] = None
+    description: Optional[str] = None
+    category: Optional[str] = None
+    priority: Optional[str] = None
+    status: Optional[str] = None
+    assignee: Optional[str] = None
+    department: Optional[str] = None
+
+    @field_validator("status", "priority")
+    @classmethod
+    def _not_null(cls, value):
+        # Omit the field to leave it unchanged; null would unset it
+        if value is None:
+            raise ValueError("may not be null")
+        return value
+
+
+# Fields only admins and technicians may change, as in the Node backend
+STAFF_FIELDS = ("status", "priority", "assignee", "department")
+STAFF_ROLES = ("admin", "technician")
+# Reads and conditional writes tried before a contended update gives up
+UPDATE_ATTEMPTS = 3
+
+
 class TicketInDB(TicketBase):
     id: str = Field(alias="_id")
     ticketId: Optional[int] = None
@@ -33,67 +79,401 @@ async def get_ticket_collection():
     return db["tickets"]
 
 
+async def get_analytics_ticket_collection():
+    return get_analytics_database()["tickets"]
+
+
+# Fields returned by list endpoints; descriptions and attachments are only
+# loaded by get_ticket (comments live in ticket_comments, see activity.py).
+LIST_PROJECTION = {
+    "ticketId": 1,
+    "title": 1,
+    "category": 1,
+    "priority": 1,
+    "status": 1,
+    "creator": 1,
+    "assignee": 1,
+    "department": 1,
+    "organization": 1,
+    "dueDate": 1,
+    "createdAt": 1,
+    "updatedAt": 1,
+}
+
+EXPORT_COLUMNS = ["_id", *LIST_PROJECTION]
+
+# Equality filters first, then the (createdAt, _id) keyset sort. Each filter
+# has an index of its own ending in the sort keys, so any combination walks
+# one in order and applies the other filters while scanning, never sorting
+# in memory; assignee+status and organization+status, the common pairs,
+# match both equalities.
+LIST_INDEXES = [
+    IndexModel([("createdAt", DESCENDING), ("_id", DESCENDING)]),
+    IndexModel([("status", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)]),
+    IndexModel([("priority", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)]),
+    IndexModel([("category", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)]),
+    IndexModel([("assignee", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)]),
+    IndexModel([("organization", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)]),
+    IndexModel([("assignee", ASCENDING), ("status", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)]),
+    IndexModel(
+        [("organization", ASCENDING), ("status", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)]
+    ),
+]
+
+register_indexes(
+    "tickets",
+    IndexModel([("ticketId", ASCENDING)], unique=True),
+    IndexModel([("emailMessageId", ASCENDING)]),
+    *LIST_INDEXES,
+)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _encode_cursor(doc: dict) -> str:
+    created = doc.get("createdAt")
+    # Tickets without createdAt sort after all others; an empty time marks them
+    millis = ""
+    if created is not None:
+        if created.tzinfo is None:
+            created = created.replace(tzinfo=timezone.utc)
+        millis = (created - _EPOCH) // timedelta(milliseconds=1)
+    raw = f"{millis}:{doc['_id']}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(token: str) -> tuple[datetime | None, ObjectId]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode("ascii")
+        millis, oid = raw.split(":", 1)
+        created = _EPOCH + timedelta(milliseconds=int(millis)) if millis else None
+        return created, ObjectId(oid)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _after_cursor(created_at: datetime | None, last_id: ObjectId) -> dict:
+    """Rows after the cursor in (createdAt, _id) descending order, where a missing createdAt sorts last."""
+    if created_at is None:
+        return {"createdAt": None, "_id": {"$lt": last_id}}
+    return {
+        "$or": [
+            {"createdAt": {"$lt": created_at}},
+            {"createdAt": created_at, "_id": {"$lt": last_id}},
+            {"createdAt": None},
+        ]
+    }
+
+
+def _ticket_filters(
+    status: Optional[str],
+    priority: Optional[str],
+    category: Optional[str],
+    assignee: Optional[str],
+    organization: Optional[str],
+) -> dict:
+    query: dict = {}
+    if status and status != "all":
+        query["status"] = status
+    if priority and priority != "all":
+        query["priority"] = priority
+    if category:
+        query["category"] = category
+    if assignee:
+        query["assignee"] = reference_filter(assignee)
+    if organization:
+        query["organization"] = reference_filter(organization)
+    return query
+
+
+@router.get("/")
 @router.get("/list")
 async def list_tickets(
     status: Optional[str] = Query(default=None),
     priority: Optional[str] = Query(default=None),
+    category: Optional[str] = Query(default=None),
+    assignee: Optional[str] = Query(default=None),
+    organization: Optional[str] = Query(default=None),
+    cursor: Optional[str] = Query(default=None),
+    limit: int = Query(default=50, ge=1, le=200),
     collection=Depends(get_ticket_collection),
 ):
-    # For now, return an empty list to avoid serialization issues.
-    # The frontend treats an empty array as "no tickets" without errors.
-    return []
+    """
+    Newest-first ticket list using keyset pagination on (createdAt, _id).
+
+    The body stays a plain array for the React UI; when more rows exist the
+    token for the next page is returned in the ``X-Next-Cursor`` header and
+    passed back as ``?cursor=``.
+    """
+    query = _ticket_filters(status, priority, category, assignee, organization)
+    if cursor:
+        query.update(_after_cursor(*_decode_cursor(cursor)))
+
+    # Fetch one extra row to learn whether another page exists
+    docs = (
+        await collection.find(query, projection=LIST_PROJECTION)
+        .sort([("createdAt", DESCENDING), ("_id", DESCENDING)])
+        .limit(limit + 1)
+        .to_list(length=limit + 1)
+    )
+    headers = {}
+    if len(docs) > limit:
+        docs = docs[:limit]
+        headers["X-Next-Cursor"] = _encode_cursor(docs[-1])
+    return BSONResponse(docs, headers=headers)
+
+
+@router.get("/search")
+async def search(
+    q: str = Query(min_length=1, max_length=200),
+    status: Optional[str] = Query(default=None),
+    priority: Optional[str] = Query(default=None),
+    organization: Optional[str] = Query(default=None),
+    cursor: Optional[str] = Query(default=None),
+    limit: int = Query(default=20, ge=1, le=100),
+    collection=Depends(get_ticket_collection),
+):
+    """
+    Full-text search over title, description and category, best match first.
+
+    Accepts Mongo text search syntax ("exact phrase", -excluded). Each row
+    has the list fields plus ``score`` and HTML-escaped ``highlights`` with
+    matches wrapped in ``<mark>``. Paged like the list via ``X-Next-Cursor``.
+    """
+    filters = _ticket_filters(status, priority, None, None, organization)
+    docs, next_cursor = await search_tickets(collection, q, filters, LIST_PROJECTION, cursor, limit)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return BSONResponse(docs, headers=headers)
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_ticket(
     payload: TicketCreate,
+    request: Request,
+    background_tasks: BackgroundTasks,
     collection=Depends(get_ticket_collection),
 ):
     doc = payload.model_dump()
-    # Basic auto-increment ticketId based on highest existing value
-    last = await collection.find_one(sort=[("ticketId", -1)])
-    next_id = (last.get("ticketId") if last and last.get("ticketId") else 999) + 1
-    doc["ticketId"] = next_id
+    now = datetime.now(timezone.utc)
+    doc["createdAt"] = now
+    doc["updatedAt"] = now
+    await sla_policies.refresh_if_stale(collection.database)
+    doc.update(sla_policies.stamp(doc))
+    doc.update(resolution_fields(None, doc, now))
+    doc["ticketId"] = await ticket_ids.next(collection.database)
     result = await collection.insert_one(doc)
-    created = await collection.find_one({"_id": result.inserted_id})
-    if not created:
-        raise HTTPException(status_code=500, detail="Failed to create ticket")
-    created["_id"] = str(created["_id"])
-    return created
+    sla_monitor.track(doc)
+    publish_ticket_change(None, doc)
+    background_tasks.add_task(record_ticket_change, collection.database, None, dict(doc))
+    background_tasks.add_task(record_activity, collection.database, doc["ticketId"], "created")
+    await audit_log.record(
+        "ticket.created",
+        doc.get("creator"),
+        {"type": "ticket", "id": doc["ticketId"]},
+        request,
+        priority=doc["priority"],
+        status=doc["status"],
+    )
+    # insert_one stores exactly what we sent (plus _id), so no read-back is needed
+    return BSONResponse(doc, status_code=status.HTTP_201_CREATED)
+
+
+@router.post("/import")
+async def import_tickets(
+    request: Request,
+    current_user=Depends(get_current_user),
+    collection=Depends(get_ticket_collection),
+):
+    """
+    Bulk import. Accepts ``{"tickets": [...]}`` or a bare JSON array like
+    the Node endpoint, or NDJSON (``Content-Type: application/x-ndjson``),
+    which is parsed while the body streams in. Rows failing validation or
+    insertion are listed in ``errors`` by index; the rest are imported.
+    """
+    if "ndjson" in request.headers.get("content-type", ""):
+        rows = ndjson_rows(request.stream())
+    else:
+        try:
+            body = orjson.loads(await request.body())
+        except orjson.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="Invalid JSON body")
+        tickets = body.get("tickets") if isinstance(body, dict) else body
+        if not isinstance(tickets, list) or not tickets:
+            raise HTTPException(
+                status_code=400, detail="Invalid tickets data. Expected an array of tickets."
+            )
+        rows = iterate(tickets)
+
+    defaults = {"creator": current_user["_id"]}
+    organization = current_user.get("organization")
+    if organization is not None:
+        defaults["organization"] = organization.get("_id") if isinstance(organization, dict) else organization
+    importer = TicketImporter(collection.database, TicketCreate, defaults)
+    result = await importer.run(rows)
+    await audit_log.record(
+        "tickets.imported",
+        current_user["_id"],
+        {"type": "ticket"},
+        request,
+        success=result["success"],
+        failed=result["failed"],
+    )
+    return BSONResponse(result)
 
 
 @router.get("/stats/dashboard")
-async def dashboard_stats():
+async def dashboard_stats(
+    organization: Optional[str] = Query(default=None),
+    current_user=Depends(get_current_user),
+    collection=Depends(get_ticket_collection),
+):
     """
-    Minimal dashboard stats endpoint that returns zeros/empty arrays.
-    This avoids serialization issues while still giving the React
-    dashboard the structure it expects so it can render.
+    Dashboard counters, distributions, weekly trends and recent tickets.
+
+    Everything comes from a single $facet aggregation, cached briefly per
+    visibility scope so a burst of refreshes triggers one aggregation.
     """
-    return {
-        "totalTickets": 0,
-        "openTickets": 0,
-        "pendingTickets": 0,
-        "approvedTickets": 0,
-        "approvalPendingTickets": 0,
-        "rejectedTickets": 0,
-        "inProgressTickets": 0,
-        "resolvedTickets": 0,
-        "closedTickets": 0,
-        "overdueTickets": 0,
-        "recentTickets": [],
-        "weeklyTrends": [],
-        "statusDistribution": [],
-        "priorityDistribution": [],
-        "myOpenTickets": [],
-    }
+    scope = ticket_scope(current_user, organization)
+    stats = await dashboard_cache.get_or_load(
+        ("tickets", scope_key(scope)),
+        lambda: ticket_dashboard(collection, scope, LIST_PROJECTION),
+    )
+    return BSONResponse(stats)
+
+
+@router.get("/export")
+async def export_tickets(
+    format: str = Query(default="ndjson", pattern="^(ndjson|csv)$"),
+    status: Optional[str] = Query(default=None),
+    priority: Optional[str] = Query(default=None),
+    category: Optional[str] = Query(default=None),
+    assignee: Optional[str] = Query(default=None),
+    organization: Optional[str] = Query(default=None),
+    current_user=Depends(get_current_admin),
+    collection=Depends(get_analytics_ticket_collection),
+):
+    """Stream every matching ticket (list fields only) as NDJSON or CSV."""
+    query = _ticket_filters(status, priority, category, assignee, organization)
+    cursor = collection.find(query, projection=LIST_PROJECTION).sort(
+        [("createdAt", DESCENDING), ("_id", DESCENDING)]
+    )
+    return export_response(cursor, format, EXPORT_COLUMNS, "tickets")
+
+
+@router.get("/events")
+async def ticket_event_stream(
+    organization: Optional[str] = Query(default=None),
+    user=Depends(get_current_user_or_token),
+):
+    """
+    Server-Sent Events stream of ticket changes visible to the caller
+    (``ticket.created``, ``ticket.updated``, ``tickets.imported``), for
+    replacing list and dashboard polling. EventSource cannot send headers,
+    so the bearer token may be passed as ``?token=``. A ``resync`` event
+    means events were dropped and the client should reload.
+    """
+    if lifecycle.draining:
+        raise HTTPException(status_code=503, detail="Server restarting", headers={"Retry-After": "3"})
+    scope = ticket_scope(user, organization)
+    if scope is None:
+        raise HTTPException(status_code=403, detail="No tickets visible to this user")
+    return StreamingResponse(
+        sse_stream(scope, get_settings().ticket_events_heartbeat_seconds),
+        media_type="text/event-stream",
+        # X-Accel-Buffering stops nginx from holding events back
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def with_latest_comments(ticket: dict, bucket: dict | None) -> dict:
+    """
+    The ticket with its newest comment bucket as ``comments`` (oldest first,
+    as the UI renders them) and ``commentsCursor`` for older pages. Comments
+    still embedded by the Node backend (moved into buckets on the next
+    comment added here) are merged in by ``_id``, i.e. by creation time.
+    """
+    embedded = ticket.get("comments") or []
+    if bucket is None:
+        ticket["comments"] = embedded
+        ticket["commentsCursor"] = None
+        return ticket
+    ticket["comments"] = sorted([*embedded, *bucket["entries"]], key=lambda comment: comment["_id"])
+    more = ticket.get("commentCount", 0) > len(bucket["entries"])
+    ticket["commentsCursor"] = str(bucket["_id"]) if more else None
+    return ticket
 
 
 @router.get("/{ticket_id}")
 async def get_ticket(ticket_id: int, collection=Depends(get_ticket_collection)):
-    ticket = await collection.find_one({"ticketId": ticket_id})
+    """The ticket with its comment summary (``commentCount``, ``lastCommentAt``) and latest comment bucket."""
+    ticket, bucket = await asyncio.gather(
+        collection.find_one({"ticketId": ticket_id}), comment_log.latest(collection.database, ticket_id)
+    )
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
-    ticket["_id"] = str(ticket["_id"])
-    return ticket
+    return BSONResponse(with_latest_comments(ticket, bucket))
+
+
+@router.put("/{ticket_id}")
+async def update_ticket(
+    ticket_id: int,
+    payload: TicketUpdate,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    current_user=Depends(get_current_user),
+    collection=Depends(get_ticket_collection),
+):
+    """
+    Update a ticket the caller may edit: admins any ticket, everyone else
+    tickets of their organization; users only their own tickets and not
+    their status, priority, assignee or department.
+    """
+    role = current_user.get("role", "user")
+    changes = payload.model_dump(exclude_unset=True)
+    if role not in STAFF_ROLES and any(field in changes for field in STAFF_FIELDS):
+        raise HTTPException(
+            status_code=403, detail="You do not have permission to update status, priority, assignee or department"
+        )
+    for field in ("assignee", "department"):
+        if changes.get(field):
+            changes[field] = reference_filter(changes[field])
+    changes["updatedAt"] = datetime.now(timezone.utc)
 
+    query: dict = {"ticketId": ticket_id}
+    organization = current_user.get("organization")
+    if isinstance(organization, dict):
+        organization = organization.get("_id")
+    if role != "admin" and organization is not None:
+        query["organization"] = organization
+    if role not in STAFF_ROLES:
+        query["creator"] = current_user["_id"]
 
+    # Resolution and SLA fields depend on the stored ticket, so it is read
+    # first and everything is written in one $set, on the condition that
+    # nobody updated the ticket in between
+    for _ in range(UPDATE_ATTEMPTS):
+        before = await collection.find_one(query)
+        if not before:
+            raise HTTPException(status_code=404, detail="Ticket not found")
+        fields = dict(changes)
+        fields.update(resolution_fields(before, {**before, **changes}, changes["updatedAt"]))
+        if fields.get("priority", before.get("priority")) != before.get("priority"):
+            # Due dates follow the priority's policy, measured from creation
+            await sla_policies.refresh_if_stale(collection.database)
+            fields.update(sla_policies.stamp({**before, **fields}))
+        result = await collection.update_one(
+            {"_id": before["_id"], "updatedAt": before.get("updatedAt")}, {"$set": fields}
+        )
+        if result.matched_count:
+            break
+    else:
+        raise HTTPException(status_code=409, detail="Ticket was changed concurrently, retry")
+    ticket = {**before, **fields}
+    sla_monitor.track(ticket)
+    publish_ticket_change(before, ticket)
+    background_tasks.add_task(record_ticket_change, collection.database, before, ticket)
+    diff = field_changes(before, ticket)
+    if diff:
+        background_tasks.add_task(record_activity, collection.database, ticket_id, "updated", current_user, changes=diff)
+    await audit_log.record("ticket.updated", current_user["_id"], {"type": "ticket", "id": ticket_id}, request, changes=diff)
+    return BSONResponse(ticket)
@@ -1,49 +1,121 @@
-from fastapi import APIRouter, Depends
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
+from pydantic import BaseModel, EmailStr
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument
 
-from ..db import get_database
+from ..auth_utils import get_current_admin, get_current_user, invalidate_principal
+from ..db import get_analytics_database, get_database, reference_filter
+from ..exports import export_response
+from ..indexes import register_indexes
+from ..mentions import mention_index
+from ..refdata import etag_matches
+from ..responses import BSONResponse
 
 router = APIRouter()
 
+register_indexes(
+    "users",
+    IndexModel([("createdAt", DESCENDING)]),
+    IndexModel([("status", ASCENDING), ("name", ASCENDING)]),
+)
+
 
-def _convert_object_ids(obj):
-    """Recursively convert ObjectId instances inside a document to strings."""
-    if isinstance(obj, ObjectId):
-        return str(obj)
-    if isinstance(obj, list):
-        return [_convert_object_ids(item) for item in obj]
-    if isinstance(obj, dict):
-        return {key: _convert_object_ids(value) for key, value in obj.items()}
-    return obj
+class UserUpdate(BaseModel):
+    name: Optional[str] = None
+    email: Optional[EmailStr] = None
+    role: Optional[str] = None
+    status: Optional[str] = None
+    organization: Optional[str] = None
+    department: Optional[str] = None
 
 
 @router.get("/")
 async def list_users(db: AsyncIOMotorDatabase = Depends(get_database)):
     """Basic list endpoint so Users page can load."""
-    cursor = db["users"].find().sort("createdAt", -1)
-    users = []
-    async for doc in cursor:
-        user = _convert_object_ids(doc)
-        # Remove sensitive field
-        user.pop("password", None)
-        users.append(user)
-    return users
+    # Never load the sensitive password field
+    cursor = db["users"].find(projection={"password": 0}).sort("createdAt", -1)
+    return BSONResponse(await cursor.to_list(length=None))
+
+
+USER_EXPORT_PROJECTION = {
+    "name": 1,
+    "email": 1,
+    "role": 1,
+    "status": 1,
+    "organization": 1,
+    "department": 1,
+    "mfaEnabled": 1,
+    "createdAt": 1,
+    "updatedAt": 1,
+}
+
+
+@router.get("/export")
+async def export_users(
+    format: str = Query(default="ndjson", pattern="^(ndjson|csv)$"),
+    current_user=Depends(get_current_admin),
+    db: AsyncIOMotorDatabase = Depends(get_analytics_database),
+):
+    """Stream all users (never their password hashes) as NDJSON or CSV."""
+    cursor = db["users"].find(projection=USER_EXPORT_PROJECTION).sort("_id", 1)
+    return export_response(cursor, format, ["_id", *USER_EXPORT_PROJECTION], "users")
 
 
 @router.get("/mentions")
-async def list_mentions(db: AsyncIOMotorDatabase = Depends(get_database)):
-    """Simplified mentions endpoint used by comments UI."""
-    cursor = db["users"].find({"status": "active"}).sort("name", 1)
-    users = []
-    async for doc in cursor:
-        users.append(
-            {
-                "_id": str(doc["_id"]),
-                "name": doc.get("name", ""),
-                "email": doc.get("email", ""),
-            }
-        )
-    return users
+async def list_mentions(
+    request: Request,
+    q: Optional[str] = Query(default=None, max_length=100),
+    limit: int = Query(default=10, ge=1, le=50),
+    current_user=Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    """
+    Users the caller can mention, i.e. active users of their organization.
+
+    With ``q``, returns at most ``limit`` users whose name or email has a
+    word starting with ``q`` (an empty ``q`` gives the first ``limit`` by
+    name); without it, the whole list sorted by name as before. Served from
+    an in-memory index with an ETag.
+    """
+    await mention_index.ensure_fresh(db)
+    result = mention_index.search(current_user.get("organization"), q, limit)
+    headers = {"ETag": result.etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), result.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=result.body, media_type="application/json", headers=headers)
+
 
+@router.put("/{user_id}")
+async def update_user(
+    user_id: str,
+    payload: UserUpdate,
+    current_user=Depends(get_current_admin),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    """Update a user's profile, role or status (e.g. deactivate them)."""
+    if not ObjectId.is_valid(user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    changes = payload.model_dump(exclude_unset=True)
+    if changes.get("email"):
+        changes["email"] = changes["email"].lower()
+    if changes.get("organization"):
+        changes["organization"] = reference_filter(changes["organization"])
+    if "department" in changes:
+        changes["department"] = reference_filter(changes["department"]) if changes["department"] else None
+    changes["updatedAt"] = datetime.now(timezone.utc)
 
+    user = await db["users"].find_one_and_update(
+        {"_id": ObjectId(user_id)},
+        {"$set": changes},
+        projection={"password": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    invalidate_principal(user_id)
+    mention_index.upsert(user)
+    return BSONResponse(user)
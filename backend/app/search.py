@@ -0,0 +1,126 @@
+"""
+Full-text ticket search.
+
+Backed by the single text index Mongo allows per collection, over title,
+description and category with title matches weighted highest. Results are
+ordered by text score, then _id, and paged with a keyset cursor on that
+pair so deep pages cost the same as the first. Highlighted snippets are
+built here from the matched terms rather than by the database.
+"""
+import base64
+import html
+import re
+
+from bson import ObjectId
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import IndexModel, TEXT
+
+from .indexes import register_indexes
+
+SEARCH_WEIGHTS = {"title": 10, "category": 5, "description": 1}
+
+register_indexes(
+    "tickets",
+    IndexModel(
+        [(field, TEXT) for field in SEARCH_WEIGHTS],
+        weights=SEARCH_WEIGHTS,
+        default_language="english",
+        name="ticket_text",
+    ),
+)
+
+SNIPPET_CHARS = 160
+
+# Rough English suffixes, so "printers" also highlights "printer"; Mongo's
+# stemmer decides what matches, this only decides what gets marked
+_SUFFIXES = ("ing", "ed", "es", "s")
+
+
+def encode_cursor(doc: dict) -> str:
+    # repr() round-trips the float exactly, which keyset equality needs
+    raw = f"{doc['score']!r}:{doc['_id']}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> tuple[float, ObjectId]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode("ascii")
+        score, oid = raw.split(":", 1)
+        return float(score), ObjectId(oid)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def search_terms(q: str) -> list[str]:
+    """Positive words and phrase words from a $text search string."""
+    terms = []
+    for token in re.findall(r'-?"[^"]*"|\S+', q):
+        if token.startswith("-"):
+            continue
+        for word in re.findall(r"\w+", token):
+            stem = word.lower()
+            for suffix in _SUFFIXES:
+                if len(stem) - len(suffix) >= 3 and stem.endswith(suffix):
+                    stem = stem[: -len(suffix)]
+                    break
+            terms.append(stem)
+    return sorted(set(terms), key=len, reverse=True)
+
+
+def highlight(text: str | None, pattern: re.Pattern | None, window: int | None = None) -> str | None:
+    """
+    HTML-escaped ``text`` with matches wrapped in ``<mark>``. With ``window``,
+    only that many characters around the first match are kept.
+    """
+    if not text:
+        return text
+    first = pattern.search(text) if pattern else None
+    if window and len(text) > window:
+        start = max(0, (first.start() if first else 0) - window // 3)
+        end = min(len(text), start + window)
+        text = ("…" if start else "") + text[start:end] + ("…" if end < len(text) else "")
+    if pattern is None:
+        return html.escape(text)
+    parts, last = [], 0
+    for match in pattern.finditer(text):
+        parts.append(html.escape(text[last : match.start()]))
+        parts.append(f"<mark>{html.escape(match.group(0))}</mark>")
+        last = match.end()
+    parts.append(html.escape(text[last:]))
+    return "".join(parts)
+
+
+async def search_tickets(
+    collection: AsyncIOMotorCollection,
+    q: str,
+    filters: dict,
+    projection: dict,
+    cursor: str | None,
+    limit: int,
+) -> tuple[list[dict], str | None]:
+    """One page of matches for ``q`` plus the cursor for the next page."""
+    pipeline: list[dict] = [
+        # $text must lead the pipeline; equality filters narrow the index scan
+        {"$match": {"$text": {"$search": q}, **filters}},
+        {"$project": {**projection, "description": 1, "score": {"$meta": "textScore"}}},
+    ]
+    if cursor:
+        score, last_id = decode_cursor(cursor)
+        pipeline.append({"$match": {"$or": [{"score": {"$lt": score}}, {"score": score, "_id": {"$lt": last_id}}]}})
+    pipeline += [{"$sort": {"score": -1, "_id": -1}}, {"$limit": limit + 1}]
+
+    docs = await collection.aggregate(pipeline).to_list(length=limit + 1)
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1])
+
+    terms = search_terms(q)
+    pattern = re.compile(r"\b(?:" + "|".join(map(re.escape, terms)) + r")\w*", re.IGNORECASE) if terms else None
+    for doc in docs:
+        doc["highlights"] = {
+            "title": highlight(doc.get("title"), pattern),
+            "description": highlight(doc.pop("description", None), pattern, SNIPPET_CHARS),
+        }
+    return docs, next_cursor
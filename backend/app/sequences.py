@@ -0,0 +1,84 @@
+import asyncio
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+
+from .config import get_settings
+
+COUNTERS_COLLECTION = "counters"
+
+
+class SequenceAllocator:
+    """
+    Hands out unique, increasing integers backed by a document in the
+    ``counters`` collection.
+
+    Ids are reserved atomically with ``$inc`` in blocks of ``block_size`` and
+    served from memory, so most calls never touch Mongo. Every worker owns
+    its own block; ids stay unique across workers but may leave gaps when a
+    worker exits with part of a block unused.
+    """
+
+    def __init__(self, name: str, collection: str, field: str, start: int = 1000, block_size: int | None = None):
+        self.name = name
+        self.collection = collection
+        self.field = field
+        self.start = start
+        self._block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._seeded = False
+        self._lock = asyncio.Lock()
+
+    @property
+    def block_size(self) -> int:
+        if self._block_size is None:
+            return max(1, get_settings().ticket_id_block_size)
+        return max(1, self._block_size)
+
+    async def _seed(self, db: AsyncIOMotorDatabase) -> None:
+        """
+        Make sure the counter never starts below ids already present in the
+        collection (e.g. tickets created by the Node backend). ``$max`` keeps
+        this idempotent when several workers seed concurrently.
+        """
+        last = await db[self.collection].find_one(
+            {self.field: {"$type": "number"}},
+            sort=[(self.field, -1)],
+            projection={self.field: 1, "_id": 0},
+        )
+        floor = int(last[self.field]) if last else self.start - 1
+        await db[COUNTERS_COLLECTION].update_one(
+            {"_id": self.name}, {"$max": {"seq": floor}}, upsert=True
+        )
+        self._seeded = True
+
+    async def reserve(self, db: AsyncIOMotorDatabase, count: int) -> int:
+        """Atomically reserve ``count`` contiguous ids and return the first one."""
+        if count < 1:
+            raise ValueError("count must be at least 1")
+        if not self._seeded:
+            await self._seed(db)
+        counter = await db[COUNTERS_COLLECTION].find_one_and_update(
+            {"_id": self.name},
+            {"$inc": {"seq": count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return int(counter["seq"]) - count + 1
+
+    async def next(self, db: AsyncIOMotorDatabase) -> int:
+        """Return the next id, refilling the in-memory block when it runs out."""
+        while self._next >= self._end:
+            async with self._lock:
+                # Another coroutine may have refilled while we waited
+                if self._next >= self._end:
+                    size = self.block_size
+                    first = await self.reserve(db, size)
+                    self._next, self._end = first, first + size
+        value = self._next
+        self._next += 1
+        return value
+
+
+ticket_ids = SequenceAllocator("ticketId", collection="tickets", field="ticketId", start=1000)
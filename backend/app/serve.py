@@ -0,0 +1,147 @@
+"""
+Production server: ``python -m app.serve``.
+
+The parent process imports the app once and binds the listening socket,
+then forks ``WEB_CONCURRENCY`` workers (default: one, or one per available
+CPU with ``TICKET_EVENTS_SOURCE=changestream``; see below) that share both. Each worker runs its own event loop, Mongo pool and
+lifespan warm-up, and counts as ready on ``/api/ready`` only once that
+warm-up is done. bcrypt, JSON encoding and validation thereby use every
+core, and forked workers start without re-importing the app.
+
+On SIGTERM or SIGINT the parent forwards the signal to every worker. Each
+worker drains (see ``app.lifecycle``) and exits once its in-flight
+requests finish or ``GRACEFUL_SHUTDOWN_SECONDS`` pass. A worker that dies
+unexpectedly is replaced.
+
+Everything kept in process is per worker: the Mongo pool, admission
+limits and per-user rate buckets, the SLA monitor's deadline heap, the
+audit buffer, caches and profiling captures. Limits therefore multiply by
+the worker count. Ticket events with ``TICKET_EVENTS_SOURCE=local`` only
+reach clients connected to the worker that handled the write, so unless
+``WEB_CONCURRENCY`` is set the default is a single worker in that mode and
+one per CPU only with ``changestream``.
+
+On platforms without ``fork`` this falls back to uvicorn's own spawn-based
+workers, which import the app in every worker.
+"""
+import logging
+import os
+import signal
+import sys
+import time
+
+import uvicorn
+
+from .config import get_settings
+from .lifecycle import lifecycle
+
+logger = logging.getLogger("app.serve")
+
+# A worker that exits sooner than this after starting is restarted after a pause
+MIN_WORKER_LIFETIME = 5.0
+
+
+def worker_count(configured: int, events_source: str) -> int:
+    if configured > 0:
+        return configured
+    if events_source == "local":
+        return 1
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
+
+
+class DrainingServer(uvicorn.Server):
+    async def shutdown(self, sockets=None):
+        # Before uvicorn waits on open connections, which SSE streams would hold open
+        lifecycle.begin_drain()
+        await super().shutdown(sockets)
+
+
+class Supervisor:
+    def __init__(self, config: uvicorn.Config, workers: int):
+        self.config = config
+        self.workers = workers
+        self.socket = config.bind_socket()
+        self.children: dict[int, float] = {}
+        self.stopping = False
+
+    def spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(sig, signal.SIG_DFL)
+            code = 0
+            try:
+                DrainingServer(self.config).run(sockets=[self.socket])
+            except BaseException:
+                logger.exception("Worker %d failed", os.getpid())
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = time.monotonic()
+        logger.info("Started worker %d", pid)
+
+    def stop(self, sig, frame) -> None:
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            started = self.children.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+            logger.warning("Worker %d exited (status %d), restarting", pid, status)
+            if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                time.sleep(1)
+            if not self.stopping:
+                self.spawn()
+        self.socket.close()
+        logger.info("All workers stopped")
+
+
+def main() -> None:
+    settings = get_settings()
+    workers = worker_count(settings.web_concurrency, settings.ticket_events_source)
+    options = {
+        "host": "0.0.0.0",
+        "port": settings.port,
+        "timeout_graceful_shutdown": settings.graceful_shutdown_seconds,
+        "proxy_headers": True,
+    }
+    if workers > 1 and not hasattr(os, "fork"):
+        uvicorn.run("app.main:app", workers=workers, **options)
+        return
+
+    config = uvicorn.Config("app.main:app", **options)
+    # Import the app here, before forking, so workers share it
+    config.load()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(message)s")
+    if workers == 1:
+        DrainingServer(config).run()
+        return
+    if settings.ticket_events_source == "local":
+        logger.error(
+            "TICKET_EVENTS_SOURCE=local with %d workers: event stream clients only see changes "
+            "made through their own worker; use changestream (replica set) or WEB_CONCURRENCY=1",
+            workers,
+        )
+    logger.info("Serving on %s:%d with %d workers", config.host, config.port, workers)
+    Supervisor(config, workers).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+"""
+SLA due dates and breach detection.
+
+``sla_policies`` holds the active policies in memory by (organization,
+priority), falling back to global policies and then to the Node backend's
+defaults. ``stamp`` computes the due-date fields written on tickets at
+create/update time. ``sla_monitor`` keeps a min-heap of upcoming warning
+and breach moments and flags each ticket when its moment arrives, instead
+of periodically scanning every open ticket.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel, UpdateOne
+from pymongo.errors import PyMongoError
+
+from .config import get_settings
+from .dashboard import OPEN_STATUSES
+from .indexes import register_indexes
+from .refdata import refdata
+
+logger = logging.getLogger(__name__)
+
+# Hours, as in server/config/sla.js
+DEFAULT_POLICIES = {
+    "urgent": (1, 4),
+    "high": (4, 24),
+    "medium": (8, 72),
+    "low": (24, 168),
+}
+
+# Share of the SLA window after which a warning is raised
+WARNING_THRESHOLD = 0.8
+
+# due date field, breached flag, breached-at field, warning flag
+DEADLINES = {
+    "response": ("responseDueDate", "slaResponseBreached", "slaResponseBreachedAt", "slaResponseWarningSent"),
+    "resolution": ("dueDate", "slaResolutionBreached", "slaResolutionBreachedAt", "slaResolutionWarningSent"),
+}
+
+register_indexes("tickets", IndexModel([("status", ASCENDING), ("dueDate", ASCENDING)]))
+
+
+def _org_key(organization) -> str | None:
+    if isinstance(organization, dict):
+        organization = organization.get("_id")
+    return str(organization) if organization is not None else None
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+class SLAPolicyIndex:
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._policies: dict[tuple[str | None, str], tuple[float, float]] = {}
+        self._version = -1
+        self._loaded_at = 0.0
+
+    async def load(self, db: AsyncIOMotorDatabase) -> None:
+        policies = {}
+        async for doc in db["slapolicies"].find(
+            {"isActive": {"$ne": False}},
+            projection={"organization": 1, "priority": 1, "responseTime": 1, "resolutionTime": 1},
+        ):
+            policies[(_org_key(doc.get("organization")), doc.get("priority"))] = (
+                float(doc["responseTime"]),
+                float(doc["resolutionTime"]),
+            )
+        self._policies = policies
+        self._version = refdata.version("slapolicies")
+        self._loaded_at = time.monotonic()
+
+    async def refresh_if_stale(self, db: AsyncIOMotorDatabase) -> None:
+        """Reload after a catalog version bump, or periodically for outside writes."""
+        if self._version != refdata.version("slapolicies") or time.monotonic() - self._loaded_at > self.refresh_seconds:
+            await self.load(db)
+
+    def lookup(self, organization, priority: str) -> tuple[float, float]:
+        """(response hours, resolution hours) for a ticket."""
+        return (
+            self._policies.get((_org_key(organization), priority))
+            or self._policies.get((None, priority))
+            or DEFAULT_POLICIES.get(priority, DEFAULT_POLICIES["medium"])
+        )
+
+    def stamp(self, ticket: dict) -> dict:
+        """
+        SLA fields to store on ``ticket``, computed from its createdAt and
+        priority. The breach and warning flags of a deadline are reset only
+        when it is new or moved into the future; a ticket that already
+        breached keeps its record when the new deadline has passed too.
+        """
+        now = datetime.now(timezone.utc)
+        created_at = _as_utc(ticket["createdAt"])
+        # Mongo keeps milliseconds; truncate so the monitor can match stored values
+        created_at = created_at.replace(microsecond=created_at.microsecond // 1000 * 1000)
+        response_hours, resolution_hours = self.lookup(ticket.get("organization"), ticket.get("priority", "medium"))
+        fields = {
+            "responseDueDate": created_at + timedelta(hours=response_hours),
+            "dueDate": created_at + timedelta(hours=resolution_hours),
+            "slaResponseTime": response_hours,
+            "slaResolutionTime": resolution_hours,
+        }
+        for due_field, breached, breached_at, warning in DEADLINES.values():
+            previous = ticket.get(due_field)
+            due = fields[due_field]
+            moved = not isinstance(previous, datetime) or _as_utc(previous) != due
+            if due_field not in ticket or (moved and due > now):
+                fields.update({breached: False, breached_at: None, warning: False})
+        return fields
+
+
+class SLAMonitor:
+    """
+    Flags SLA warnings and breaches at the moment they happen.
+
+    Every open ticket contributes up to four heap entries (response and
+    resolution, warning and breach). The background task sleeps until the
+    earliest entry is due, or until an earlier one is added.
+
+    Entries carry the generation of the ``track`` call that pushed them.
+    Tracking a ticket again with the same deadlines and flags pushes
+    nothing; with different ones (or once the ticket is closed) it starts
+    a new generation, and the older entries are skipped when they come up.
+    Superseded entries are dropped in bulk once they outnumber live ones,
+    so the heap grows with open tickets rather than with edits. Flagging is
+    still a conditional update that only matches tickets open with the same
+    due date and no flag yet, which keeps several workers from flagging a
+    ticket twice.
+    """
+
+    # Superseded entries tolerated before the heap is compacted
+    COMPACT_SLACK = 1000
+
+    def __init__(self):
+        self.flagged = 0
+        self._heap: list[tuple[float, int, ObjectId, str, str, datetime]] = []
+        self._counter = itertools.count()
+        # Ticket id -> (generation, what it was scheduled for, entries still in the heap)
+        self._current: dict[ObjectId, tuple[int, tuple, int]] = {}
+        self._live = 0
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return self._live
+
+    def _forget(self, ticket_id: ObjectId) -> None:
+        current = self._current.pop(ticket_id, None)
+        if current is not None:
+            self._live -= current[2]
+
+    def _compact(self) -> None:
+        if len(self._heap) - self._live <= max(self._live, self.COMPACT_SLACK):
+            return
+        self._heap = [entry for entry in self._heap if self._is_live(entry)]
+        heapq.heapify(self._heap)
+
+    def _is_live(self, entry: tuple) -> bool:
+        current = self._current.get(entry[2])
+        return current is not None and current[0] == entry[1]
+
+    def track(self, ticket: dict) -> None:
+        """Schedule the pending warnings and breaches of an open ticket."""
+        if self._task is None:
+            # Not monitoring in this process (CLI imports, SLA_MONITOR_ENABLED=false)
+            return
+        if "_id" not in ticket:
+            return
+        ticket_id = ticket["_id"]
+        if ticket.get("status", "open") not in OPEN_STATUSES:
+            self._forget(ticket_id)
+            return
+        created_at = ticket.get("createdAt")
+        scheduled = tuple(
+            (ticket.get(due_field), bool(ticket.get(breached)), bool(ticket.get(warning)))
+            for due_field, breached, _, warning in DEADLINES.values()
+        ) + (created_at,)
+        current = self._current.get(ticket_id)
+        if current is not None and current[1] == scheduled:
+            return
+        self._forget(ticket_id)
+
+        generation = next(self._counter)
+        entries = []
+        for kind, (due_field, breached, _, warning) in DEADLINES.items():
+            due = ticket.get(due_field)
+            if not isinstance(due, datetime) or ticket.get(breached):
+                continue
+            due_ts = _as_utc(due).timestamp()
+            if not ticket.get(warning) and isinstance(created_at, datetime):
+                start_ts = _as_utc(created_at).timestamp()
+                warn_ts = start_ts + (due_ts - start_ts) * WARNING_THRESHOLD
+                entries.append((warn_ts, generation, ticket_id, kind, "warning", due))
+            entries.append((due_ts, generation, ticket_id, kind, "breach", due))
+        if not entries:
+            return
+        earliest = self._heap[0][0] if self._heap else None
+        for entry in entries:
+            heapq.heappush(self._heap, entry)
+        self._current[ticket_id] = (generation, scheduled, len(entries))
+        self._live += len(entries)
+        self._compact()
+        if earliest is None or self._heap[0][0] < earliest:
+            self._wakeup.set()
+
+    def _done(self, entries: list[tuple]) -> None:
+        """Account for fired entries; a ticket is forgotten once none of its entries are left."""
+        for entry in entries:
+            ticket_id = entry[2]
+            current = self._current.get(ticket_id)
+            if current is None or current[0] != entry[1]:
+                continue
+            self._live -= 1
+            if current[2] <= 1:
+                del self._current[ticket_id]
+            else:
+                self._current[ticket_id] = (current[0], current[1], current[2] - 1)
+
+    async def load(self, db: AsyncIOMotorDatabase) -> None:
+        """Schedule every open ticket that still has an unflagged deadline."""
+        query = {
+            "status": {"$in": OPEN_STATUSES},
+            "$or": [
+                {"responseDueDate": {"$ne": None}, "slaResponseBreached": {"$ne": True}},
+                {"dueDate": {"$ne": None}, "slaResolutionBreached": {"$ne": True}},
+            ],
+        }
+        projection = {"status": 1, "createdAt": 1}
+        for due_field, breached, _, warning in DEADLINES.values():
+            projection.update({due_field: 1, breached: 1, warning: 1})
+        async for ticket in db["tickets"].find(query, projection=projection, batch_size=5000):
+            self.track(ticket)
+
+    async def _fire(self, db: AsyncIOMotorDatabase, entries: list[tuple]) -> None:
+        now = datetime.now(timezone.utc)
+        requests = []
+        for _, _, ticket_id, kind, event, due in entries:
+            due_field, breached, breached_at, warning = DEADLINES[kind]
+            flag = breached if event == "breach" else warning
+            update = {flag: True, breached_at: now} if event == "breach" else {flag: True}
+            requests.append(
+                UpdateOne(
+                    {"_id": ticket_id, "status": {"$in": OPEN_STATUSES}, due_field: due, flag: {"$ne": True}},
+                    {"$set": update},
+                )
+            )
+        result = await db["tickets"].bulk_write(requests, ordered=False)
+        if result.modified_count:
+            self.flagged += result.modified_count
+            logger.info("SLA monitor flagged %d of %d due deadlines", result.modified_count, len(entries))
+
+    async def run(self, db: AsyncIOMotorDatabase) -> None:
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = time.time()
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                if self._is_live(entry):
+                    due.append(entry)
+            if not due:
+                continue
+            try:
+                await self._fire(db, due)
+                self._done(due)
+            except PyMongoError as exc:
+                logger.warning("SLA monitor update failed, retrying shortly: %s", exc)
+                for entry in due:
+                    heapq.heappush(self._heap, (now + 5, *entry[1:]))
+
+    async def start(self, db: AsyncIOMotorDatabase) -> None:
+        self._task = asyncio.create_task(self.run(db))
+        await self.load(db)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+sla_policies = SLAPolicyIndex(refresh_seconds=get_settings().sla_policy_refresh_seconds)
+sla_monitor = SLAMonitor()
@@ -0,0 +1,130 @@
+"""
+Latency of an unrelated route while logins are being verified.
+
+Runs the app in process and keeps probing GET /api/health while a batch of
+concurrent "logins" verifies bcrypt hashes, once with ``bcrypt.checkpw``
+called inline on the event loop (the old login path) and once through the
+``password_hasher`` thread pool. Only the hashing step of a login is
+simulated, so no MongoDB is needed.
+
+    cd backend && python -m benchmarks.login_latency --logins 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import bcrypt
+
+from app.main import create_app
+from app.passwords import PasswordHasher, PasswordHasherBusy
+
+PROBE_INTERVAL = 0.005
+
+
+async def asgi_get(app, path: str) -> int:
+    """Minimal in-process ASGI GET; returns the status code."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run(app, mode: str, hashed: bytes, logins: int, concurrency: int, hasher: PasswordHasher) -> dict:
+    probes: list[float] = []
+    done = asyncio.Event()
+    rejected = 0
+
+    async def login_worker(count: int):
+        nonlocal rejected
+        for _ in range(count):
+            if mode == "inline":
+                bcrypt.checkpw(b"secret", hashed)
+                # Let other coroutines run between logins, as a real request would
+                await asyncio.sleep(0)
+            else:
+                try:
+                    await hasher.verify("secret", hashed.decode())
+                except PasswordHasherBusy:
+                    rejected += 1
+                    await asyncio.sleep(0.001)
+
+    async def prober():
+        # Latency counts from when the request should have started, so time
+        # spent waiting for a blocked event loop is included
+        while not done.is_set():
+            scheduled = time.perf_counter() + PROBE_INTERVAL
+            await asyncio.sleep(PROBE_INTERVAL)
+            await asgi_get(app, "/api/health")
+            probes.append((time.perf_counter() - scheduled) * 1000)
+
+    probe_task = asyncio.create_task(prober())
+    per_worker = max(1, logins // concurrency)
+    started = time.perf_counter()
+    await asyncio.gather(*(login_worker(per_worker) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await probe_task
+    return {
+        "mode": mode,
+        "logins/s": per_worker * concurrency / elapsed,
+        "rejected": rejected,
+        "probes": len(probes),
+        "p50 ms": statistics.median(probes),
+        "p99 ms": percentile(probes, 99),
+        "max ms": max(probes),
+    }
+
+
+async def main_async(args) -> None:
+    app = create_app()
+    hashed = bcrypt.hashpw(b"secret", bcrypt.gensalt(rounds=args.rounds))
+    hasher = PasswordHasher(workers=args.workers, max_queue=args.max_queue, rounds=args.rounds)
+    try:
+        for mode in ("inline", "pool"):
+            result = await run(app, mode, hashed, args.logins, args.concurrency, hasher)
+            print("  ".join(f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}" for key, value in result.items()))
+    finally:
+        hasher.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-queue", type=int, default=64)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Ticket search latency against a generated corpus.
+
+Fills a scratch database with synthetic tickets (titles and descriptions
+assembled from a help-desk vocabulary with a skewed word distribution, so
+some terms are common and some rare), creates the registered indexes,
+then times ``search_tickets`` for a fixed query mix, with and without
+filters, first page and a deep page. Needs a running MongoDB.
+
+    cd backend && MONGODB_DB=search_bench python -m benchmarks.search_latency --generate 1000000
+    cd backend && MONGODB_DB=search_bench python -m benchmarks.search_latency --runs 50
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+from app.config import get_settings
+from app.db import get_database
+from app.indexes import ensure_indexes
+from app.routes.tickets import LIST_PROJECTION
+from app.search import search_tickets
+
+SUBJECTS = [
+    "printer", "laptop", "vpn", "email", "outlook", "monitor", "keyboard", "password", "account", "wifi",
+    "projector", "badge", "phone", "headset", "database", "server", "backup", "license", "browser", "invoice",
+]
+PROBLEMS = [
+    "not working", "keeps crashing", "very slow", "cannot connect", "access denied", "shows error",
+    "needs replacement", "locked out", "not syncing", "requires update", "intermittent failure",
+]
+FILLER = (
+    "user reports issue since this morning after restart tried reinstalling driver cleared cache "
+    "rebooted machine escalated from floor support affects whole team deadline tomorrow please advise "
+    "attached screenshot logs show timeout configuration changed recently ticket reopened"
+).split()
+CATEGORIES = ["hardware", "software", "network", "access", "billing"]
+PRIORITIES = ["low", "medium", "high", "urgent"]
+STATUSES = ["open", "in-progress", "resolved", "closed"]
+
+QUERIES = ["printer", "vpn cannot connect", '"locked out"', "outlook -crashing", "projector badge", "timeout"]
+
+
+def make_ticket(rng: random.Random, number: int, organizations: list[ObjectId], now: datetime) -> dict:
+    # Zipf-like choice so the head of SUBJECTS is much more frequent than the tail
+    subject = SUBJECTS[min(int(rng.paretovariate(1.2)) - 1, len(SUBJECTS) - 1)]
+    created = now - timedelta(minutes=rng.randint(0, 525_600))
+    return {
+        "ticketId": 1000 + number,
+        "title": f"{subject.capitalize()} {rng.choice(PROBLEMS)}",
+        "description": " ".join(rng.choices(FILLER, k=rng.randint(15, 60)) + [subject, rng.choice(SUBJECTS)]),
+        "category": rng.choice(CATEGORIES),
+        "priority": rng.choice(PRIORITIES),
+        "status": rng.choice(STATUSES),
+        "organization": rng.choice(organizations),
+        "createdAt": created,
+        "updatedAt": created,
+    }
+
+
+async def generate(db, count: int, batch_size: int) -> None:
+    rng = random.Random(42)
+    organizations = [ObjectId() for _ in range(20)]
+    now = datetime.now(timezone.utc)
+    await db["tickets"].drop()
+    started = time.perf_counter()
+    for offset in range(0, count, batch_size):
+        docs = [make_ticket(rng, number, organizations, now) for number in range(offset, min(count, offset + batch_size))]
+        await db["tickets"].insert_many(docs, ordered=False)
+        print(f"\rinserted {offset + len(docs):>9}/{count}", end="", flush=True)
+    print(f"\ninsert: {time.perf_counter() - started:.0f}s")
+    started = time.perf_counter()
+    await ensure_indexes(db)
+    print(f"indexes: {time.perf_counter() - started:.0f}s")
+
+
+async def timed(coro) -> tuple[float, tuple]:
+    start = time.perf_counter()
+    result = await coro
+    return (time.perf_counter() - start) * 1000, result
+
+
+async def measure(db, runs: int, limit: int) -> None:
+    collection = db["tickets"]
+    sample = await collection.find_one({}, projection={"organization": 1})
+    if sample is None:
+        raise SystemExit("No tickets; run with --generate first")
+    cases = {
+        "first page": {},
+        "status=open": {"status": "open"},
+        "org+priority": {"organization": sample["organization"], "priority": "high"},
+    }
+    print(f"{'query':<22}{'case':<14}{'p50 ms':>9}{'p95 ms':>9}{'page3 ms':>10}{'rows':>6}")
+    for query in QUERIES:
+        for case, filters in cases.items():
+            samples = []
+            for _ in range(runs):
+                elapsed, (docs, _) = await timed(search_tickets(collection, query, filters, LIST_PROJECTION, None, limit))
+                samples.append(elapsed)
+            # Follow the cursor twice to time a deeper page
+            cursor, deep = None, 0.0
+            for _ in range(3):
+                deep, (_, cursor) = await timed(search_tickets(collection, query, filters, LIST_PROJECTION, cursor, limit))
+                if cursor is None:
+                    break
+            p95 = statistics.quantiles(samples, n=20)[-1] if len(samples) > 1 else samples[0]
+            print(f"{query:<22}{case:<14}{statistics.median(samples):9.1f}{p95:9.1f}{deep:10.1f}{len(docs):6}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure ticket search latency on a synthetic corpus.")
+    parser.add_argument("--generate", type=int, metavar="N", help="replace the tickets collection with N tickets")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    settings = get_settings()
+    if args.generate and settings.database_name == "ticketing_tool":
+        raise SystemExit("Refusing to replace tickets in the default database; set MONGODB_DB to a scratch database")
+
+    async def run() -> None:
+        db = get_database()
+        print(f"database: {settings.database_name}")
+        if args.generate:
+            await generate(db, args.generate, args.batch_size)
+        await measure(db, args.runs, args.limit)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
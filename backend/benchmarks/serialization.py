@@ -0,0 +1,104 @@
+"""
+Serialization throughput for a 10k-document list response.
+
+"before" is the old path: per-document ObjectId conversion with the
+recursive ``_convert_object_ids`` helper, then FastAPI's ``jsonable_encoder``
+and ``JSONResponse``. "after" is ``BSONResponse`` encoding the raw Motor
+documents in a single orjson pass.
+
+    cd backend && python -m benchmarks.serialization --docs 10000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from bson import Decimal128, ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.responses import BSONResponse
+
+
+def make_documents(count: int) -> list[dict]:
+    """Ticket-shaped documents as Motor returns them."""
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    docs = []
+    for number in range(count):
+        created = now - timedelta(minutes=rng.randint(0, 500_000))
+        docs.append(
+            {
+                "_id": ObjectId(),
+                "ticketId": 1000 + number,
+                "title": f"Printer on floor {rng.randint(1, 30)} is jammed",
+                "description": "Paper keeps jamming in tray 2. " * 4,
+                "category": rng.choice(["hardware", "software", "network"]),
+                "priority": rng.choice(["low", "medium", "high", "urgent"]),
+                "status": rng.choice(["open", "in-progress", "resolved", "closed"]),
+                "creator": ObjectId(),
+                "assignee": ObjectId(),
+                "organization": ObjectId(),
+                "department": ObjectId(),
+                "cost": Decimal128(Decimal(rng.randint(0, 100_000)) / 100),
+                "createdAt": created,
+                "updatedAt": created + timedelta(hours=rng.randint(0, 72)),
+                "comments": [
+                    {"author": ObjectId(), "content": "Looking into it", "createdAt": created, "mentions": [ObjectId()]}
+                    for _ in range(rng.randint(0, 3))
+                ],
+            }
+        )
+    return docs
+
+
+def _convert_object_ids(obj):
+    """The helper previously used by routes/users.py."""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, list):
+        return [_convert_object_ids(item) for item in obj]
+    if isinstance(obj, dict):
+        return {key: _convert_object_ids(value) for key, value in obj.items()}
+    return obj
+
+
+def before(docs: list[dict]) -> bytes:
+    converted = [_convert_object_ids(doc) for doc in docs]
+    # jsonable_encoder has no Decimal128 support; the old routes could not
+    # return such documents at all, so give it the closest equivalent
+    for doc in converted:
+        doc["cost"] = doc["cost"].to_decimal()
+    return JSONResponse(jsonable_encoder(converted)).body
+
+
+def after(docs: list[dict]) -> bytes:
+    return BSONResponse(docs).body
+
+
+def measure(func, docs: list[dict], repeat: int) -> tuple[float, int]:
+    best = float("inf")
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(func(docs))
+        best = min(best, time.perf_counter() - start)
+    return best, size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare list response serialization paths.")
+    parser.add_argument("--docs", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    docs = make_documents(args.docs)
+    results = {name: measure(func, docs, args.repeat) for name, func in (("before", before), ("after", after))}
+    for name, (seconds, size) in results.items():
+        print(f"{name:>6}: {seconds * 1000:8.1f} ms  {args.docs / seconds:10.0f} docs/s  {size / 1024:8.0f} KiB")
+    print(f"speedup: {results['before'][0] / results['after'][0]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
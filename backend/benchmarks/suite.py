@@ -0,0 +1,347 @@
+"""
+End-to-end benchmark suite for the FastAPI app.
+
+Drives ``create_app()`` in process over httpx's ASGI transport (lifespan
+included), against either a local mongod or an in-memory Motor stand-in
+(``--in-memory``, needs ``mongomock-motor``). The database is seeded with
+synthetic organizations, catalogs, users and tickets, then each scenario
+is run for a fixed number of requests at a fixed concurrency and reported
+as throughput and p50/p95/p99 latency.
+
+Results are written as JSON (``--output``). With ``--baseline`` they are
+compared to an earlier result file, and the exit status is 1 when any
+scenario's p95/p99 grew, or its throughput fell, by more than
+``--threshold``. ``--save-baseline`` writes the current results there
+instead.
+
+    cd backend && python -m benchmarks.suite --in-memory --output bench.json
+    cd backend && MONGODB_DB=ticketing_bench python -m benchmarks.suite --seed --baseline baseline.json
+    cd backend && MONGODB_DB=ticketing_bench python -m benchmarks.suite --baseline baseline.json --save-baseline
+
+Numbers are only comparable between runs on the same machine and backend.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+import httpx
+from bson import ObjectId
+
+from app import db as dbmodule
+from app.admission import user_limits
+from app.config import get_settings
+from app.main import create_app
+from app.passwords import password_hasher
+from app.rollups import rebuild
+from app.sequences import ticket_ids
+from app.sla_engine import sla_policies
+
+PASSWORD = "bench-password"
+PRIORITIES = ["low", "medium", "high", "urgent"]
+STATUSES = ["open", "in-progress", "resolved", "closed"]
+CATEGORY_NAMES = ["hardware", "software", "network", "access", "email", "printing", "telephony", "facilities"]
+SEEDED_COLLECTIONS = [
+    "organizations", "departments", "categories", "slapolicies", "users", "tickets", "ticket_rollups", "counters",
+]
+
+
+@dataclass
+class Context:
+    """Ids and credentials shared by the scenarios."""
+
+    emails: list[str] = field(default_factory=list)
+    tokens: list[str] = field(default_factory=list)
+    ticket_ids: list[int] = field(default_factory=list)
+    organizations: list[str] = field(default_factory=list)
+    rng: random.Random = field(default_factory=lambda: random.Random(7))
+
+    def auth(self) -> dict:
+        return {"Authorization": f"Bearer {self.rng.choice(self.tokens)}"}
+
+
+async def seed(db, users: int, tickets: int, rng: random.Random) -> None:
+    for name in SEEDED_COLLECTIONS:
+        await db[name].drop()
+    now = datetime.now(timezone.utc)
+
+    organizations = [{"_id": ObjectId(), "name": f"Org {n}", "domain": f"org{n}.example"} for n in range(5)]
+    departments = [
+        {"_id": ObjectId(), "name": f"Dept {n}", "organization": rng.choice(organizations)["_id"], "isActive": True}
+        for n in range(10)
+    ]
+    await db["organizations"].insert_many(organizations)
+    await db["departments"].insert_many(departments)
+    await db["categories"].insert_many([{"name": name, "status": "active"} for name in CATEGORY_NAMES])
+    await db["slapolicies"].insert_many(
+        [
+            {"organization": None, "priority": priority, "responseTime": hours, "resolutionTime": hours * 6, "isActive": True}
+            for priority, hours in zip(PRIORITIES, (24, 8, 4, 1))
+        ]
+    )
+
+    # One hash for everybody: seeding should not take minutes of bcrypt
+    hashed = await password_hasher.hash(PASSWORD)
+    user_docs = [
+        {
+            "_id": ObjectId(),
+            "name": f"Bench User {n}",
+            "email": f"user{n}@bench.example",
+            "password": hashed,
+            "role": "admin" if n == 0 else rng.choice(["user", "user", "technician"]),
+            "status": "active",
+            "organization": rng.choice(organizations)["_id"],
+            "createdAt": now,
+            "updatedAt": now,
+        }
+        for n in range(users)
+    ]
+    await db["users"].insert_many(user_docs)
+    technicians = [user["_id"] for user in user_docs if user["role"] == "technician"] or [user_docs[0]["_id"]]
+
+    await sla_policies.load(db)
+    batch: list[dict] = []
+    first = await ticket_ids.reserve(db, tickets)
+    for n in range(tickets):
+        creator = rng.choice(user_docs)
+        created = now - timedelta(minutes=rng.randint(0, 60 * 24 * 90))
+        ticket = {
+            "ticketId": first + n,
+            "title": f"{rng.choice(CATEGORY_NAMES).capitalize()} issue #{n}",
+            "description": "Synthetic benchmark ticket. " * rng.randint(1, 6),
+            "category": rng.choice(CATEGORY_NAMES),
+            "priority": rng.choice(PRIORITIES),
+            "status": rng.choice(STATUSES),
+            "creator": creator["_id"],
+            "assignee": rng.choice(technicians),
+            "organization": creator["organization"],
+            "department": rng.choice(departments)["_id"],
+            "createdAt": created,
+            "updatedAt": created + timedelta(hours=rng.randint(0, 48)),
+        }
+        ticket.update(sla_policies.stamp(ticket))
+        batch.append(ticket)
+        if len(batch) >= 5000:
+            await db["tickets"].insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db["tickets"].insert_many(batch, ordered=False)
+    await rebuild(db)
+
+
+async def load_context(db, client: httpx.AsyncClient, sessions: int) -> Context:
+    context = Context()
+    context.emails = [doc["email"] async for doc in db["users"].find({}, projection={"email": 1})]
+    context.ticket_ids = [doc["ticketId"] async for doc in db["tickets"].find({}, projection={"ticketId": 1})]
+    context.organizations = [str(doc["_id"]) async for doc in db["organizations"].find({}, projection={"_id": 1})]
+    if not context.emails or not context.ticket_ids:
+        raise SystemExit("Database has no users or tickets; run with --seed")
+    for email in context.emails[:sessions]:
+        response = await client.post("/api/auth/login", json={"email": email, "password": PASSWORD})
+        response.raise_for_status()
+        context.tokens.append(response.json()["token"])
+    return context
+
+
+Scenario = Callable[[httpx.AsyncClient, Context], Awaitable[httpx.Response]]
+
+
+def _create_ticket(client: httpx.AsyncClient, context: Context):
+    return client.post(
+        "/api/tickets/",
+        json={
+            "title": "Benchmark ticket",
+            "description": "Created by the benchmark suite",
+            "category": context.rng.choice(CATEGORY_NAMES),
+            "priority": context.rng.choice(PRIORITIES),
+        },
+    )
+
+
+SCENARIOS: dict[str, Scenario] = {
+    "login": lambda client, ctx: client.post(
+        "/api/auth/login", json={"email": ctx.rng.choice(ctx.emails), "password": PASSWORD}
+    ),
+    "auth_me": lambda client, ctx: client.get("/api/auth/me", headers=ctx.auth()),
+    "ticket_create": _create_ticket,
+    "ticket_get": lambda client, ctx: client.get(f"/api/tickets/{ctx.rng.choice(ctx.ticket_ids)}"),
+    "ticket_list": lambda client, ctx: client.get("/api/tickets/", params={"limit": 50}),
+    "ticket_list_filtered": lambda client, ctx: client.get(
+        "/api/tickets/",
+        params={"status": ctx.rng.choice(STATUSES), "organization": ctx.rng.choice(ctx.organizations), "limit": 50},
+    ),
+    "categories": lambda client, ctx: client.get("/api/categories/"),
+    "departments": lambda client, ctx: client.get("/api/departments/"),
+    "organizations": lambda client, ctx: client.get("/api/organizations/"),
+    "sla_policies": lambda client, ctx: client.get("/api/admin/sla/"),
+    "ticket_dashboard": lambda client, ctx: client.get("/api/tickets/stats/dashboard", headers=ctx.auth()),
+    "reports_dashboard": lambda client, ctx: client.get(
+        "/api/reports/dashboard", params={"organization": ctx.rng.choice(ctx.organizations)}
+    ),
+}
+
+
+def percentile(ordered: list[float], pct: float) -> float:
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient, context: Context, scenario: Scenario, requests: int, concurrency: int, warmup: int
+) -> dict:
+    for _ in range(warmup):
+        await scenario(client, context)
+
+    latencies: list[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            response = await scenario(client, context)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[dict]:
+    """One row per scenario and metric present in both result files."""
+    rows = []
+    for name, result in current["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for metric, higher_is_worse in (("p95_ms", True), ("p99_ms", True), ("throughput_rps", False)):
+            before, after = previous.get(metric), result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            regressed = change > threshold if higher_is_worse else change < -threshold
+            rows.append(
+                {"scenario": name, "metric": metric, "baseline": before, "current": after,
+                 "change": round(change, 4), "regressed": regressed}
+            )
+    return rows
+
+
+async def run(args) -> dict:
+    if args.in_memory:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("--in-memory needs the mongomock-motor package")
+        dbmodule._client = AsyncMongoMockClient(tz_aware=True)
+    settings = get_settings()
+    db = dbmodule.get_database()
+    if args.seed or args.in_memory:
+        if not args.in_memory and settings.database_name == "ticketing_tool":
+            raise SystemExit("Refusing to reseed the default database; set MONGODB_DB to a scratch database")
+        started = time.perf_counter()
+        await seed(db, args.users, args.tickets, random.Random(args.random_seed))
+        print(f"seeded {args.users} users, {args.tickets} tickets in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    # A handful of sessions drive the whole load; measure capacity, not the per-user limit
+    user_limits.rate = 0
+    app = create_app()
+    selected = args.scenarios or list(SCENARIOS)
+    results: dict[str, dict] = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            context = await load_context(db, client, args.sessions)
+            for name in selected:
+                requests = args.login_requests if name == "login" else args.requests
+                results[name] = await run_scenario(
+                    client, context, SCENARIOS[name], requests, args.concurrency, args.warmup
+                )
+                print(f"{name:<22}" + "  ".join(f"{key}={value}" for key, value in results[name].items()), file=sys.stderr)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": "in-memory" if args.in_memory else "mongod",
+            "users": args.users,
+            "tickets": args.tickets,
+            "requests": args.requests,
+            "login_requests": args.login_requests,
+            "concurrency": args.concurrency,
+        },
+        "scenarios": results,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the in-process API benchmark suite.")
+    parser.add_argument("--in-memory", action="store_true", help="use mongomock-motor instead of MONGODB_URI")
+    parser.add_argument("--seed", action="store_true", help="drop and reseed the benchmark collections first")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--tickets", type=int, default=20_000)
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--sessions", type=int, default=20, help="distinct logged-in users for authenticated calls")
+    parser.add_argument("--requests", type=int, default=1000, help="requests per scenario")
+    parser.add_argument("--login-requests", type=int, default=100, help="requests for the bcrypt-bound login scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--scenario", dest="scenarios", action="append", choices=SCENARIOS, help="run only these")
+    parser.add_argument("--output", help="write results as JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="result file to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results to --baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative regression (default 0.10)")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args))
+    body = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(body + "\n")
+    else:
+        print(body)
+
+    if not args.baseline:
+        return 0
+    if args.save_baseline:
+        with open(args.baseline, "w") as handle:
+            handle.write(body + "\n")
+        print(f"baseline written to {args.baseline}", file=sys.stderr)
+        return 0
+
+    with open(args.baseline) as handle:
+        rows = compare(results, json.load(handle), args.threshold)
+    for row in rows:
+        flag = "REGRESSION" if row["regressed"] else ""
+        print(
+            f"{row['scenario']:<22}{row['metric']:<16}{row['baseline']:>10}{row['current']:>10}"
+            f"{row['change']:>+9.1%}  {flag}",
+            file=sys.stderr,
+        )
+    regressions = [row for row in rows if row["regressed"]]
+    print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,31 @@
+"""Smoke test: every benchmark scenario runs against the in-memory database without errors."""
+import json
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+from benchmarks import suite  # noqa: E402
+
+
+def test_in_memory_suite_runs_without_errors(tmp_path):
+    output = tmp_path / "bench.json"
+    status = suite.main(
+        [
+            "--in-memory",
+            "--users", "20",
+            "--tickets", "200",
+            "--sessions", "3",
+            "--requests", "10",
+            "--login-requests", "2",
+            "--concurrency", "2",
+            "--warmup", "1",
+            "--output", str(output),
+        ]
+    )
+
+    assert status == 0
+    scenarios = json.loads(output.read_text())["scenarios"]
+    assert set(scenarios) == set(suite.SCENARIOS)
+    failing = {name: result["errors"] for name, result in scenarios.items() if result["errors"]}
+    assert not failing
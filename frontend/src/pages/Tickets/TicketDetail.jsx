@@ -21,9 +21,9 @@ export const TicketDetail = () => {
   const [loading, setLoading] = useState(true)
   const [newComment, setNewComment] = useState('')
   const [commentLoading, setCommentLoading] = useState(false)
+  const [olderCommentsLoading, setOlderCommentsLoading] = useState(false)
   const [isDateModalOpen, setIsDateModalOpen] = useState(false)
   const [selectedDate, setSelectedDate] = useState('')
-  const [mentionUsers, setMentionUsers] = useState([])
   const [showMentionSuggestions, setShowMentionSuggestions] = useState(false)
   const [mentionSuggestions, setMentionSuggestions] = useState([])
   const [mentionIndex, setMentionIndex] = useState(-1)
@@ -32,6 +32,7 @@ export const TicketDetail = () => {
   const [assigneeLoading, setAssigneeLoading] = useState(false)
   const textareaRef = useRef(null)
   const mentionListRef = useRef(null)
+  const mentionRequestRef = useRef(0)
 
   const formatStatus = (status) => {
     const statusMap = {
@@ -48,16 +49,21 @@ export const TicketDetail = () => {
 
   useEffect(() => {
     loadTicket()
-    loadMentionUsers()
     if (user?.role === 'admin' || user?.role === 'technician') {
       loadAssignees()
     }
   }, [id, user])
 
-  const loadMentionUsers = async () => {
+  const loadMentionSuggestions = async (searchTerm) => {
+    // Only the response to the latest keystroke is shown
+    const requestId = ++mentionRequestRef.current
     try {
-      const users = await usersAPI.getMentions()
-      setMentionUsers(users)
+      const users = await usersAPI.getMentions(searchTerm)
+      if (requestId !== mentionRequestRef.current) return
+      setMentionSuggestions(users.filter(u =>
+        u.name.toLowerCase().includes(searchTerm) ||
+        u.email.toLowerCase().includes(searchTerm)
+      ))
     } catch (error) {
       console.error('Failed to load users for mentions:', error)
     }
@@ -142,11 +148,7 @@ export const TicketDetail = () => {
       // Check if there's a space after @ (meaning mention is complete)
       if (!textAfterAt.includes(' ') && !textAfterAt.includes('\n')) {
         const searchTerm = textAfterAt.toLowerCase()
-        const filtered = mentionUsers.filter(u => 
-          u.name.toLowerCase().includes(searchTerm) || 
-          u.email.toLowerCase().includes(searchTerm)
-        )
-        setMentionSuggestions(filtered)
+        loadMentionSuggestions(searchTerm)
         setMentionIndex(lastAtIndex)
         setShowMentionSuggestions(true)
         setSelectedMentionIndex(0)
@@ -257,6 +259,24 @@ export const TicketDetail = () => {
     return <>{parts}</>
   }
 
+  const loadOlderComments = async () => {
+    if (!ticket?.commentsCursor) return
+    setOlderCommentsLoading(true)
+    try {
+      const { items, nextCursor } = await ticketsAPI.getComments(id, ticket.commentsCursor)
+      // Pages are newest first; the list shows oldest first
+      setTicket((prev) => ({
+        ...prev,
+        comments: [...items.reverse(), ...prev.comments],
+        commentsCursor: nextCursor,
+      }))
+    } catch (error) {
+      toast.error(error.message || 'Failed to load older comments')
+    } finally {
+      setOlderCommentsLoading(false)
+    }
+  }
+
   const handleAddComment = async (e) => {
     e.preventDefault()
     if (!newComment.trim()) return
@@ -268,7 +288,17 @@ export const TicketDetail = () => {
         attachments: [],
       })
       
-      setTicket(updatedTicket)
+      // The response carries only the newest comment bucket; keep the older comments already shown
+      setTicket((prev) => {
+        const shown = (prev?.comments || []).filter(
+          (comment) => !updatedTicket.comments.some((latest) => latest._id === comment._id)
+        )
+        return {
+          ...updatedTicket,
+          comments: [...shown, ...updatedTicket.comments],
+          commentsCursor: prev ? prev.commentsCursor : updatedTicket.commentsCursor,
+        }
+      })
       setNewComment('')
       setShowMentionSuggestions(false)
       
@@ -417,6 +447,16 @@ export const TicketDetail = () => {
             {/* Comments Section */}
             <Card title="Comments">
               <div className="space-y-6">
+                {ticket.commentsCursor && (
+                  <button
+                    type="button"
+                    onClick={loadOlderComments}
+                    disabled={olderCommentsLoading}
+                    className="text-sm text-primary-600 hover:text-primary-700 disabled:opacity-50"
+                  >
+                    {olderCommentsLoading ? 'Loading...' : 'Load older comments'}
+                  </button>
+                )}
                 {ticket.comments && ticket.comments.map((comment) => (
                   <div key={comment._id} className="border-b border-gray-200 pb-6 last:border-0 last:pb-0">
                     <div className="flex items-start space-x-3">
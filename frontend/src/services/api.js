@@ -7,7 +7,8 @@ const getAuthToken = () => {
 }
 
 // Helper function for API calls
-const apiCall = async (endpoint, options = {}) => {
+// With withCursor, resolves to { items, nextCursor } for endpoints paged via X-Next-Cursor
+const apiCall = async (endpoint, { withCursor = false, ...options } = {}) => {
   const token = getAuthToken()
   const headers = {
     'Content-Type': 'application/json',
@@ -42,6 +43,9 @@ const apiCall = async (endpoint, options = {}) => {
       throw new Error(error.message || 'Request failed')
     }
 
+    if (withCursor) {
+      return { items: await response.json(), nextCursor: response.headers.get('X-Next-Cursor') }
+    }
     return response.json()
   } catch (error) {
     // Handle network errors (fetch failures)
@@ -130,6 +134,10 @@ export const ticketsAPI = {
       body: JSON.stringify(ticketData),
     })
   },
+  getComments: async (id, cursor) => {
+    const params = new URLSearchParams(cursor ? { cursor } : {})
+    return apiCall(`/tickets/${id}/comments?${params.toString()}`, { withCursor: true })
+  },
   addComment: async (id, comment) => {
     return apiCall(`/tickets/${id}/comments`, {
       method: 'POST',
@@ -169,8 +177,9 @@ export const usersAPI = {
     const query = params.toString()
     return apiCall(`/users${query ? `?${query}` : ''}`)
   },
-  getMentions: async () => {
-    return apiCall('/users/mentions')
+  getMentions: async (q = '', limit = 10) => {
+    const params = new URLSearchParams({ q, limit })
+    return apiCall(`/users/mentions?${params.toString()}`)
   },
   getById: async (id) => {
     return apiCall(`/users/${id}`)